@@ -29,11 +29,12 @@ def upload_pdf(pdf_path: str):
         files = {"files": (Path(pdf_path).name, f, "application/pdf")}
         response = requests.post(url, files=files)
 
-    if response.status_code == 200:
+    if response.status_code in (200, 202):
         data = response.json()
-        print(f"✅ Upload bem-sucedido!")
-        print(f"   Documentos indexados: {data['documents_indexed']}")
-        print(f"   Total de chunks: {data['total_chunks']}")
+        print(f"✅ Upload aceito!")
+        print(f"   Documentos enviados: {data['documents_indexed']}")
+        for doc in data.get("documents", []):
+            print(f"   • {doc['filename']} ({doc['id']}): {doc['status']}")
         return data
     else:
         print(f"❌ Erro no upload: {response.status_code}")
@@ -41,6 +42,43 @@ def upload_pdf(pdf_path: str):
         return None
 
 
+def wait_for_document(doc_id: str, interval: float = 2.0, timeout: float = 900.0):
+    """
+    Aguarda o processamento em background de um documento.
+
+    Args:
+        doc_id: ID do documento
+        interval: Intervalo entre consultas (segundos)
+        timeout: Tempo máximo de espera (segundos)
+
+    Returns:
+        Status final do documento ou None em caso de timeout
+    """
+    import time
+
+    url = f"{BASE_URL}/documents/{doc_id}"
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        response = requests.get(url)
+        if response.status_code != 200:
+            print(f"❌ Erro ao consultar status: {response.status_code}")
+            return None
+
+        data = response.json()
+        if data["status"] != "processing":
+            print(f"   {data['filename']}: {data['status']} ({data['chunks']} chunks)")
+            if data.get("error"):
+                print(f"   Erro: {data['error']}")
+            return data
+
+        print(f"   ⏳ {data['filename']}: {data.get('progress') or 'processing'}...")
+        time.sleep(interval)
+
+    print(f"⚠️  Timeout aguardando o documento {doc_id}")
+    return None
+
+
 def list_documents():
     """
     Lista todos os documentos processados.
@@ -141,6 +179,9 @@ def main():
         print("   2. O arquivo PDF existe no caminho especificado")
         return
 
+    for doc in result.get("documents", []):
+        wait_for_document(doc["id"])
+
     # 2. Listar documentos
     print("\n\n📋 PASSO 2: Listar Documentos")
     print("-" * 60)
@@ -0,0 +1,90 @@
+"""
+Reindexação a partir do Cache de Conversões
+
+Refaz chunks e embeddings de documentos já processados usando a conversão
+do Docling gravada no cache (conversion_cache), sem abrir os PDFs. Use após
+mudanças no SemanticChunker, em get_chunk_params ou no modelo de embeddings.
+
+Uso:
+    python reindex.py --all
+    python reindex.py --user-id 3
+    python reindex.py --document-id <id> --document-id <id>
+    python reindex.py --all --no-semantic
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from src.auth.database import init_db, SessionLocal, Document
+from src.services.conversion_cache import load_conversion_manifest
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reindexa documentos a partir do cache de conversões do Docling")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Todos os documentos concluídos")
+    target.add_argument("--user-id", type=int, help="Documentos concluídos de um usuário")
+    target.add_argument("--document-id", action="append", help="Documento específico (pode repetir)")
+    parser.add_argument("--no-semantic", action="store_true", help="Usar o chunking tradicional")
+    args = parser.parse_args()
+
+    init_db()
+
+    from src.services.embeddings import embedding_registry
+    from src.services.ingest import process_document_with_docling
+
+    db = SessionLocal()
+    try:
+        query = db.query(Document).filter(Document.status == "completed")
+        if args.user_id is not None:
+            query = query.filter(Document.user_id == args.user_id)
+        elif args.document_id:
+            query = query.filter(Document.id.in_(args.document_id))
+        documents = query.order_by(Document.created_at).all()
+
+        logger.info(f"{len(documents)} documentos selecionados para reindexação")
+        embedding_registry.warmup()
+
+        reindexed, skipped, failed = 0, 0, 0
+        for doc in documents:
+            # Conversões com OCR seletivo ou em todas as páginas servem para a reindexação
+            if not doc.content_hash or all(
+                load_conversion_manifest(doc.content_hash, selective_ocr=selective_ocr) is None
+                for selective_ocr in (True, False)
+            ):
+                logger.warning(f"⏭️  {doc.id} ({doc.filename}): conversão não está no cache, ignorado")
+                skipped += 1
+                continue
+
+            try:
+                chunks_count = asyncio.run(process_document_with_docling(
+                    file_path=doc.file_path,
+                    doc_id=doc.id,
+                    user_id=doc.user_id,
+                    db=db,
+                    use_semantic_chunking=not args.no_semantic,
+                    from_cache=True
+                ))
+                logger.info(f"✅ {doc.id} ({doc.filename}): {chunks_count} chunks")
+                reindexed += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ {doc.id} ({doc.filename}): {str(e)}")
+                failed += 1
+
+        logger.info(f"Reindexação concluída: {reindexed} reindexados, {skipped} sem cache, {failed} com erro")
+    finally:
+        db.close()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
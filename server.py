@@ -2,17 +2,29 @@ import logging
 import os
 import uuid
 from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException
+from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse, FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from typing import List
 from contextlib import asynccontextmanager
-from src.models import QuestionRequest, DocumentsResponse, QuestionResponse, RegisterRequest, LoginRequest, TokenResponse
+from src.models import (
+    QuestionRequest, DocumentsResponse, DocumentStatusResponse, UploadedDocument,
+    QuestionResponse, RegisterRequest, LoginRequest, TokenResponse
+)
 from src.auth.database import get_db, init_db, User, Document
 from src.auth.auth import hash_password, verify_password, create_access_token
-from src.services.ingest import process_document_with_docling
-from src.services.rag import query_documents, format_context_for_llm
+from src.services.jobs import IngestionWorkerPool
+from src.services.job_queue import enqueue_ingestion_job, get_latest_job
+from src.services.uploads import save_upload_to_temp, discard_upload, UploadError, MAX_UPLOAD_REQUEST_BYTES
+from src.services.rag import query_documents, format_context_for_llm, get_image_content
+from src.services.embeddings import embedding_registry
+from src.services.converter_pool import NO_OCR_CONVERTER_OPTIONS, converter_pool
+from src.services.page_router import INGEST_SELECTIVE_OCR
+from src.services.embedding_batcher import get_query_batcher_stats
+from src.services.vectorstore import get_chroma_client, uses_chroma_server
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -26,14 +38,57 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Tractian RAG application...")
     init_db()
+
+    # Carregar o modelo de embeddings uma única vez por processo
+    stats = await run_in_threadpool(embedding_registry.warmup)
+    logger.info(f"Embedding model ready: {stats}")
+
+    # Abrir o cliente do Chroma (servidor ou persistente embutido)
+    await run_in_threadpool(get_chroma_client)
+
+    # A API apenas enfileira; a ingestão roda em worker.py (ou em workers embutidos)
+    app.state.ingestion_pool = IngestionWorkerPool()
+    if app.state.ingestion_pool.num_workers > 0:
+        # Carregar os modelos do Docling antes do primeiro job
+        stats = await run_in_threadpool(converter_pool.warmup)
+        if INGEST_SELECTIVE_OCR:
+            stats = await run_in_threadpool(converter_pool.warmup, NO_OCR_CONVERTER_OPTIONS)
+        logger.info(f"Docling converter pool ready: {stats}")
+        app.state.ingestion_pool.start()
+        logger.info(f"Embedded ingestion workers started: {app.state.ingestion_pool.num_workers}")
+    elif uses_chroma_server():
+        logger.info("No embedded ingestion workers. Run 'python worker.py' to process uploads.")
+    else:
+        logger.warning(
+            "No embedded ingestion workers and no Chroma server (CHROMA_SERVER_HOST): "
+            "out-of-process workers cannot share ./chroma_db with the API."
+        )
+
     logger.info("Application startup complete.")
     yield
     # Shutdown
     logger.info("Shutting down Tractian RAG application...")
+    app.state.ingestion_pool.shutdown(wait=False)
 
 
 app = FastAPI(lifespan=lifespan)
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Rejeita uploads grandes demais pelo Content-Length, antes de o corpo
+    ser lido (o FastAPI consome o multipart inteiro antes do endpoint).
+    """
+    if request.method == "POST" and request.url.path == "/documents":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Requisição excede o limite de {MAX_UPLOAD_REQUEST_BYTES // (1024 * 1024)} MB"}
+            )
+    return await call_next(request)
+
+
 # Servir arquivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -46,6 +101,23 @@ async def root():
     return RedirectResponse(url="/static/login.html")
 
 
+@app.get("/health")
+async def health():
+    """
+    Retorna o estado da aplicação e estatísticas dos modelos carregados.
+    """
+    return {
+        "status": "ok",
+        "embedding_models": embedding_registry.stats(),
+        "query_embedding_cache": {
+            name: model.query_cache_stats()
+            for name, model in embedding_registry.models().items()
+        },
+        "query_embedding_batcher": get_query_batcher_stats(),
+        "docling_converter_pool": converter_pool.stats()
+    }
+
+
 @app.post("/register")
 async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """
@@ -102,33 +174,98 @@ async def list_documents(
     }
 
 
-@app.post("/documents", response_model=DocumentsResponse)
+@app.get("/documents/{doc_id}", response_model=DocumentStatusResponse)
+async def get_document(
+    doc_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(lambda: User(id=1, user_name="test"))  # TODO: Implementar autenticação real
+):
+    """
+    Retorna o status de processamento de um documento.
+    """
+    doc = db.query(Document).filter(
+        Document.id == doc_id,
+        Document.user_id == current_user.id
+    ).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+
+    job = get_latest_job(db, doc.id)
+
+    return DocumentStatusResponse(
+        id=doc.id,
+        filename=doc.filename,
+        status=doc.status,
+        progress=job.stage if job else None,
+        job_status=job.status if job else None,
+        attempts=job.attempts if job else 0,
+        chunks=doc.chunks_count or 0,
+        error=doc.error_message,
+        peak_rss_mb=doc.peak_rss_mb,
+        embedding_cache_hit_rate=doc.embedding_cache_hit_rate,
+        ocr_pages=doc.ocr_pages,
+        ocr_time_s=doc.ocr_time_s,
+        created_at=doc.created_at.isoformat() if doc.created_at else None,
+        processed_at=doc.processed_at.isoformat() if doc.processed_at else None
+    )
+
+
+@app.post("/documents", response_model=DocumentsResponse, status_code=202)
 async def upload_documents(
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(lambda: User(id=1, user_name="test"))  # TODO: Implementar autenticação real
 ):
     """
-    Faz upload de um ou mais documentos PDF e processa com Docling.
+    Faz upload de um ou mais documentos PDF e agenda o processamento com Docling.
+
+    Retorna imediatamente com os documentos em estado "processing";
+    o progresso pode ser acompanhado em GET /documents/{id}.
+    Arquivos com conteúdo idêntico a um documento já enviado pelo mesmo
+    usuário não são reprocessados (deduplicação por SHA-256).
     """
     uploaded_docs = []
+    reused_chunks = 0
 
     for file in files:
         # Validação
         if file.content_type != 'application/pdf':
             raise HTTPException(status_code=400, detail=f"Arquivo {file.filename} não é PDF")
 
-        # Gerar ID e caminho
-        doc_id = str(uuid.uuid4())
         upload_dir = f"uploads/user_{current_user.id}"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_path = os.path.join(upload_dir, f"{doc_id}_{file.filename}")
 
-        # Salvar arquivo
-        logger.info(f"Salvando arquivo: {file_path}")
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Salvar arquivo em blocos, calculando hash e tamanho (com validação antecipada)
+        try:
+            stored = await save_upload_to_temp(file, upload_dir)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+
+        # Deduplicação por conteúdo: o mesmo PDF já enviado por este usuário
+        existing = db.query(Document).filter(
+            Document.user_id == current_user.id,
+            Document.content_hash == stored.sha256,
+            Document.status != "error"
+        ).first()
+        if existing:
+            discard_upload(stored.path)
+            logger.info(f"♻️  {file.filename} já enviado como documento {existing.id}, reprocessamento evitado")
+            reused_chunks += existing.chunks_count or 0
+            uploaded_docs.append(UploadedDocument(
+                id=existing.id,
+                filename=existing.filename,
+                status=existing.status,
+                deduplicated=True
+            ))
+            continue
+
+        # Conteúdo já indexado por outro usuário não é reaproveitado aqui: expor a
+        # deduplicação revelaria o upload alheio. A ingestão ainda reutiliza a
+        # conversão e os embeddings em cache (por hash), sem reconverter o PDF
+        doc_id = str(uuid.uuid4())
+
+        file_path = os.path.join(upload_dir, f"{doc_id}_{file.filename}")
+        os.replace(stored.path, file_path)
+        logger.info(f"Arquivo salvo: {file_path}")
 
         # Registrar no banco
         doc = Document(
@@ -136,53 +273,148 @@ async def upload_documents(
             user_id=current_user.id,
             filename=file.filename,
             file_path=file_path,
-            file_size=len(content),
+            file_size=stored.size,
             status="processing",
+            content_hash=stored.sha256,
             created_at=datetime.utcnow()
         )
         db.add(doc)
         db.commit()
 
-        try:
-            # Processar com Docling (com semantic chunking ativado)
-            logger.info(f"Processando documento {doc_id} com Docling...")
-            chunks_count = await process_document_with_docling(
-                file_path=file_path,
-                doc_id=doc_id,
-                user_id=current_user.id,
-                db=db,
-                use_semantic_chunking=True
-            )
+        # Enfileirar processamento com Docling (com semantic chunking ativado)
+        enqueue_ingestion_job(
+            db,
+            document_id=doc_id,
+            user_id=current_user.id,
+            file_path=file_path,
+            use_semantic_chunking=True
+        )
 
-            # Atualizar status
-            doc.status = "completed"
-            doc.chunks_count = chunks_count
-            doc.processed_at = datetime.utcnow()
-            db.commit()
+        uploaded_docs.append(UploadedDocument(
+            id=doc_id,
+            filename=file.filename,
+            status=doc.status
+        ))
 
-            logger.info(f"✅ Documento {doc_id} processado: {chunks_count} chunks")
+    return DocumentsResponse(
+        message="Documents accepted for processing",
+        documents_indexed=len(uploaded_docs),
+        total_chunks=reused_chunks,
+        documents=uploaded_docs
+    )
 
-            uploaded_docs.append({
-                "id": doc_id,
-                "filename": file.filename,
-                "chunks": chunks_count
-            })
 
-        except Exception as e:
-            logger.error(f"❌ Erro ao processar documento {doc_id}: {str(e)}")
-            doc.status = "error"
-            doc.error_message = str(e)
-            db.commit()
-            raise HTTPException(status_code=500, detail=f"Erro ao processar {file.filename}: {str(e)}")
+@app.post("/documents/{doc_id}/versions", response_model=UploadedDocument, status_code=202)
+async def upload_document_version(
+    doc_id: str,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(lambda: User(id=1, user_name="test"))  # TODO: Implementar autenticação real
+):
+    """
+    Envia uma nova versão (revisão) de um documento já indexado.
 
-    total_chunks = sum(d["chunks"] for d in uploaded_docs)
+    Apenas as páginas alteradas em relação à versão atual são reprocessadas;
+    as demais mantêm chunks e embeddings. O documento mantém o mesmo ID.
+    """
+    doc = db.query(Document).filter(
+        Document.id == doc_id,
+        Document.user_id == current_user.id
+    ).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    if doc.status == "processing":
+        raise HTTPException(status_code=409, detail="Documento ainda está sendo processado")
+    if file.content_type != 'application/pdf':
+        raise HTTPException(status_code=400, detail=f"Arquivo {file.filename} não é PDF")
+
+    upload_dir = f"uploads/user_{current_user.id}"
 
-    return DocumentsResponse(
-        message="Documents processed successfully",
-        documents_indexed=len(uploaded_docs),
-        total_chunks=total_chunks
+    try:
+        stored = await save_upload_to_temp(file, upload_dir)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    # Mesmo conteúdo da versão atual: nada a reprocessar
+    if stored.sha256 == doc.content_hash:
+        discard_upload(stored.path)
+        return UploadedDocument(id=doc.id, filename=doc.filename, status=doc.status, deduplicated=True)
+
+    file_path = os.path.join(upload_dir, f"{doc_id}_{uuid.uuid4().hex[:8]}_{file.filename}")
+    os.replace(stored.path, file_path)
+    logger.info(f"Nova versão do documento {doc_id} salva: {file_path}")
+
+    doc.filename = file.filename
+    doc.file_path = file_path
+    doc.file_size = stored.size
+    doc.content_hash = stored.sha256
+    doc.status = "processing"
+    doc.error_message = None
+    db.commit()
+
+    enqueue_ingestion_job(
+        db,
+        document_id=doc_id,
+        user_id=current_user.id,
+        file_path=file_path,
+        use_semantic_chunking=True,
+        kind="version"
     )
 
+    return UploadedDocument(id=doc_id, filename=file.filename, status=doc.status)
+
+
+@app.get("/images/{image_id}")
+async def get_image(
+    image_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(lambda: User(id=1, user_name="test"))  # TODO: Implementar autenticação real
+):
+    """
+    Entrega os bytes de uma imagem extraída dos documentos.
+
+    O ETag é o hash do conteúdo e a resposta pode ficar em cache
+    indefinidamente; requisições com If-None-Match recebem 304.
+    """
+    content = get_image_content(image_id, db)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+
+    # A imagem deve pertencer a um documento do usuário (ou a um documento
+    # cujos chunks foram copiados para ele pela deduplicação entre usuários,
+    # em documentos criados antes de ela ser restrita ao próprio usuário)
+    owner = db.query(Document.id).filter(
+        Document.user_id == current_user.id,
+        or_(
+            Document.id == content["document_id"],
+            Document.source_document_id == content["document_id"]
+        )
+    ).first()
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+
+    etag = f'"{content["etag"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags or f"W/{etag}" in tags:
+            return Response(status_code=304, headers=headers)
+
+    media_type = f"image/{content['format']}"
+
+    if content["path"] is not None:
+        if not os.path.exists(content["path"]):
+            raise HTTPException(status_code=404, detail="Imagem não encontrada")
+        return FileResponse(content["path"], media_type=media_type, headers=headers)
+
+    return Response(content=content["data"], media_type=media_type, headers=headers)
+
 
 @app.post("/question", response_model=QuestionResponse)
 async def ask_question(
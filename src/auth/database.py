@@ -1,7 +1,7 @@
 import os
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, Float, String, Text, DateTime, ForeignKey, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -9,10 +9,28 @@ from sqlalchemy.orm import sessionmaker
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./tractian.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tractian.db")
 DATABASE_FILE = "tractian.db"
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30} if IS_SQLITE else {}
+)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Habilita WAL para permitir leitores concorrentes enquanto a API e os
+        workers de ingestão (processos separados) escrevem no mesmo arquivo.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -38,6 +56,12 @@ class Document(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     processed_at = Column(DateTime, nullable=True)
     error_message = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 do arquivo
+    source_document_id = Column(String, nullable=True)  # Documento cujos chunks foram reutilizados
+    peak_rss_mb = Column(Float, nullable=True)  # Pico de RSS do processo na ingestão (NULL se houve ingestões simultâneas)
+    embedding_cache_hit_rate = Column(Float, nullable=True)  # Fração dos chunks com embedding vindo do cache
+    ocr_pages = Column(Integer, nullable=True)  # Páginas convertidas com OCR na última ingestão
+    ocr_time_s = Column(Float, nullable=True)  # Tempo de conversão dessas páginas
 
 
 class DocumentImage(Base):
@@ -46,12 +70,74 @@ class DocumentImage(Base):
     id = Column(String, primary_key=True)
     document_id = Column(String, ForeignKey("documents.id"), nullable=False)
     page_number = Column(Integer, nullable=False)
-    image_data = Column(Text, nullable=False)  # Base64 string
+    image_data = Column(Text, nullable=False, default="")  # Base64 (legado); novas imagens ficam no image store
     image_format = Column(String, default="png")
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 dos bytes no image store
     caption = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class DocumentPage(Base):
+    __tablename__ = "document_pages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
+    page_number = Column(Integer, nullable=False)
+    text_hash = Column(String, nullable=False)  # SHA-256 do texto da página
+    image_hash = Column(String, nullable=False)  # SHA-256 das imagens da página
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    file_path = Column(String, nullable=False)
+    use_semantic_chunking = Column(Boolean, default=True)
+    kind = Column(String, nullable=True, default="ingest")  # ingest ou version (nova versão do documento)
+    status = Column(String, default="queued", index=True)  # queued, running, completed, dead
+    stage = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    available_at = Column(DateTime, default=datetime.utcnow, index=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+def _add_missing_columns():
+    """
+    Adiciona colunas novas dos modelos em tabelas já existentes.
+
+    create_all não altera tabelas existentes; bancos criados por versões
+    anteriores recebem aqui as colunas (todas anuláveis) adicionadas depois.
+    """
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"Coluna '{table.name}.{column.name}' adicionada ao banco existente")
+
+                if column.index:
+                    connection.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'
+                    ))
+
+
 def init_db():
     """
     Inicializa o banco de dados, criando as tabelas se necessário.
@@ -66,6 +152,7 @@ def init_db():
 
     # Cria as tabelas (não faz nada se já existirem)
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
     if not db_exists:
         logger.info(f"Database '{DATABASE_FILE}' created successfully.")
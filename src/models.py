@@ -1,15 +1,43 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 
 class QuestionRequest(BaseModel):
     question: str
 
 
+class UploadedDocument(BaseModel):
+    id: str
+    filename: str
+    status: str
+    deduplicated: bool = False
+
+
 class DocumentsResponse(BaseModel):
     message: str
     documents_indexed: int
     total_chunks: int
+    documents: List[UploadedDocument] = []
+
+
+class DocumentStatusResponse(BaseModel):
+    id: str
+    filename: str
+    status: str
+    progress: Optional[str] = None
+    job_status: Optional[str] = None
+    attempts: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    peak_rss_mb: Optional[float] = Field(
+        default=None,
+        description="Pico de RSS do processo worker; nulo se outras ingestões rodaram ao mesmo tempo no processo"
+    )
+    embedding_cache_hit_rate: Optional[float] = None
+    ocr_pages: Optional[int] = None
+    ocr_time_s: Optional[float] = None
+    created_at: Optional[str] = None
+    processed_at: Optional[str] = None
 
 
 class QuestionResponse(BaseModel):
@@ -3,20 +3,37 @@ Adaptive Chunker - Sistema de Chunking Inteligente e Adaptativo
 
 Este módulo implementa um sistema de chunking que:
 - Detecta automaticamente o tipo de conteúdo (tabela, fórmula, aviso, procedimento, etc)
-- Define dinamicamente chunk_size e overlap ideal
+- Define dinamicamente chunk_size e overlap ideal (em tokens do modelo de embeddings)
+- Limita os chunks ao comprimento máximo de sequência do modelo (nada é truncado)
 - Funciona independentemente do nome do documento
 - Mantém qualidade semântica e suporte multilíngue
 """
 
 import re
-from typing import Tuple, List, Dict
+from functools import lru_cache
+from typing import Callable, Tuple, List, Dict, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from src.services.embeddings import get_max_content_tokens, get_token_counter
+
+
+# Padrões pré-compilados de detect_block_type
+_WARNING_RE = re.compile(r"\b(warning|caution|aten[çc][aã]o|aviso|advert[êe]ncia)\b")
+_TABLE_KEYWORDS = ("tabela", "table", "tabla")
+_STEP_RE = re.compile(r"(\d+[\.\)]\s+)|([-*•]\s+)")  # grupo 1: passo numerado
+_DIGIT_RE = re.compile(r"\d")
+_MATH_SYMBOL_RE = re.compile(r"[=<>×÷±/]|√|∑|Σ")
+_MATH_WORD_RE = re.compile(r"\b(cos|sen|sin|tan|log|ln)\b")
+_CONCEPTUAL_RE = re.compile(r"\d+(\.\d+)+\s")
+
 
 def detect_block_type(text: str) -> str:
     """
     Detecta o tipo de bloco textual com base em padrões estruturais.
 
+    Os padrões são pré-compilados e as linhas são percorridas uma única vez
+    (contando passos de procedimento e linhas numéricas ao mesmo tempo).
+
     Args:
         text: Texto a ser analisado
 
@@ -33,133 +50,179 @@ def detect_block_type(text: str) -> str:
     """
     t = text.strip()
     text_low = t.lower()
-    lines = [l.strip() for l in t.splitlines() if l.strip()]
 
     # 1. Detectar avisos de segurança (prioridade alta)
-    if re.search(r"\b(warning|caution|aten[çc][aã]o|aviso|advert[êe]ncia)\b", text_low):
+    if _WARNING_RE.search(text_low):
         return "warning"
 
     # 2. Detectar tabelas "óbvias" (palavra-chave ou pipes)
-    if "tabela" in text_low or "table" in text_low or "tabla" in text_low or "|" in t:
+    if "|" in t or any(keyword in text_low for keyword in _TABLE_KEYWORDS):
         return "table"
 
-    # 3. Detectar procedimentos e listas (2 ou mais passos)
-    step_like = sum(
-        1
-        for l in lines
-        if re.match(r'^(\d+[\.\)]\s+|[-*•]\s+)', l)
-    )
-    if step_like >= 2:
-        return "procedure"
-
-    # 4. Detectar tabelas numéricas (como as do LB5001, sem '|')
-    # Heurística: bloco com >= 3 linhas e pelo menos 2 linhas "numéricas"
+    # 3 e 4. Uma passada pelas linhas: procedimentos (2 ou mais passos) e
+    # tabelas numéricas (como as do LB5001, sem '|')
+    num_lines = 0
+    step_like = 0
     numeric_like_lines = 0
-    for line in lines:
-        # Ignorar linhas que são claramente passos de procedimento
-        if re.match(r'^(\d+[\.\)]\s+)', line):
+
+    for line in t.splitlines():
+        line = line.strip()
+        if not line:
             continue
+        num_lines += 1
 
-        lower = line.lower()
-        tokens = line.split()
-        num_tokens = sum(1 for tok in tokens if re.search(r"\d", tok))
-        has_hrs = "hrs" in lower  # 12000Hrs., 22,000Hrs., etc
+        step = _STEP_RE.match(line)
+        if step:
+            step_like += 1
+            if step_like >= 2:
+                return "procedure"
+
+            # Linhas que são claramente passos numerados não contam como numéricas
+            if step.group(1):
+                continue
 
         # Linha "numérica" se:
         # - começa com dígito, OU
-        # - tem pelo menos 2 tokens com dígito, OU
-        # - menciona horas (Hrs.)
-        if re.match(r"^\d", line) or num_tokens >= 2 or has_hrs:
+        # - menciona horas (Hrs.), OU
+        # - tem pelo menos 2 tokens com dígito
+        if _DIGIT_RE.match(line) or "hrs" in line.lower():
             numeric_like_lines += 1
+            continue
 
-    if len(lines) >= 3 and numeric_like_lines >= 2:
+        digit_tokens = 0
+        for token in line.split():
+            if _DIGIT_RE.search(token):
+                digit_tokens += 1
+                if digit_tokens >= 2:
+                    numeric_like_lines += 1
+                    break
+
+    if num_lines >= 3 and numeric_like_lines >= 2:
         return "table"
 
     # 5. Detectar fórmulas e conteúdo matemático
     # Requer símbolo matemático + dígito OU palavras típicas de função matemática
-    has_math_symbol = re.search(r'[=<>×÷±/]|√|∑|Σ', t) is not None
-    has_math_word = re.search(r'\b(cos|sen|sin|tan|log|ln)\b', text_low) is not None
-    has_digit = re.search(r'\d', t) is not None
-
-    if (has_math_symbol and has_digit) or has_math_word:
+    if (_MATH_SYMBOL_RE.search(t) and _DIGIT_RE.search(t)) or _MATH_WORD_RE.search(text_low):
         return "formula"
 
     # 6. Detectar conteúdo conceitual técnico
     # Títulos hierárquicos (1.2.5, Section 3.1, etc)
-    if re.match(r"^\d+(\.\d+)+\s", t):
+    if _CONCEPTUAL_RE.match(t):
         return "conceptual"
 
     # 7. Padrão: texto narrativo
     return "narrative"
 
 
-def get_chunk_params(block_type: str) -> Dict[str, any]:
+def get_chunk_params(block_type: str, max_tokens: Optional[int] = None) -> Dict[str, any]:
     """
     Retorna os parâmetros ideais de chunking para cada tipo de bloco.
 
+    Os tamanhos são em tokens do modelo de embeddings. Se max_tokens for
+    informado, chunk_size é limitado a ele (e o overlap a metade do chunk).
+
     Args:
         block_type: Tipo do bloco (warning, table, formula, etc)
+        max_tokens: Limite de tokens do modelo (opcional)
 
     Returns:
         dict: Parâmetros para RecursiveCharacterTextSplitter
-              - chunk_size: tamanho do chunk
-              - chunk_overlap: sobreposição entre chunks
+              - chunk_size: tamanho do chunk (tokens)
+              - chunk_overlap: sobreposição entre chunks (tokens)
               - separators: lista de separadores
     """
     params_map = {
         "table": {
-            "chunk_size": 300,
-            "chunk_overlap": 50,
-            "separators": ["\n", "|", ";", ","]
+            "chunk_size": 80,
+            "chunk_overlap": 12,
+            "separators": ["\n", "|", ";", ",", " "]
         },
         "formula": {
-            "chunk_size": 1200,
-            "chunk_overlap": 150,
-            "separators": ["\n\n", "\n", ".", ";"]
+            "chunk_size": 128,
+            "chunk_overlap": 20,
+            "separators": ["\n\n", "\n", ".", ";", " "]
         },
         "conceptual": {
-            "chunk_size": 1200,
-            "chunk_overlap": 150,
-            "separators": ["\n\n", "\n", ".", ";"]
+            "chunk_size": 128,
+            "chunk_overlap": 20,
+            "separators": ["\n\n", "\n", ".", ";", " "]
         },
         "procedure": {
-            "chunk_size": 400,
-            "chunk_overlap": 80,
-            "separators": ["\n", "\n\n", ".", ";"]
+            "chunk_size": 100,
+            "chunk_overlap": 20,
+            "separators": ["\n", "\n\n", ".", ";", " "]
         },
         "warning": {
-            "chunk_size": 250,
-            "chunk_overlap": 20,
-            "separators": ["WARNING:", "CAUTION:", "ATENÇÃO:", "AVISO:", "\n"]
+            "chunk_size": 64,
+            "chunk_overlap": 6,
+            "separators": ["WARNING:", "CAUTION:", "ATENÇÃO:", "AVISO:", "\n", " "]
         },
         "narrative": {
-            "chunk_size": 800,
-            "chunk_overlap": 100,
+            "chunk_size": 128,
+            "chunk_overlap": 24,
             "separators": ["\n\n", "\n", ".", ";", " "]
         }
     }
 
-    return params_map.get(block_type, params_map["narrative"])
+    params = dict(params_map.get(block_type, params_map["narrative"]))
 
+    if max_tokens is not None:
+        params["chunk_size"] = min(params["chunk_size"], max_tokens)
+        params["chunk_overlap"] = min(params["chunk_overlap"], params["chunk_size"] // 2)
 
-def split_text_dynamic(text: str) -> Tuple[str, List[str]]:
+    return params
+
+
+@lru_cache(maxsize=64)
+def get_splitter(
+    block_type: str,
+    max_tokens: Optional[int] = None,
+    length_function: Callable[[str], int] = len
+) -> RecursiveCharacterTextSplitter:
+    """
+    Retorna o splitter configurado para o tipo de bloco (criado uma vez e reutilizado).
+
+    Args:
+        block_type: Tipo do bloco (warning, table, formula, etc)
+        max_tokens: Limite de tokens do modelo (opcional)
+        length_function: Função de medida do tamanho dos chunks
+
+    Returns:
+        RecursiveCharacterTextSplitter compartilhado
+    """
+    params = get_chunk_params(block_type, max_tokens)
+    return RecursiveCharacterTextSplitter(length_function=length_function, **params)
+
+
+def split_text_dynamic(
+    text: str,
+    length_function: Optional[Callable[[str], int]] = None,
+    max_tokens: Optional[int] = None
+) -> Tuple[str, List[str]]:
     """
     Divide o texto de forma adaptativa baseado no tipo de conteúdo detectado.
 
     Este é o método principal do chunking adaptativo. Ele:
     1. Detecta automaticamente o tipo de conteúdo
     2. Seleciona os parâmetros ideais de chunking
-    3. Aplica o text splitter configurado
+    3. Aplica o text splitter configurado (medindo em tokens do modelo)
     4. Retorna o tipo detectado e os chunks gerados
+
+    Args:
+        text: Texto a ser dividido
+        length_function: Função de contagem de tokens (padrão: tokenizer do modelo de embeddings)
+        max_tokens: Limite de tokens por chunk (padrão: limite do modelo de embeddings)
     """
+    if length_function is None:
+        length_function = get_token_counter()
+    if max_tokens is None:
+        max_tokens = get_max_content_tokens()
+
     # 1. Detectar tipo do bloco
     block_type = detect_block_type(text)
 
-    # 2. Obter parâmetros de chunking para este tipo
-    params = get_chunk_params(block_type)
-
-    # 3. Criar splitter com os parâmetros
-    splitter = RecursiveCharacterTextSplitter(**params)
+    # 2 e 3. Obter o splitter configurado para este tipo (reutilizado entre chamadas)
+    splitter = get_splitter(block_type, max_tokens, length_function)
 
     # 4. Dividir texto em chunks
     chunks = splitter.split_text(text)
@@ -187,8 +250,9 @@ def split_text_with_metadata(
         base_metadata = {}
 
     # Obter tipo e chunks
-    block_type, chunks = split_text_dynamic(text)
-    params = get_chunk_params(block_type)
+    max_tokens = get_max_content_tokens()
+    block_type, chunks = split_text_dynamic(text, max_tokens=max_tokens)
+    params = get_chunk_params(block_type, max_tokens)
 
     # Criar lista de chunks com metadados
     result = []
@@ -12,8 +12,11 @@ Objetivo: Resolver fragmentação excessiva que prejudica recuperação RAG.
 
 import logging
 import re
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, replace
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +33,8 @@ class SemanticChunk:
         element_ids: IDs dos elementos originais agrupados
         metadata: Metadados adicionais
     """
+    __slots__ = ("text", "page", "chunk_type", "element_ids", "metadata")
+
     text: str
     page: int
     chunk_type: str
@@ -141,29 +146,40 @@ class SemanticChunker:
 
     Estratégia:
     1. Agrupar elementos consecutivos da mesma página/seção
-    2. Respeitar limite de caracteres (500-1000)
+    2. Respeitar limite de tamanho (medido por length_function: caracteres
+       por padrão, ou tokens do modelo de embeddings)
     3. Detectar e juntar fórmulas quebradas
     4. Manter contexto entre texto + fórmula + explicação
+    5. Dividir chunks que excedam max_chunk_size (o modelo truncaria o excesso)
     """
 
     def __init__(
         self,
         min_chunk_size: int = 300,
         max_chunk_size: int = 1000,
-        overlap_size: int = 100
+        overlap_size: int = 100,
+        length_function: Callable[[str], int] = len
     ):
         """
         Inicializa o chunker semântico.
 
         Args:
-            min_chunk_size: Tamanho mínimo de chunk em caracteres
-            max_chunk_size: Tamanho máximo de chunk em caracteres
+            min_chunk_size: Tamanho mínimo de chunk
+            max_chunk_size: Tamanho máximo de chunk
             overlap_size: Sobreposição entre chunks vizinhos
+            length_function: Função de medida dos tamanhos acima (padrão: caracteres)
         """
         self.min_chunk_size = min_chunk_size
         self.max_chunk_size = max_chunk_size
         self.overlap_size = overlap_size
+        self.length_function = length_function
         self.formula_reconstructor = FormulaReconstructor()
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max_chunk_size,
+            chunk_overlap=min(overlap_size, max_chunk_size // 2),
+            separators=[". ", "; ", ", ", " ", ""],
+            length_function=length_function
+        )
 
     def _is_minor_header(self, header: str) -> bool:
         """
@@ -200,32 +216,68 @@ class SemanticChunker:
 
         return h in minor_headers
 
-    def group_elements(self, elements: List[Dict[str, Any]]) -> List[SemanticChunk]:
+    def group_elements(self, elements: Iterable[Dict[str, Any]]) -> List[SemanticChunk]:
         """
         Agrupa elementos Docling em chunks semânticos.
 
         Args:
-            elements: Lista de elementos extraídos do Docling
+            elements: Elementos extraídos do Docling
 
         Returns:
             Lista de chunks semânticos agrupados
         """
-        if not elements:
-            return []
+        return list(self.iter_chunks(elements))
+
+    def iter_chunks(
+        self,
+        elements: Iterable[Dict[str, Any]],
+        seed_text: Optional[str] = None
+    ) -> Iterator[SemanticChunk]:
+        """
+        Agrupa elementos Docling em chunks semânticos de forma incremental.
 
-        chunks = []
+        Consome os elementos um a um e emite cada chunk assim que ele fecha,
+        mantendo em memória apenas o chunk em construção e a cauda de overlap.
+
+        Args:
+            elements: Iterável de elementos ({'text', 'page', 'type', 'section_header'})
+            seed_text: Texto que precede os elementos no documento (ex: fim da
+                       página anterior, já indexada); sua cauda vira o overlap
+                       do primeiro chunk, como se ele viesse de uma quebra de página
+
+        Yields:
+            Chunks semânticos, na ordem do documento
+        """
+        num_elements = 0
+        num_chunks = 0
         current_buffer = []
         current_length = 0
         current_page = None
         current_section = None
         formula_buffer = []
 
+        # Cauda de overlap: últimas palavras do buffer com seus tamanhos
+        tail: Deque[Tuple[str, int]] = deque()
+        tail_length = 0
+
+        if seed_text:
+            tail_length = self._update_tail(tail, tail_length, seed_text)
+        pending_overlap = self.overlap_size > 0 and bool(tail)
+
         for idx, element in enumerate(elements):
+            num_elements += 1
             text = element.get('text', '').strip()
             page = element.get('page', 0)
             el_type = element.get('type', 'text')
             section = element.get('section_header', '')
 
+            if pending_overlap:
+                # Overlap do texto anterior, na página do primeiro elemento
+                overlap_text = " ".join(word for word, _ in tail)
+                current_buffer = [{'text': overlap_text, 'page': page, 'type': 'text', 'element_id': idx}]
+                current_length = tail_length
+                pending_overlap = False
+
             # Detectar fragmentos de fórmula
             is_formula_frag = self.formula_reconstructor.is_formula_fragment(text)
 
@@ -244,7 +296,8 @@ class SemanticChunker:
                         'type': 'formula',
                         'element_id': idx
                     })
-                    current_length += len(reconstructed)
+                    current_length += self.length_function(reconstructed)
+                    tail_length = self._update_tail(tail, tail_length, reconstructed)
                 formula_buffer = []
 
             # Verificar se houve mudança de seção significativa
@@ -256,6 +309,8 @@ class SemanticChunker:
                 and not self._is_minor_header(section)
             )
 
+            text_length = self.length_function(text) if text else 0
+
             # Verificar se deve criar novo chunk
             should_split = (
                 # Mudou de página
@@ -263,20 +318,22 @@ class SemanticChunker:
                 # Mudou de seção (apenas seções "grandes")
                 section_changed or
                 # Atingiu tamanho máximo
-                (current_length + len(text) > self.max_chunk_size and current_length >= self.min_chunk_size)
+                (current_length + text_length > self.max_chunk_size and current_length >= self.min_chunk_size)
             )
 
             if should_split and current_buffer:
                 # Criar chunk do buffer atual
                 chunk = self._create_chunk(current_buffer)
                 if chunk:
-                    chunks.append(chunk)
+                    for part in self._enforce_max_size(chunk):
+                        num_chunks += 1
+                        yield part
 
-                # Manter overlap se possível
-                if self.overlap_size > 0 and current_buffer:
-                    overlap_text = self._get_overlap_text(current_buffer)
+                # Manter overlap se possível (a cauda já contém o texto de overlap)
+                if self.overlap_size > 0 and tail:
+                    overlap_text = " ".join(word for word, _ in tail)
                     current_buffer = [{'text': overlap_text, 'page': page, 'type': 'text', 'element_id': idx}]
-                    current_length = len(overlap_text)
+                    current_length = tail_length
                 else:
                     current_buffer = []
                     current_length = 0
@@ -290,7 +347,8 @@ class SemanticChunker:
                     'element_id': idx,
                     'section': section
                 })
-                current_length += len(text)
+                current_length += text_length
+                tail_length = self._update_tail(tail, tail_length, text)
                 current_page = page
                 current_section = section
 
@@ -302,18 +360,18 @@ class SemanticChunker:
                     'text': reconstructed,
                     'page': current_page or 0,
                     'type': 'formula',
-                    'element_id': len(elements)
+                    'element_id': num_elements
                 })
 
         # Criar último chunk
         if current_buffer:
             chunk = self._create_chunk(current_buffer)
             if chunk:
-                chunks.append(chunk)
-
-        logger.info(f"Agrupados {len(elements)} elementos em {len(chunks)} chunks semânticos")
+                for part in self._enforce_max_size(chunk):
+                    num_chunks += 1
+                    yield part
 
-        return chunks
+        logger.info(f"Agrupados {num_elements} elementos em {num_chunks} chunks semânticos")
 
     def _create_chunk(self, buffer: List[Dict[str, Any]]) -> Optional[SemanticChunk]:
         """
@@ -343,7 +401,7 @@ class SemanticChunker:
         combined_text = re.sub(r'\s+', ' ', combined_text).strip()
 
         # Não criar chunks muito pequenos
-        if len(combined_text) < self.min_chunk_size and len(buffer) == 1:
+        if self.length_function(combined_text) < self.min_chunk_size and len(buffer) == 1:
             return None
 
         # Determinar tipo do chunk
@@ -377,47 +435,80 @@ class SemanticChunker:
             metadata=metadata
         )
 
-    def _get_overlap_text(self, buffer: List[Dict[str, Any]]) -> str:
+    def _enforce_max_size(self, chunk: SemanticChunk) -> List[SemanticChunk]:
         """
-        Obtém texto de overlap do final do buffer.
+        Divide um chunk que excede max_chunk_size em partes que cabem no limite.
 
         Args:
-            buffer: Buffer de elementos
+            chunk: Chunk semântico
 
         Returns:
-            Texto de overlap
+            Lista com o próprio chunk ou suas partes (mesmos metadados)
         """
-        if not buffer:
-            return ""
+        if self.length_function(chunk.text) <= self.max_chunk_size:
+            return [chunk]
 
-        # Pegar últimos N caracteres
-        all_text = " ".join(item['text'] for item in buffer if item['text'])
-        if len(all_text) <= self.overlap_size:
-            return all_text
+        parts = self._splitter.split_text(chunk.text)
+        return [replace(chunk, text=part, metadata=dict(chunk.metadata)) for part in parts]
 
-        return all_text[-self.overlap_size:]
+    def _update_tail(self, tail: Deque[Tuple[str, int]], tail_length: int, text: str) -> int:
+        """
+        Atualiza a cauda de overlap com o texto recém-adicionado ao buffer.
 
+        Só as últimas palavras do texto são medidas (no máximo overlap_size
+        palavras), de modo que o custo por elemento não depende do tamanho
+        do buffer.
 
-def expand_context_with_neighbors(
-    chunks: List[SemanticChunk],
+        Args:
+            tail: Cauda atual (palavra, tamanho), modificada no lugar
+            tail_length: Tamanho total da cauda
+            text: Texto adicionado ao buffer
+
+        Returns:
+            Novo tamanho total da cauda
+        """
+        if self.overlap_size <= 0:
+            return 0
+
+        new_words = []
+        new_length = 0
+        for word in reversed(text.rsplit(None, self.overlap_size)):
+            word_length = self.length_function(word)
+            if new_length + word_length > self.overlap_size:
+                # O próprio texto preenche a cauda inteira
+                tail.clear()
+                tail.extend(reversed(new_words))
+                return new_length
+            new_words.append((word, word_length))
+            new_length += word_length
+
+        tail.extend(reversed(new_words))
+        tail_length += new_length
+        while tail_length > self.overlap_size:
+            _, word_length = tail.popleft()
+            tail_length -= word_length
+
+        return tail_length
+
+
+def get_neighbor_indices(
     target_indices: List[int],
     n_before: int = 1,
-    n_after: int = 1
-) -> List[SemanticChunk]:
+    n_after: int = 1,
+    total: Optional[int] = None
+) -> List[int]:
     """
-    Expande contexto incluindo chunks vizinhos.
-
-    Útil para recuperação RAG: mesmo que o chunk exato não entre no top_k,
-    chunks vizinhos podem conter informação complementar crítica.
+    Calcula os índices dos chunks alvo e de seus vizinhos.
 
     Args:
-        chunks: Lista de todos os chunks
         target_indices: Índices dos chunks recuperados
         n_before: Número de chunks anteriores a incluir
         n_after: Número de chunks posteriores a incluir
+        total: Número total de chunks (None se desconhecido; índices
+               posteriores não são limitados)
 
     Returns:
-        Lista expandida de chunks com vizinhos
+        Lista ordenada de índices (alvos + vizinhos, sem duplicatas)
     """
     expanded_indices = set()
 
@@ -432,11 +523,37 @@ def expand_context_with_neighbors(
 
         # Adicionar vizinhos posteriores
         for i in range(1, n_after + 1):
-            if idx + i < len(chunks):
+            if total is None or idx + i < total:
                 expanded_indices.add(idx + i)
 
+    return sorted(expanded_indices)
+
+
+def expand_context_with_neighbors(
+    chunks: List[SemanticChunk],
+    target_indices: List[int],
+    n_before: int = 1,
+    n_after: int = 1
+) -> List[SemanticChunk]:
+    """
+    Expande contexto incluindo chunks vizinhos.
+
+    Útil para recuperação RAG: mesmo que o chunk exato não entre no top_k,
+    chunks vizinhos podem conter informação complementar crítica.
+
+    Args:
+        chunks: Lista de todos os chunks
+        target_indices: Índices dos chunks recuperados
+        n_before: Número de chunks anteriores a incluir
+        n_after: Número de chunks posteriores a incluir
+
+    Returns:
+        Lista expandida de chunks com vizinhos
+    """
+    expanded_indices = get_neighbor_indices(target_indices, n_before, n_after, total=len(chunks))
+
     # Retornar chunks na ordem original
-    result = [chunks[i] for i in sorted(expanded_indices)]
+    result = [chunks[i] for i in expanded_indices]
 
     logger.info(f"Expandido {len(target_indices)} chunks para {len(result)} com vizinhos")
 
@@ -0,0 +1,338 @@
+"""
+Cache de Conversões do Docling
+
+Este módulo guarda em disco o resultado da conversão do Docling (DoclingDocument
+serializado), para que mudanças no chunking ou nos embeddings não exijam
+converter os PDFs de novo:
+1. Uma entrada por hash SHA-256 do conteúdo do PDF, opções do pipeline e modo
+   de OCR (em todas as páginas ou seletivo, só nas páginas sem camada de texto)
+2. Cada janela de páginas convertida é gravada como JSON comprimido com zstandard
+3. Um manifest marca a entrada como completa (gravação atômica: diretório temporário + rename)
+4. Leitura janela por janela, no mesmo formato entregue pela conversão
+5. Janelas extraídas diretamente com PyMuPDF (roteador de páginas) guardadas junto
+
+A gravação é best-effort: erros de disco apenas desativam o cache para a
+conversão em andamento, sem interromper a ingestão.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from glob import glob
+from dataclasses import asdict
+from typing import Dict, Iterator, Optional, Union
+
+import zstandard
+from docling_core.types.doc import DoclingDocument
+
+from src.services.converter_pool import DEFAULT_CONVERTER_OPTIONS, ConverterOptions
+from src.services.page_router import NativePageWindow
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONVERSION_CACHE_DIRECTORY = os.getenv("CONVERSION_CACHE_DIR", "./conversion_cache")
+CONVERSION_CACHE_ENABLED = os.getenv("CONVERSION_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CONVERSION_CACHE_ZSTD_LEVEL = int(os.getenv("CONVERSION_CACHE_ZSTD_LEVEL", "3"))
+# Diretórios temporários sem modificação há mais tempo que isto são de conversões interrompidas
+CONVERSION_CACHE_STALE_TMP_HOURS = float(os.getenv("CONVERSION_CACHE_STALE_TMP_HOURS", "6"))
+
+# Versão do formato das entradas (entradas de outra versão são ignoradas).
+# Versão 2: modo de OCR na chave (entradas da versão 1 podem ter OCR seletivo
+# gravado sob a chave de OCR em todas as páginas)
+CONVERSION_CACHE_VERSION = 2
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Limpeza de temporários no máximo uma vez por hora por processo
+_TMP_SWEEP_INTERVAL_SECONDS = 3600
+_last_tmp_sweep = 0.0
+_tmp_sweep_lock = threading.Lock()
+
+
+def compute_file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo.
+
+    Args:
+        file_path: Caminho do arquivo
+        block_size: Bytes lidos por vez
+
+    Returns:
+        SHA-256 do conteúdo (hex)
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def get_conversion_dir(
+    content_hash: str,
+    options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS,
+    selective_ocr: bool = False
+) -> str:
+    """
+    Retorna o diretório da entrada de cache de um PDF.
+
+    Args:
+        content_hash: SHA-256 do conteúdo do PDF (hex)
+        options: Opções do pipeline usadas na conversão
+        selective_ocr: Se True, conversão com OCR só nas páginas sem camada de texto
+
+    Returns:
+        Caminho do diretório
+    """
+    options_key = "-".join(f"{name}={int(value)}" for name, value in asdict(options).items())
+    if selective_ocr:
+        options_key += "-selective_ocr=1"
+    return os.path.join(CONVERSION_CACHE_DIRECTORY, content_hash[:2], content_hash, options_key)
+
+
+def _read_manifest(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != CONVERSION_CACHE_VERSION:
+        return None
+
+    return manifest
+
+
+def cleanup_stale_temp_dirs(max_age_hours: float = CONVERSION_CACHE_STALE_TMP_HOURS) -> int:
+    """
+    Remove diretórios temporários deixados por conversões que não terminaram
+    (processo encerrado ou morto por falta de memória antes do commit/discard).
+
+    Args:
+        max_age_hours: Idade mínima (desde a última modificação) para remoção
+
+    Returns:
+        Número de diretórios removidos
+    """
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+
+    for path in glob(os.path.join(CONVERSION_CACHE_DIRECTORY, "*", "*", "*.tmp")):
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue  # Conversão possivelmente ainda em andamento
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+
+    if removed:
+        logger.info(f"🧹 {removed} conversões interrompidas removidas do cache")
+    return removed
+
+
+def _maybe_cleanup_stale_temp_dirs() -> None:
+    global _last_tmp_sweep
+
+    with _tmp_sweep_lock:
+        now = time.monotonic()
+        if _last_tmp_sweep and now - _last_tmp_sweep < _TMP_SWEEP_INTERVAL_SECONDS:
+            return
+        _last_tmp_sweep = now
+
+    try:
+        cleanup_stale_temp_dirs()
+    except OSError as e:
+        logger.warning(f"Falha ao limpar temporários do cache de conversões: {str(e)}")
+
+
+def load_conversion_manifest(
+    content_hash: str,
+    options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS,
+    allow_native: bool = True,
+    selective_ocr: bool = False
+) -> Optional[Dict]:
+    """
+    Lê o manifest de uma conversão em cache.
+
+    Args:
+        content_hash: SHA-256 do conteúdo do PDF (hex)
+        options: Opções do pipeline usadas na conversão
+        allow_native: Se False, ignora entradas com janelas extraídas pelo
+                      PyMuPDF (conversão inteira pelo Docling exigida)
+        selective_ocr: Modo de OCR da conversão (ver get_conversion_dir)
+
+    Returns:
+        {"version", "page_count", "selective_ocr", "ocr_pages", "windows": [{"file", "native"}, ...]}
+        ou None se não há entrada completa
+    """
+    manifest = _read_manifest(get_conversion_dir(content_hash, options, selective_ocr))
+    if manifest is None:
+        return None
+
+    if not allow_native and any(window.get("native") for window in manifest["windows"]):
+        return None
+
+    return manifest
+
+
+def iter_cached_windows(
+    content_hash: str,
+    options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS,
+    selective_ocr: bool = False
+) -> Iterator[Union[DoclingDocument, NativePageWindow]]:
+    """
+    Lê as janelas de uma conversão em cache, em ordem de página.
+
+    Args:
+        content_hash: SHA-256 do conteúdo do PDF (hex)
+        options: Opções do pipeline usadas na conversão
+        selective_ocr: Modo de OCR da conversão (ver get_conversion_dir)
+
+    Yields:
+        DoclingDocument (ou NativePageWindow) de cada janela (uma janela em memória por vez)
+    """
+    manifest = load_conversion_manifest(content_hash, options, selective_ocr=selective_ocr)
+    if manifest is None:
+        raise FileNotFoundError(f"Conversão de {content_hash[:12]} não encontrada no cache")
+
+    directory = get_conversion_dir(content_hash, options, selective_ocr)
+    decompressor = zstandard.ZstdDecompressor()
+
+    for window in manifest["windows"]:
+        with open(os.path.join(directory, window["file"]), "rb") as f:
+            data = decompressor.decompress(f.read())
+        if window.get("native"):
+            yield NativePageWindow.from_dict(json.loads(data))
+        else:
+            yield DoclingDocument.model_validate(json.loads(data))
+        del data
+
+
+class ConversionCacheWriter:
+    """
+    Grava as janelas de uma conversão à medida que são produzidas.
+
+    As janelas vão para um diretório temporário; commit() grava o manifest e
+    move o diretório para o lugar definitivo. Uma conversão interrompida
+    (discard) não deixa entrada parcial no cache.
+
+    Erros de gravação (disco cheio, permissões) são registrados no log e
+    desativam o writer: add() e commit() passam a não fazer nada e a
+    ingestão continua sem cache.
+    """
+
+    def __init__(
+        self,
+        content_hash: str,
+        options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS,
+        selective_ocr: bool = False
+    ):
+        """
+        Inicializa o writer.
+
+        Args:
+            content_hash: SHA-256 do conteúdo do PDF (hex)
+            options: Opções do pipeline usadas na conversão
+            selective_ocr: Se True, conversão com OCR só nas páginas sem camada de texto
+        """
+        self.directory = get_conversion_dir(content_hash, options, selective_ocr)
+        self.selective_ocr = selective_ocr
+        self.temp_directory = f"{self.directory}.{uuid.uuid4().hex}.tmp"
+        self.windows = []
+        self.bytes_written = 0
+        self.failed = False
+        self._compressor = zstandard.ZstdCompressor(level=CONVERSION_CACHE_ZSTD_LEVEL)
+
+        _maybe_cleanup_stale_temp_dirs()
+
+        try:
+            os.makedirs(self.temp_directory, exist_ok=True)
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, error: Exception) -> None:
+        logger.warning(f"⚠️  Cache de conversões desativado para esta conversão: {str(error)}")
+        self.failed = True
+        self.discard()
+
+    def add(self, docling_doc: Union[DoclingDocument, NativePageWindow]) -> None:
+        """
+        Grava uma janela convertida.
+
+        Args:
+            docling_doc: DoclingDocument (ou NativePageWindow) da janela
+        """
+        if self.failed:
+            return
+
+        filename = f"window_{len(self.windows):05d}.json.zst"
+        try:
+            data = self._compressor.compress(json.dumps(docling_doc.export_to_dict()).encode("utf-8"))
+            with open(os.path.join(self.temp_directory, filename), "wb") as f:
+                f.write(data)
+        except Exception as e:
+            self._fail(e)
+            return
+
+        self.windows.append({"file": filename, "native": isinstance(docling_doc, NativePageWindow)})
+        self.bytes_written += len(data)
+
+    def commit(self, page_count: int, ocr_pages: int = 0) -> None:
+        """
+        Marca a conversão como completa e a publica no cache.
+
+        Se outro worker já publicou uma entrada válida para o mesmo PDF, ela é
+        mantida (pode estar sendo lida) e esta conversão é descartada.
+
+        Args:
+            page_count: Número de páginas do PDF
+            ocr_pages: Páginas convertidas com OCR
+        """
+        if self.failed:
+            return
+
+        manifest = {
+            "version": CONVERSION_CACHE_VERSION,
+            "page_count": page_count,
+            "selective_ocr": self.selective_ocr,
+            "ocr_pages": ocr_pages,
+            "windows": self.windows
+        }
+        try:
+            with open(os.path.join(self.temp_directory, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            if os.path.exists(self.directory):
+                if _read_manifest(self.directory) is not None:
+                    logger.info("Conversão já publicada no cache por outro worker; mantendo a existente")
+                    self.discard()
+                    return
+
+                # Entrada de outra versão do formato: tirar do caminho antes de publicar
+                stale_directory = f"{self.directory}.{uuid.uuid4().hex}.tmp"
+                os.replace(self.directory, stale_directory)
+                shutil.rmtree(stale_directory, ignore_errors=True)
+
+            os.replace(self.temp_directory, self.directory)
+        except Exception as e:
+            if _read_manifest(self.directory) is not None:
+                # Outro worker publicou entre a verificação e o rename (ENOTEMPTY)
+                logger.info("Conversão já publicada no cache por outro worker; mantendo a existente")
+                self.discard()
+            else:
+                self._fail(e)
+            return
+
+        logger.info(f"💾 Conversão gravada no cache: {len(self.windows)} janelas, "
+                    f"{self.bytes_written / (1024 * 1024):.1f} MB comprimidos")
+
+    def discard(self) -> None:
+        """Remove as janelas gravadas de uma conversão que não terminou."""
+        shutil.rmtree(self.temp_directory, ignore_errors=True)
@@ -0,0 +1,178 @@
+"""
+Pool de Conversores Docling
+
+Este módulo mantém instâncias de DocumentConverter prontas para reuso entre jobs:
+1. Um conjunto de conversores por configuração do pipeline (ConverterOptions)
+2. Modelos de layout e estrutura de tabelas carregados uma única vez (initialize_pipeline)
+3. Uso exclusivo: cada conversor atende um documento por vez (checkout)
+4. Aquecimento na inicialização do worker
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List
+
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Conversores ociosos mantidos por configuração
+DOCLING_CONVERTER_POOL_SIZE = int(os.getenv("DOCLING_CONVERTER_POOL_SIZE", "2"))
+
+
+@dataclass(frozen=True)
+class ConverterOptions:
+    """
+    Opções do pipeline PDF do Docling (chave do pool).
+
+    Attributes:
+        do_ocr: Executar OCR nas páginas
+        do_table_structure: Reconhecer a estrutura das tabelas
+    """
+    do_ocr: bool = True
+    do_table_structure: bool = True
+
+
+DEFAULT_CONVERTER_OPTIONS = ConverterOptions()
+# Páginas com camada de texto: o Docling usa o texto embutido, sem OCR
+NO_OCR_CONVERTER_OPTIONS = ConverterOptions(do_ocr=False)
+
+
+def build_converter(options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS) -> DocumentConverter:
+    """
+    Cria um DocumentConverter com os modelos do pipeline PDF já carregados.
+
+    Args:
+        options: Opções do pipeline
+
+    Returns:
+        DocumentConverter inicializado
+    """
+    pipeline_options = PdfPipelineOptions(
+        do_ocr=options.do_ocr,
+        do_table_structure=options.do_table_structure
+    )
+    converter = DocumentConverter(
+        format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+    )
+
+    # Carregar os modelos de layout/tabelas agora, e não na primeira conversão
+    converter.initialize_pipeline(InputFormat.PDF)
+
+    return converter
+
+
+class DocumentConverterPool:
+    """
+    Pool de DocumentConverter por configuração do pipeline.
+
+    Conversores são criados sob demanda e devolvidos ao pool depois do uso;
+    até max_idle conversores ociosos são mantidos por configuração.
+    """
+
+    def __init__(self, max_idle: int = DOCLING_CONVERTER_POOL_SIZE):
+        """
+        Inicializa o pool.
+
+        Args:
+            max_idle: Máximo de conversores ociosos mantidos por configuração
+        """
+        self.max_idle = max_idle
+        self._idle: Dict[ConverterOptions, List[DocumentConverter]] = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._init_time_s = 0.0
+
+    def _create(self, options: ConverterOptions) -> DocumentConverter:
+        start = time.perf_counter()
+        converter = build_converter(options)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._created += 1
+            self._init_time_s += elapsed
+
+        logger.info(f"✅ Conversor Docling criado ({asdict(options)}) em {elapsed:.2f}s")
+        return converter
+
+    def _acquire(self, options: ConverterOptions) -> DocumentConverter:
+        with self._lock:
+            idle = self._idle.get(options)
+            if idle:
+                self._reused += 1
+                return idle.pop()
+
+        return self._create(options)
+
+    def _release(self, options: ConverterOptions, converter: DocumentConverter) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(options, [])
+            if len(idle) < self.max_idle:
+                idle.append(converter)
+
+    @contextmanager
+    def checkout(self, options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS) -> Iterator[DocumentConverter]:
+        """
+        Empresta um conversor para uso exclusivo durante o bloco.
+
+        Exemplo:
+            with converter_pool.checkout() as converter:
+                result = converter.convert(file_path)
+
+        Args:
+            options: Opções do pipeline
+
+        Yields:
+            DocumentConverter com os modelos carregados
+        """
+        converter = self._acquire(options)
+        try:
+            yield converter
+        finally:
+            self._release(options, converter)
+
+    def warmup(self, options: ConverterOptions = DEFAULT_CONVERTER_OPTIONS) -> Dict:
+        """
+        Garante um conversor pronto para a configuração (chamado no startup do worker).
+
+        Args:
+            options: Opções do pipeline
+
+        Returns:
+            Estatísticas do pool
+        """
+        with self._lock:
+            ready = bool(self._idle.get(options))
+
+        if not ready:
+            self._release(options, self._create(options))
+
+        return self.stats()
+
+    def stats(self) -> Dict:
+        """
+        Retorna estatísticas do pool.
+
+        Returns:
+            {"created", "reused", "init_time_s", "idle"}
+        """
+        with self._lock:
+            return {
+                "created": self._created,
+                "reused": self._reused,
+                "init_time_s": round(self._init_time_s, 3),
+                "idle": {str(asdict(options)): len(idle) for options, idle in self._idle.items()}
+            }
+
+
+# Pool global do processo
+converter_pool = DocumentConverterPool()
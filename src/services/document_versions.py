@@ -0,0 +1,224 @@
+"""
+Novas Versões de Documentos (Reingestão Incremental)
+
+Este módulo compara uma nova revisão de um PDF com a versão já indexada,
+página por página, para que apenas as páginas alteradas sejam reprocessadas:
+1. Impressão digital por página (hash do texto e das imagens, via PyMuPDF)
+2. Alinhamento das páginas antigas e novas (páginas inseridas, removidas ou movidas)
+3. Plano da revisão: páginas a reprocessar e páginas mantidas (nova → antiga)
+4. Chunks das páginas mantidas reaproveitados do ChromaDB, com os embeddings
+"""
+
+import difflib
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.auth.database import DocumentPage
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PageFingerprint:
+    """
+    Impressão digital de uma página do PDF.
+
+    Attributes:
+        text_hash: SHA-256 do texto da página (espaços normalizados)
+        image_hash: SHA-256 dos streams das imagens da página, em ordem
+    """
+    text_hash: str
+    image_hash: str
+
+
+@dataclass
+class RevisionPlan:
+    """
+    Resultado da comparação entre duas versões de um documento.
+
+    Attributes:
+        page_count: Número de páginas da nova versão
+        affected_pages: Páginas da nova versão a reprocessar (ordenadas)
+        kept_pages: Páginas mantidas {página nova: página antiga}
+    """
+    page_count: int
+    affected_pages: List[int]
+    kept_pages: Dict[int, int]
+
+
+def compute_page_fingerprints(file_path: str) -> List[PageFingerprint]:
+    """
+    Calcula a impressão digital de cada página do PDF com PyMuPDF.
+
+    Args:
+        file_path: Caminho do arquivo PDF
+
+    Returns:
+        Lista de PageFingerprint (índice 0 = página 1)
+    """
+    import fitz  # PyMuPDF
+
+    fingerprints = []
+    with fitz.open(file_path) as pdf_document:
+        for page in pdf_document:
+            text = " ".join(page.get_text("text").split())
+
+            image_hasher = hashlib.sha256()
+            for img in page.get_images(full=True):
+                image_hasher.update(hashlib.sha256(pdf_document.xref_stream_raw(img[0]) or b"").digest())
+
+            fingerprints.append(PageFingerprint(
+                text_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                image_hash=image_hasher.hexdigest()
+            ))
+
+    return fingerprints
+
+
+def load_page_fingerprints(db: Session, doc_id: str) -> List[PageFingerprint]:
+    """
+    Lê as impressões digitais da versão indexada de um documento.
+
+    Args:
+        db: Sessão do banco de dados
+        doc_id: ID do documento
+
+    Returns:
+        Lista de PageFingerprint (vazia se o documento não tem impressões completas)
+    """
+    rows = (
+        db.query(DocumentPage)
+        .filter(DocumentPage.document_id == doc_id)
+        .order_by(DocumentPage.page_number)
+        .all()
+    )
+
+    # Páginas faltando: tratar como documento sem versão anterior
+    if [row.page_number for row in rows] != list(range(1, len(rows) + 1)):
+        return []
+
+    return [PageFingerprint(text_hash=row.text_hash, image_hash=row.image_hash) for row in rows]
+
+
+def save_page_fingerprints(db: Session, doc_id: str, fingerprints: List[PageFingerprint], commit: bool = True) -> None:
+    """
+    Substitui as impressões digitais registradas de um documento.
+
+    Args:
+        db: Sessão do banco de dados
+        doc_id: ID do documento
+        fingerprints: Impressões da versão indexada (índice 0 = página 1)
+        commit: Se False, apenas adiciona as alterações à sessão
+    """
+    db.query(DocumentPage).filter(DocumentPage.document_id == doc_id).delete(synchronize_session=False)
+    db.add_all([
+        DocumentPage(
+            document_id=doc_id,
+            page_number=page_number,
+            text_hash=fingerprint.text_hash,
+            image_hash=fingerprint.image_hash
+        )
+        for page_number, fingerprint in enumerate(fingerprints, start=1)
+    ])
+    if commit:
+        db.commit()
+
+
+def plan_revision(
+    old: List[PageFingerprint],
+    new: List[PageFingerprint],
+    carry_overlap: bool = True
+) -> RevisionPlan:
+    """
+    Compara as páginas da versão indexada com as da nova versão.
+
+    As páginas são alinhadas como sequências (difflib), de modo que uma
+    página inserida no início não marca as seguintes como alteradas; as
+    páginas iguais que mudaram de posição são mantidas com o novo número.
+
+    Args:
+        old: Impressões da versão indexada
+        new: Impressões da nova versão
+        carry_overlap: Se True, reprocessa também as páginas mantidas cuja
+                       página anterior mudou (o chunking semântico leva o
+                       overlap do fim de uma página para o início da seguinte)
+
+    Returns:
+        RevisionPlan
+    """
+    matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+
+    page_map = {}
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            page_map[block.b + offset + 1] = block.a + offset + 1
+
+    affected = set()
+    for page in range(1, len(new) + 1):
+        old_page = page_map.get(page)
+        if old_page is None:
+            affected.add(page)
+            continue
+
+        if carry_overlap:
+            # A página anterior precisa ser a mesma da versão indexada (uma página
+            # inserida antes também leva overlap novo para esta)
+            if page > 1:
+                same_previous = page - 1 in page_map and page_map[page - 1] == old_page - 1
+            else:
+                same_previous = old_page == 1
+            if not same_previous:
+                affected.add(page)
+
+    return RevisionPlan(
+        page_count=len(new),
+        affected_pages=sorted(affected),
+        kept_pages={page: old_page for page, old_page in page_map.items() if page not in affected}
+    )
+
+
+def load_kept_chunks(collection, doc_id: str, kept_pages: Dict[int, int]) -> Dict[int, List[Dict]]:
+    """
+    Lê do ChromaDB os chunks das páginas mantidas, com os embeddings.
+
+    Cada chunk volta com a página renumerada para a nova versão, o embedding
+    já calculado e "previous" = (chunk_id, página) na versão indexada.
+
+    Args:
+        collection: Coleção Chroma nativa do usuário
+        doc_id: ID do documento
+        kept_pages: Páginas mantidas {página nova: página antiga}
+
+    Returns:
+        {página nova: [chunk, ...]} na ordem original dos chunks
+    """
+    new_by_old = {old_page: page for page, old_page in kept_pages.items()}
+    existing = collection.get(where={"document_id": doc_id}, include=["documents", "metadatas", "embeddings"])
+
+    rows = sorted(
+        zip(existing["ids"], existing["documents"], existing["metadatas"], existing["embeddings"]),
+        key=lambda row: int(row[0].rpartition("_chunk_")[2] or 0)
+    )
+
+    kept_chunks = {}
+    for chunk_id, text, metadata, embedding in rows:
+        old_page = metadata.get("page", 0)
+        page = new_by_old.get(old_page)
+        if page is None:
+            continue
+
+        kept_chunks.setdefault(page, []).append({
+            "content": text,
+            "metadata": {**metadata, "page": page},
+            "embedding": np.asarray(embedding, dtype=np.float32),
+            "previous": (chunk_id, old_page)
+        })
+
+    return kept_chunks
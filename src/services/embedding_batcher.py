@@ -0,0 +1,203 @@
+"""
+Micro-batching de Embeddings de Queries
+
+Este módulo agrupa as queries que chegam ao mesmo tempo em um único forward
+pass do modelo de embeddings:
+1. Cada requisição consulta o cache de queries e, em caso de miss, entra na fila
+2. O primeiro item abre uma janela de até QUERY_BATCH_MAX_WAIT_MS
+3. O lote (até QUERY_BATCH_MAX_SIZE queries) é codificado em um thread do executor
+4. Cada coroutine recebe seu embedding de volta
+5. Métricas de tamanho de lote e tempo de espera na fila
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.services.embeddings import CachedEmbeddings, get_embedding_function, normalize_query_text
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "16"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+
+class QueryEmbeddingBatcher:
+    """
+    Agrupa queries concorrentes em lotes para o modelo de embeddings.
+
+    Deve ser usado a partir de um único event loop (o da aplicação).
+    """
+
+    def __init__(
+        self,
+        embeddings: CachedEmbeddings,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS
+    ):
+        """
+        Inicializa o batcher.
+
+        Args:
+            embeddings: Modelo de embeddings compartilhado
+            max_batch_size: Número máximo de queries por forward pass
+            max_wait_ms: Tempo máximo de espera por mais queries após a primeira
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = self.loop.create_task(self._run())
+
+        # Métricas
+        self._batches = 0
+        self._queries = 0
+        self._max_batch = 0
+        self._queue_wait_total_s = 0.0
+        self._queue_wait_max_s = 0.0
+        self._encode_total_s = 0.0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Retorna o embedding de uma query (do cache ou de um lote).
+
+        Args:
+            text: Texto da query
+
+        Returns:
+            Array float32 de shape (dim,)
+        """
+        key = normalize_query_text(text)
+
+        cached = self.embeddings.get_cached_query(key)
+        if cached is not None:
+            return cached
+
+        future = self.loop.create_future()
+        await self._queue.put((key, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = self.loop.time() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+
+            # Queries idênticas no mesmo lote são codificadas uma vez
+            keys = list(dict.fromkeys(key for key, _, _ in batch))
+
+            try:
+                vectors = await self.loop.run_in_executor(None, self.embeddings.encode_queries, keys)
+            except Exception as e:
+                logger.error(f"Erro ao codificar lote de {len(keys)} queries: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            by_key = {}
+            for key, vector in zip(keys, vectors):
+                vector = np.ascontiguousarray(vector)
+                self.embeddings.cache_query(key, vector)
+                by_key[key] = vector
+
+            for key, future, _ in batch:
+                if not future.done():
+                    future.set_result(by_key[key])
+
+            # Atualizar métricas
+            waits = [started - enqueued_at for _, _, enqueued_at in batch]
+            self._batches += 1
+            self._queries += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._queue_wait_total_s += sum(waits)
+            self._queue_wait_max_s = max(self._queue_wait_max_s, max(waits))
+            self._encode_total_s += time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        """
+        Retorna as métricas do batcher.
+
+        Returns:
+            {"batches", "queries", "avg_batch_size", "max_batch_size",
+             "avg_queue_wait_ms", "max_queue_wait_ms", "avg_encode_ms", "pending"}
+        """
+        return {
+            "batches": self._batches,
+            "queries": self._queries,
+            "avg_batch_size": round(self._queries / self._batches, 2) if self._batches else 0.0,
+            "max_batch_size": self._max_batch,
+            "avg_queue_wait_ms": round(1000 * self._queue_wait_total_s / self._queries, 3) if self._queries else 0.0,
+            "max_queue_wait_ms": round(1000 * self._queue_wait_max_s, 3),
+            "avg_encode_ms": round(1000 * self._encode_total_s / self._batches, 3) if self._batches else 0.0,
+            "pending": self._queue.qsize()
+        }
+
+    def close(self) -> None:
+        """Encerra a tarefa de processamento."""
+        self._task.cancel()
+
+
+_batcher: Optional[QueryEmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    """
+    Retorna o batcher do event loop atual, criando-o se necessário.
+
+    Returns:
+        QueryEmbeddingBatcher ligado ao loop em execução
+    """
+    global _batcher
+
+    loop = asyncio.get_running_loop()
+    with _batcher_lock:
+        if _batcher is None or _batcher.loop is not loop or _batcher.loop.is_closed():
+            _batcher = QueryEmbeddingBatcher(get_embedding_function())
+        return _batcher
+
+
+async def embed_query_async(text: str) -> np.ndarray:
+    """
+    Gera o embedding de uma query passando pelo cache e pelo micro-batcher.
+
+    Args:
+        text: Texto da query
+
+    Returns:
+        Array float32 de shape (dim,)
+    """
+    return await get_query_batcher().embed(text)
+
+
+def get_query_batcher_stats() -> Dict:
+    """
+    Retorna as métricas do batcher atual (vazio se ainda não foi criado).
+
+    Returns:
+        Métricas do batcher
+    """
+    return _batcher.stats() if _batcher is not None else {}
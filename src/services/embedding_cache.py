@@ -0,0 +1,297 @@
+"""
+Cache de Embeddings de Chunks
+
+Este módulo guarda em disco os embeddings já calculados na ingestão, para que
+reindexações e novas revisões de um manual não recodifiquem chunks iguais:
+1. Chave (modelo:backend, SHA-256 do texto do chunk), valor float32 em bytes
+2. Banco SQLite próprio (EMBEDDING_CACHE_PATH), separado do banco da aplicação
+3. Limite de tamanho com remoção dos menos usados recentemente (LRU); o total
+   gravado é mantido por triggers em uma tabela de metadados (sem varrer o cache)
+4. Apenas os textos ausentes do cache vão para o modelo; hits/misses por ingestão
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))  # 0 desativa o cache
+
+# Fração do limite mantida após uma remoção (evita remover a cada escrita)
+_EVICTION_TARGET_RATIO = 0.9
+# Máximo de parâmetros por consulta IN (limite do SQLite)
+_SQLITE_MAX_PARAMS = 500
+
+
+def hash_text(text: str) -> bytes:
+    """
+    Calcula a chave de cache de um texto.
+
+    Args:
+        text: Texto do chunk
+
+    Returns:
+        SHA-256 do texto (32 bytes)
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings em SQLite.
+
+    Uma conexão por processo, protegida por lock; o modo WAL permite que
+    vários processos worker usem o mesmo arquivo.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_mb: float = EMBEDDING_CACHE_MAX_MB):
+        """
+        Abre (ou cria) o cache.
+
+        Args:
+            path: Caminho do arquivo SQLite
+            max_mb: Tamanho máximo dos vetores armazenados, em MB
+        """
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA busy_timeout=30000")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model_id TEXT NOT NULL,"
+            " text_hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model_id, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        # Índice de cobertura para a remoção LRU (lê last_used e size sem visitar os vetores)
+        self._connection.execute("DROP INDEX IF EXISTS ix_embeddings_last_used")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_lru ON embeddings (last_used, size)")
+        self._create_totals()
+        self._connection.commit()
+
+    def _create_totals(self) -> None:
+        """
+        Cria a tabela com o total de entradas e bytes, mantida por triggers na
+        mesma transação das escritas (válida para todos os processos).
+        """
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_totals ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " entries INTEGER NOT NULL,"
+            " size INTEGER NOT NULL"
+            ")"
+        )
+        self._connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_totals_insert AFTER INSERT ON embeddings BEGIN"
+            " UPDATE cache_totals SET entries = entries + 1, size = size + NEW.size WHERE id = 1;"
+            " END"
+        )
+        self._connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_totals_delete AFTER DELETE ON embeddings BEGIN"
+            " UPDATE cache_totals SET entries = entries - 1, size = size - OLD.size WHERE id = 1;"
+            " END"
+        )
+        # Caches criados antes da tabela de totais: calcular uma única vez
+        self._connection.execute(
+            "INSERT OR IGNORE INTO cache_totals (id, entries, size)"
+            " SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+        )
+
+    def _totals(self) -> Tuple[int, int]:
+        # Chamado com o lock adquirido
+        return self._connection.execute("SELECT entries, size FROM cache_totals WHERE id = 1").fetchone()
+
+    def get_many(self, model_id: str, text_hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Busca embeddings no cache e marca os encontrados como usados.
+
+        Args:
+            model_id: Identificador do modelo ("modelo:backend")
+            text_hashes: Chaves dos textos (hash_text)
+
+        Returns:
+            {text_hash: array float32} apenas para as chaves encontradas
+        """
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(text_hashes), _SQLITE_MAX_PARAMS):
+                batch = text_hashes[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model_id = ? AND text_hash IN ({placeholders})",
+                    [model_id, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+
+            if found:
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model_id = ? AND text_hash = ?",
+                    [(now, model_id, text_hash) for text_hash in found]
+                )
+                self._connection.commit()
+
+            self._hits += len(found)
+            self._misses += len(text_hashes) - len(found)
+
+        return found
+
+    def put_many(self, model_id: str, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        """
+        Grava embeddings no cache e remove os menos usados se o limite foi excedido.
+
+        Args:
+            model_id: Identificador do modelo ("modelo:backend")
+            items: Lista de (text_hash, embedding)
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for text_hash, embedding in items:
+            vector = np.ascontiguousarray(embedding, dtype=np.float32).tobytes()
+            rows.append((model_id, text_hash, vector, len(vector), now))
+
+        with self._lock:
+            # Mesma chave = mesmo texto e modelo: o vetor não muda, só last_used
+            # (sem REPLACE, que apagaria a linha sem disparar o trigger de totais)
+            self._connection.executemany(
+                "INSERT INTO embeddings (model_id, text_hash, vector, size, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (model_id, text_hash) DO UPDATE SET last_used = excluded.last_used",
+                rows
+            )
+            self._connection.commit()
+            self._evict_if_needed()
+
+    def _evict_if_needed(self) -> None:
+        # Chamado com o lock adquirido
+        _, total = self._totals()
+        if total <= self.max_bytes:
+            return
+
+        # Encontrar o last_used de corte que libera o excedente (mais antigos primeiro)
+        to_free = total - int(self.max_bytes * _EVICTION_TARGET_RATIO)
+        freed = 0
+        cutoff = None
+        for last_used, size in self._connection.execute("SELECT last_used, size FROM embeddings ORDER BY last_used"):
+            freed += size
+            cutoff = last_used
+            if freed >= to_free:
+                break
+
+        deleted = self._connection.execute("DELETE FROM embeddings WHERE last_used <= ?", (cutoff,)).rowcount
+        self._connection.commit()
+        self._evicted += deleted
+
+        logger.info(f"🧹 Cache de embeddings: {deleted} entradas removidas ({freed / (1024 * 1024):.1f} MB)")
+
+    def stats(self) -> Dict:
+        """
+        Retorna estatísticas do cache desde a abertura no processo.
+
+        Returns:
+            {"entries", "size_mb", "max_mb", "hits", "misses", "hit_rate", "evicted"}
+        """
+        with self._lock:
+            entries, total = self._totals()
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "size_mb": round(total / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evicted": self._evicted
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Retorna o cache de embeddings do processo, abrindo-o na primeira chamada.
+
+    Returns:
+        EmbeddingCache compartilhado ou None se EMBEDDING_CACHE_MAX_MB = 0
+    """
+    global _cache
+
+    if EMBEDDING_CACHE_MAX_MB <= 0:
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+                logger.info(f"Cache de embeddings aberto em {EMBEDDING_CACHE_PATH} (limite {EMBEDDING_CACHE_MAX_MB} MB)")
+
+    return _cache
+
+
+def embed_texts_cached(model, texts: List[str], stats: Optional[Dict] = None) -> np.ndarray:
+    """
+    Gera embeddings de documentos consultando o cache antes do modelo.
+
+    Apenas os textos ausentes do cache (sem repetição) são codificados; os
+    novos embeddings são gravados no cache.
+
+    Args:
+        model: Instância de CachedEmbeddings (com model_id)
+        texts: Textos dos chunks
+        stats: Dicionário opcional acumulando {"hits", "misses"} (por ingestão)
+
+    Returns:
+        Array float32 de shape (len(texts), dim)
+    """
+    cache = get_embedding_cache()
+    if cache is None or not texts:
+        if stats is not None:
+            stats["misses"] = stats.get("misses", 0) + len(texts)
+        return model.embed_documents_array(texts)
+
+    hashes = [hash_text(text) for text in texts]
+    unique_hashes = list(dict.fromkeys(hashes))
+    cached = cache.get_many(model.model_id, unique_hashes)
+
+    # Codificar cada texto ausente uma única vez
+    missing = {}
+    for text, text_hash in zip(texts, hashes):
+        if text_hash not in cached and text_hash not in missing:
+            missing[text_hash] = text
+
+    if missing:
+        encoded = model.embed_documents_array(list(missing.values()))
+        new_items = list(zip(missing.keys(), encoded))
+        cache.put_many(model.model_id, new_items)
+        cached.update(new_items)
+
+    if stats is not None:
+        stats["hits"] = stats.get("hits", 0) + len(texts) - len(missing)
+        stats["misses"] = stats.get("misses", 0) + len(missing)
+
+    return np.stack([cached[text_hash] for text_hash in hashes]).astype(np.float32, copy=False)
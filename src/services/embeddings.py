@@ -0,0 +1,484 @@
+"""
+Registro de Modelos de Embedding
+
+Este módulo centraliza o carregamento dos modelos de embedding usados pela
+ingestão e pela busca:
+1. Wrapper LangChain sobre Sentence Transformers
+2. Registro por processo (cada modelo é carregado uma única vez)
+3. Carregamento thread-safe (requisições concorrentes compartilham a mesma instância)
+4. Métricas de carregamento (tempo e memória residente)
+5. Cache LRU de embeddings de queries e codificação de documentos em lote
+6. Backend selecionável (EMBEDDING_BACKEND): torch, onnx ou onnx-int8
+7. Contagem de tokens com o tokenizer do próprio modelo (dimensionamento de chunks)
+"""
+
+import logging
+import os
+import threading
+import time
+import unicodedata
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/clip-ViT-B-32-multilingual-v1"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+
+def get_process_rss_mb() -> float:
+    """
+    Retorna a memória residente (RSS) do processo atual em MB.
+
+    Returns:
+        RSS em MB ou 0.0 se psutil não estiver disponível
+    """
+    try:
+        import psutil
+    except ImportError:
+        return 0.0
+
+    return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Normaliza o texto de uma query para uso como chave de cache.
+
+    Aplica normalização Unicode (NFKC) e colapsa espaços em branco, de modo que
+    variações triviais da mesma pergunta compartilhem o embedding.
+
+    Args:
+        text: Texto da query
+
+    Returns:
+        Texto normalizado
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Base para os backends de embedding.
+
+    Implementa sobre um único método de codificação (_encode):
+    - Cache LRU de embeddings de queries, com contadores de hits/misses
+    - Caminho em lote para documentos, retornando arrays float32 contíguos
+      e ordenando as entradas por tamanho para reduzir padding
+    - Contagem de tokens (as subclasses definem tokenizer e max_seq_length)
+    """
+
+    tokenizer = None
+    max_seq_length: Optional[int] = None
+    model_id: Optional[str] = None  # "modelo:backend" (chave do cache de embeddings em disco)
+
+    def __init__(self, query_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE, batch_size: int = EMBEDDING_BATCH_SIZE):
+        """
+        Inicializa o cache de queries.
+
+        Args:
+            query_cache_size: Número máximo de queries no cache (0 desativa)
+            batch_size: Tamanho dos lotes em embed_documents_array
+        """
+        self.query_cache_size = query_cache_size
+        self.batch_size = batch_size
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._query_cache_hits = 0
+        self._query_cache_misses = 0
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Codifica um lote de textos.
+
+        Args:
+            texts: Lista de textos
+
+        Returns:
+            Array float32 de shape (len(texts), dim)
+        """
+
+    def embed_documents_array(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Gera embeddings para uma lista de documentos como array NumPy.
+
+        Os textos são ordenados por tamanho antes de formar os lotes (textos de
+        tamanho parecido no mesmo lote desperdiçam menos padding) e o resultado
+        volta na ordem original.
+
+        Args:
+            texts: Lista de textos
+            batch_size: Tamanho dos lotes (padrão: self.batch_size)
+
+        Returns:
+            Array float32 contíguo de shape (len(texts), dim)
+        """
+        batch_size = batch_size or self.batch_size
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result = None
+
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            batch_embeddings = self._encode([texts[i] for i in batch_indices])
+
+            if result is None:
+                result = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+            result[batch_indices] = batch_embeddings
+
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para uma lista de documentos.
+
+        Args:
+            texts: Lista de textos
+
+        Returns:
+            Lista de embeddings (lista de floats)
+        """
+        return self.embed_documents_array(texts).tolist()
+
+    def get_cached_query(self, key: str) -> Optional[np.ndarray]:
+        """
+        Consulta o cache de queries (contabilizando hit/miss).
+
+        Args:
+            key: Texto da query já normalizado (normalize_query_text)
+
+        Returns:
+            Embedding em cache ou None
+        """
+        with self._query_cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                self._query_cache_hits += 1
+                return cached
+            self._query_cache_misses += 1
+            return None
+
+    def cache_query(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Armazena o embedding de uma query no cache.
+
+        Args:
+            key: Texto da query já normalizado (normalize_query_text)
+            embedding: Embedding da query
+        """
+        embedding.setflags(write=False)  # Compartilhado entre chamadas
+
+        if self.query_cache_size <= 0:
+            return
+
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+
+    def encode_queries(self, keys: List[str]) -> np.ndarray:
+        """
+        Codifica um lote de queries em um único forward pass (sem cache).
+
+        Args:
+            keys: Textos das queries já normalizados
+
+        Returns:
+            Array float32 de shape (len(keys), dim)
+        """
+        return self._encode(keys)
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """
+        Gera (ou recupera do cache) o embedding de uma query.
+
+        Args:
+            text: Texto da query
+
+        Returns:
+            Array float32 de shape (dim,)
+        """
+        key = normalize_query_text(text)
+
+        cached = self.get_cached_query(key)
+        if cached is not None:
+            return cached
+
+        embedding = self.encode_queries([key])[0]
+        self.cache_query(key, embedding)
+
+        return embedding
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Gera embedding para uma query.
+
+        Args:
+            text: Texto da query
+
+        Returns:
+            Embedding (lista de floats)
+        """
+        return self.embed_query_array(text).tolist()
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Conta os tokens de um texto (sem os tokens especiais).
+
+        Args:
+            text: Texto
+
+        Returns:
+            Número de tokens
+        """
+        encoded = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+        return len(encoded["input_ids"])
+
+    @property
+    def max_content_tokens(self) -> int:
+        """
+        Número máximo de tokens de texto que o modelo codifica sem truncar
+        (max_seq_length menos os tokens especiais, ex: [CLS] e [SEP]).
+        """
+        return self.max_seq_length - self.tokenizer.num_special_tokens_to_add(pair=False)
+
+    def query_cache_stats(self) -> Dict:
+        """
+        Retorna estatísticas do cache de queries.
+
+        Returns:
+            {"size", "max_size", "hits", "misses", "hit_rate"}
+        """
+        with self._query_cache_lock:
+            total = self._query_cache_hits + self._query_cache_misses
+            return {
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size,
+                "hits": self._query_cache_hits,
+                "misses": self._query_cache_misses,
+                "hit_rate": round(self._query_cache_hits / total, 4) if total else 0.0
+            }
+
+
+class SentenceTransformerEmbeddings(CachedEmbeddings):
+    """
+    Wrapper para usar Sentence Transformers com LangChain.
+
+    Implementa a interface Embeddings do LangChain usando
+    a biblioteca sentence-transformers nativa.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, **kwargs):
+        """
+        Inicializa o modelo Sentence Transformer.
+
+        Args:
+            model_name: Nome do modelo no Hugging Face
+        """
+        # Import local: os backends ONNX não precisam carregar o PyTorch
+        from sentence_transformers import SentenceTransformer
+
+        super().__init__(**kwargs)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        logger.info(f"Modelo Sentence Transformer carregado: {model_name}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def create_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> CachedEmbeddings:
+    """
+    Instancia o modelo de embeddings no backend solicitado.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+        backend: "torch", "onnx" ou "onnx-int8"
+
+    Returns:
+        Instância de CachedEmbeddings
+
+    Raises:
+        ValueError: Se o backend não for suportado
+    """
+    if backend == "torch":
+        model = SentenceTransformerEmbeddings(model_name=model_name)
+    elif backend in ("onnx", "onnx-int8"):
+        from src.services.onnx_embeddings import OnnxEmbeddings
+        model = OnnxEmbeddings(model_name=model_name, quantize=backend == "onnx-int8")
+    else:
+        raise ValueError(f"Backend de embeddings não suportado: {backend} (opções: {', '.join(EMBEDDING_BACKENDS)})")
+
+    model.model_id = f"{model_name}:{backend}"
+    return model
+
+
+class EmbeddingModelRegistry:
+    """
+    Registro de modelos de embedding compartilhado pelo processo.
+
+    Cada par (modelo, backend) é carregado na primeira solicitação e reutilizado
+    por todas as chamadas seguintes. O carregamento usa um lock por modelo, de modo que
+    requisições concorrentes esperam o primeiro carregamento em vez de
+    carregar os pesos várias vezes.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, CachedEmbeddings] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def _get_lock(self, model_name: str) -> threading.Lock:
+        with self._registry_lock:
+            if model_name not in self._locks:
+                self._locks[model_name] = threading.Lock()
+            return self._locks[model_name]
+
+    def get(self, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> CachedEmbeddings:
+        """
+        Retorna o modelo de embedding, carregando-o se necessário.
+
+        Args:
+            model_name: Nome do modelo no Hugging Face
+            backend: "torch", "onnx" ou "onnx-int8"
+
+        Returns:
+            Instância compartilhada de CachedEmbeddings
+        """
+        key = f"{model_name}:{backend}"
+
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._get_lock(key):
+            # Outro thread pode ter carregado enquanto esperávamos o lock
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            rss_before = get_process_rss_mb()
+            start = time.perf_counter()
+
+            model = create_embeddings(model_name, backend)
+
+            load_time = time.perf_counter() - start
+            rss_after = get_process_rss_mb()
+
+            self._stats[key] = {
+                "load_time_s": round(load_time, 3),
+                "rss_before_mb": round(rss_before, 1),
+                "rss_after_mb": round(rss_after, 1),
+                "rss_delta_mb": round(rss_after - rss_before, 1),
+            }
+            self._models[key] = model
+
+            logger.info(
+                f"✅ Modelo de embedding registrado: {key} "
+                f"(carregamento: {load_time:.2f}s, RSS: {rss_before:.0f}MB → {rss_after:.0f}MB)"
+            )
+
+        return model
+
+    def warmup(self, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> Dict:
+        """
+        Carrega o modelo e executa uma inferência de aquecimento.
+
+        Args:
+            model_name: Nome do modelo no Hugging Face
+            backend: "torch", "onnx" ou "onnx-int8"
+
+        Returns:
+            Estatísticas de carregamento do modelo
+        """
+        model = self.get(model_name, backend)
+        model.embed_query("warmup")
+        return self.stats().get(f"{model_name}:{backend}", {})
+
+    def models(self) -> Dict[str, "CachedEmbeddings"]:
+        """
+        Retorna os modelos já carregados.
+
+        Returns:
+            Dicionário {"model_name:backend": instância}
+        """
+        return dict(self._models)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Retorna estatísticas de carregamento de todos os modelos registrados.
+
+        Returns:
+            Dicionário {"model_name:backend": {"load_time_s", "rss_before_mb", "rss_after_mb", "rss_delta_mb"}}
+        """
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+# Registro global do processo
+embedding_registry = EmbeddingModelRegistry()
+
+
+def get_embedding_function(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> CachedEmbeddings:
+    """
+    Retorna a função de embeddings (CLIP multilíngue, backend de EMBEDDING_BACKEND).
+
+    O modelo é carregado uma única vez por processo e compartilhado.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+        backend: "torch", "onnx" ou "onnx-int8"
+
+    Returns:
+        CachedEmbeddings compartilhado
+    """
+    return embedding_registry.get(model_name, backend)
+
+
+def get_token_counter(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Callable[[str], int]:
+    """
+    Retorna a função de contagem de tokens do modelo de embeddings.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+
+    Returns:
+        Função texto -> número de tokens
+    """
+    return get_embedding_function(model_name).count_tokens
+
+
+def get_max_content_tokens(model_name: str = DEFAULT_EMBEDDING_MODEL) -> int:
+    """
+    Retorna o limite de tokens de texto do modelo de embeddings.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+
+    Returns:
+        Número máximo de tokens codificados sem truncamento
+    """
+    return get_embedding_function(model_name).max_content_tokens
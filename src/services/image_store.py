@@ -0,0 +1,93 @@
+"""
+Armazenamento de Imagens Endereçado por Conteúdo
+
+Este módulo guarda os bytes das imagens extraídas em disco, fora do SQLite:
+1. Cada imagem é identificada pelo SHA-256 do seu conteúdo
+2. Imagens idênticas (logos, ícones repetidos em todas as páginas) são gravadas uma única vez
+3. Gravação atômica (arquivo temporário + rename)
+
+O SQLite (DocumentImage) guarda apenas os metadados e o hash.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from io import BytesIO
+from typing import Tuple
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIRECTORY = os.getenv("IMAGE_STORE_DIR", "./image_store")
+
+
+def get_image_path(content_hash: str, image_format: str) -> str:
+    """
+    Retorna o caminho do arquivo de uma imagem no store.
+
+    Args:
+        content_hash: SHA-256 do conteúdo (hex)
+        image_format: Formato/extensão (png, jpeg, ...)
+
+    Returns:
+        Caminho do arquivo
+    """
+    return os.path.join(IMAGE_STORE_DIRECTORY, content_hash[:2], f"{content_hash}.{image_format}")
+
+
+def store_image_bytes(data: bytes, image_format: str) -> str:
+    """
+    Grava os bytes de uma imagem no store (se ainda não existirem).
+
+    Args:
+        data: Bytes da imagem já codificada
+        image_format: Formato/extensão (png, jpeg, ...)
+
+    Returns:
+        SHA-256 do conteúdo (hex)
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = get_image_path(content_hash, image_format)
+
+    if os.path.exists(path):
+        return content_hash
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+    return content_hash
+
+
+def encode_pil_image(image_pil) -> Tuple[bytes, str]:
+    """
+    Codifica uma imagem PIL em PNG.
+
+    Args:
+        image_pil: Imagem PIL
+
+    Returns:
+        Tupla (bytes, formato)
+    """
+    buffered = BytesIO()
+    image_pil.save(buffered, format="PNG")
+    return buffered.getvalue(), "png"
+
+
+def read_image_bytes(content_hash: str, image_format: str) -> bytes:
+    """
+    Lê os bytes de uma imagem do store.
+
+    Args:
+        content_hash: SHA-256 do conteúdo (hex)
+        image_format: Formato/extensão
+
+    Returns:
+        Bytes da imagem
+    """
+    with open(get_image_path(content_hash, image_format), "rb") as f:
+        return f.read()
@@ -3,7 +3,7 @@ Pipeline de Ingestão com Docling
 
 Este módulo implementa o pipeline completo de processamento de documentos PDF:
 1. Extração estruturada com Docling (texto, tabelas, figuras)
-2. Armazenamento de imagens no SQLite (base64)
+2. Armazenamento de imagens (bytes no image store, metadados no SQLite)
 3. Chunking adaptativo por tipo de conteúdo
 4. Geração de embeddings multimodais (CLIP)
 5. Armazenamento no ChromaDB
@@ -11,115 +11,121 @@ Este módulo implementa o pipeline completo de processamento de documentos PDF:
 
 import logging
 import os
+import threading
+import time
 import uuid
-import base64
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import groupby
 from io import BytesIO
 from datetime import datetime, timezone
-from typing import List, Dict
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 
 from docling.document_converter import DocumentConverter
-from langchain_chroma import Chroma
-from langchain_core.documents import Document as LangChainDocument
-from langchain_core.embeddings import Embeddings
-from sentence_transformers import SentenceTransformer
 
 from src.services.adaptive_chunker import split_text_with_metadata
 from src.services.chunking_strategy import SemanticChunker, expand_context_with_neighbors
-from src.auth.database import DocumentImage, Document
+from src.services.conversion_cache import (
+    CONVERSION_CACHE_ENABLED,
+    ConversionCacheWriter,
+    compute_file_hash,
+    iter_cached_windows,
+    load_conversion_manifest,
+)
+from src.services.converter_pool import (
+    DEFAULT_CONVERTER_OPTIONS,
+    NO_OCR_CONVERTER_OPTIONS,
+    ConverterOptions,
+    converter_pool,
+)
+from src.services.document_versions import (
+    compute_page_fingerprints,
+    load_kept_chunks,
+    load_page_fingerprints,
+    plan_revision,
+    save_page_fingerprints,
+)
+from src.services.embedding_cache import embed_texts_cached
+from src.services.embeddings import get_embedding_function, get_max_content_tokens, get_token_counter
+from src.services.vectorstore import get_chroma_collection
+from src.services.image_store import store_image_bytes, encode_pil_image
+from src.services.page_router import (
+    INGEST_PAGE_ROUTER,
+    INGEST_SELECTIVE_OCR,
+    ROUTE_DOCLING,
+    ROUTE_NATIVE,
+    NativePageWindow,
+    PageRoute,
+    find_pages_without_text_layer,
+    iter_route_runs,
+    route_pages,
+    split_page_runs,
+)
+from src.services.ingest_pipeline import PeakMemoryMonitor, StagePipeline, release_memory
+from src.auth.database import SessionLocal, DocumentImage, Document
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+VECTORSTORE_WRITE_BATCH_SIZE = int(os.getenv("VECTORSTORE_WRITE_BATCH_SIZE", "256"))
+# Páginas por chamada de conversão do Docling (0 = documento inteiro de uma vez)
+INGEST_CONVERT_WINDOW_PAGES = int(os.getenv("INGEST_CONVERT_WINDOW_PAGES", "16"))
+# Modo de baixa memória: "auto" (PDFs com INGEST_LOW_MEMORY_MIN_PAGES páginas ou mais), "1" ou "0"
+INGEST_LOW_MEMORY = os.getenv("INGEST_LOW_MEMORY", "auto").lower()
+INGEST_LOW_MEMORY_MIN_PAGES = int(os.getenv("INGEST_LOW_MEMORY_MIN_PAGES", "200"))
+INGEST_LOW_MEMORY_WINDOW_PAGES = int(os.getenv("INGEST_LOW_MEMORY_WINDOW_PAGES", "8"))
 
-class SentenceTransformerEmbeddings(Embeddings):
-    """
-    Wrapper para usar Sentence Transformers com LangChain.
-
-    Implementa a interface Embeddings do LangChain usando
-    a biblioteca sentence-transformers nativa.
-    """
-
-    def __init__(self, model_name: str = "sentence-transformers/clip-ViT-B-32-multilingual-v1"):
-        """
-        Inicializa o modelo Sentence Transformer.
-
-        Args:
-            model_name: Nome do modelo no Hugging Face
-        """
-        self.model = SentenceTransformer(model_name)
-        logger.info(f"Modelo Sentence Transformer carregado: {model_name}")
-
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """
-        Gera embeddings para uma lista de documentos.
-
-        Args:
-            texts: Lista de textos
-
-        Returns:
-            Lista de embeddings (lista de floats)
-        """
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
-
-    def embed_query(self, text: str) -> List[float]:
-        """
-        Gera embedding para uma query.
-
-        Args:
-            text: Texto da query
 
-        Returns:
-            Embedding (lista de floats)
-        """
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
-
-
-def get_embedding_function():
-    """
-    Retorna a função de embeddings (CLIP multilíngue via Sentence Transformers).
-
-    Returns:
-        SentenceTransformerEmbeddings configurado
+def build_image_record(
+    image_bytes: bytes,
+    image_format: str,
+    doc_id: str,
+    page_number: int,
+    caption: str
+) -> DocumentImage:
     """
-    return SentenceTransformerEmbeddings(
-        model_name="sentence-transformers/clip-ViT-B-32-multilingual-v1"
-    )
+    Grava os bytes da imagem no image store e monta o registro de metadados.
 
-
-def get_chroma_vectorstore(user_id: int):
-    """
-    Obtém ou cria um vector store Chroma para o usuário via LangChain.
+    O registro não é adicionado à sessão; quem chama decide quando persistir
+    (em lote, com um único commit por documento).
 
     Args:
-        user_id: ID do usuário
+        image_bytes: Bytes da imagem já codificada
+        image_format: Formato/extensão (png, jpeg, ...)
+        doc_id: ID do documento
+        page_number: Número da página
+        caption: Legenda da imagem
 
     Returns:
-        Chroma vector store do LangChain
+        DocumentImage (ainda não persistido)
     """
-    collection_name = f"user_{user_id}_documents"
+    content_hash = store_image_bytes(image_bytes, image_format)
 
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=get_embedding_function(),
-        persist_directory="./chroma_db"
+    return DocumentImage(
+        id=str(uuid.uuid4()),
+        document_id=doc_id,
+        page_number=page_number,
+        image_data="",  # Bytes ficam no image store (coluna mantida para imagens legadas em base64)
+        image_format=image_format,
+        content_hash=content_hash,
+        caption=caption,
+        created_at=datetime.now(timezone.utc)
     )
 
-    return vectorstore
-
 
 def save_image_to_db(
     image_pil,
     doc_id: str,
     page_number: int,
     caption: str,
-    db: Session
+    db: Session,
+    commit: bool = True
 ) -> str:
     """
-    Salva uma imagem no banco de dados SQLite.
+    Salva uma imagem PIL no image store e registra seus metadados no SQLite.
 
     Args:
         image_pil: Imagem PIL do Docling
@@ -127,46 +133,44 @@ def save_image_to_db(
         page_number: Número da página
         caption: Legenda da imagem
         db: Sessão do banco de dados
+        commit: Se False, apenas adiciona o registro à sessão
 
     Returns:
         ID da imagem salva
     """
-    image_id = str(uuid.uuid4())
-
-    # Converter PIL Image para base64
-    buffered = BytesIO()
-    image_pil.save(buffered, format="PNG")
-    img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-    # Salvar no banco
-    img_record = DocumentImage(
-        id=image_id,
-        document_id=doc_id,
-        page_number=page_number,
-        image_data=img_base64,
-        image_format="png",
-        caption=caption,
-        created_at=datetime.now(timezone.utc)
-    )
+    image_bytes, image_format = encode_pil_image(image_pil)
+    img_record = build_image_record(image_bytes, image_format, doc_id, page_number, caption)
 
     db.add(img_record)
-    db.commit()
+    if commit:
+        db.commit()
 
-    logger.info(f"Imagem {image_id} salva no banco (página {page_number})")
+    logger.info(f"Imagem {img_record.id} salva (página {page_number}, hash {img_record.content_hash[:12]})")
 
-    return image_id
+    return img_record.id
 
 
-def extract_images_from_pdf_with_pymupdf(file_path: str, doc_id: str, db: Session) -> Dict[int, List[str]]:
+def extract_images_from_pdf_with_pymupdf(
+    file_path: str,
+    doc_id: str,
+    db: Session,
+    pages: Optional[Set[int]] = None
+) -> Dict[int, List[str]]:
     """
     Extrai TODAS as imagens do PDF usando PyMuPDF, página por página.
 
     Esta função complementa o Docling extraindo imagens que ele não consegue (vetoriais, embutidas, etc).
+    Imagens PNG/JPEG em RGB são gravadas com os bytes originais (sem recodificar);
+    imagens repetidas no documento geram um único registro, referenciado por
+    todas as páginas em que aparecem. Imagens que o documento já tem
+    registradas (versão anterior) reutilizam o registro existente.
+    Os registros são inseridos em lote.
 
     Args:
         file_path: Caminho do arquivo PDF
         doc_id: ID do documento
         db: Sessão do banco de dados
+        pages: Páginas a extrair (padrão: todas)
 
     Returns:
         Dicionário mapeando número da página para lista de IDs de imagens:
@@ -181,12 +185,24 @@ def extract_images_from_pdf_with_pymupdf(file_path: str, doc_id: str, db: Sessio
     from PIL import Image
 
     page_images = {}  # {page_num: [image_id1, image_id2, ...]}
+    records = []
+    ids_by_xref = {}  # xref → image_id (mesma imagem referenciada em várias páginas)
+    ids_by_hash = {}  # content_hash → image_id (mesmo conteúdo em xrefs diferentes)
 
     try:
+        # Imagens já registradas para o documento (nova versão de um documento indexado)
+        for image_id, content_hash in (
+            db.query(DocumentImage.id, DocumentImage.content_hash)
+            .filter(DocumentImage.document_id == doc_id, DocumentImage.content_hash.isnot(None))
+        ):
+            ids_by_hash.setdefault(content_hash, image_id)
+
         pdf_document = fitz.open(file_path)
-        logger.info(f"PyMuPDF: Extraindo imagens de {len(pdf_document)} páginas...")
+        logger.info(f"PyMuPDF: Extraindo imagens de {len(pages) if pages is not None else len(pdf_document)} páginas...")
 
         for page_num in range(len(pdf_document)):
+            if pages is not None and page_num + 1 not in pages:
+                continue
             page = pdf_document[page_num]
             image_list = page.get_images(full=True)
 
@@ -195,20 +211,37 @@ def extract_images_from_pdf_with_pymupdf(file_path: str, doc_id: str, db: Sessio
             for img_index, img in enumerate(image_list):
                 try:
                     xref = img[0]
+                    if xref in ids_by_xref:
+                        image_id = ids_by_xref[xref]
+                        if image_id not in page_image_ids:
+                            page_image_ids.append(image_id)
+                        continue
+
                     base_image = pdf_document.extract_image(xref)
                     image_bytes = base_image["image"]
+                    image_format = base_image.get("ext", "")
 
-                    # Converter bytes para PIL Image
+                    # Manter bytes originais quando já são PNG/JPEG em RGB(A)
                     pil_image = Image.open(BytesIO(image_bytes))
+                    if image_format not in ("png", "jpeg") or pil_image.mode not in ('RGB', 'RGBA'):
+                        # Converter para RGB se necessário
+                        if pil_image.mode not in ('RGB', 'RGBA'):
+                            pil_image = pil_image.convert('RGB')
+                        image_bytes, image_format = encode_pil_image(pil_image)
 
-                    # Converter para RGB se necessário
-                    if pil_image.mode not in ('RGB', 'RGBA'):
-                        pil_image = pil_image.convert('RGB')
-
-                    # Salvar no banco
                     caption = f"Imagem extraída da página {page_num + 1}"
-                    image_id = save_image_to_db(pil_image, doc_id, page_num + 1, caption, db)
-                    page_image_ids.append(image_id)
+                    record = build_image_record(image_bytes, image_format, doc_id, page_num + 1, caption)
+
+                    if record.content_hash in ids_by_hash:
+                        image_id = ids_by_hash[record.content_hash]
+                    else:
+                        records.append(record)
+                        image_id = record.id
+                        ids_by_hash[record.content_hash] = image_id
+
+                    ids_by_xref[xref] = image_id
+                    if image_id not in page_image_ids:
+                        page_image_ids.append(image_id)
 
                 except Exception as e:
                     logger.warning(f"Erro ao extrair imagem {img_index} da página {page_num + 1}: {str(e)}")
@@ -219,11 +252,19 @@ def extract_images_from_pdf_with_pymupdf(file_path: str, doc_id: str, db: Sessio
 
         pdf_document.close()
 
+        # Inserção em lote: um único commit por documento
+        if records:
+            db.add_all(records)
+            db.commit()
+
         total_images = sum(len(ids) for ids in page_images.values())
-        logger.info(f"✅ PyMuPDF extraiu {total_images} imagens de {len(page_images)} páginas")
+        logger.info(f"✅ PyMuPDF extraiu {total_images} imagens de {len(page_images)} páginas "
+                    f"({len(records)} imagens distintas gravadas)")
 
     except Exception as e:
+        db.rollback()
         logger.error(f"Erro ao extrair imagens com PyMuPDF: {str(e)}")
+        return {}
 
     return page_images
 
@@ -254,8 +295,8 @@ def process_figure_element(element, doc_id: str, page: int, db: Session) -> Dict
         # Elemento picture sem PIL Image extraível - não é erro, apenas skip silencioso
         return None
 
-    # Salvar imagem no SQLite
-    image_id = save_image_to_db(image_pil, doc_id, page, caption, db)
+    # Salvar imagem (o commit acontece junto com o registro do documento)
+    image_id = save_image_to_db(image_pil, doc_id, page, caption, db, commit=False)
 
     # Criar chunk de referência
     chunk_content = caption if caption else f"[Figura na página {page}]"
@@ -359,12 +400,494 @@ def process_text_element(element, doc_id: str, page: int, file_path: str, image_
     return chunks
 
 
+def iter_docling_elements(docling_docs: Iterable, stats: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Percorre os elementos dos DoclingDocuments uma única vez.
+
+    Os documentos são janelas de páginas consecutivas do mesmo PDF (ou um
+    único documento com todas as páginas); element_id e section_header
+    continuam de uma janela para a seguinte.
+
+    Cada elemento é lido uma vez (tipo, texto, página da proveniência) e
+    entregue no formato do SemanticChunker, junto com o objeto Docling para
+    os handlers do modo tradicional. Usa a estratégia "último header visto"
+    para propagar section_header. Nenhuma referência é mantida após o yield.
+
+    Args:
+        docling_docs: Iterável de DoclingDocuments convertidos, em ordem de página
+        stats: Dicionário opcional preenchido durante a travessia com
+               total_elements, element_types, elements_with_images e
+               image_elements_sample (primeiros 10)
+
+    Yields:
+        {'text', 'page', 'type', 'element_id', 'section_header', 'element'}
+    """
+    if stats is None:
+        stats = {}
+    stats.update(total_elements=0, element_types={}, elements_with_images=0, image_elements_sample=[])
+    element_types = stats["element_types"]
+
+    last_section_header = ""
+    idx = 0
+
+    for docling_doc in docling_docs:
+        for element, level in docling_doc.iterate_items():
+            page = element.prov[0].page_no if element.prov else 0
+            el_type = element.label
+            text = element.text if hasattr(element, 'text') else ""
+
+            # Contar tipos de elementos
+            stats["total_elements"] += 1
+            element_types[el_type] = element_types.get(el_type, 0) + 1
+
+            # Detectar elementos com imagens (independente do tipo)
+            image = getattr(element, 'image', None)
+            if image is not None:
+                stats["elements_with_images"] += 1
+                if len(stats["image_elements_sample"]) < 10:
+                    stats["image_elements_sample"].append({
+                        'type': el_type,
+                        'page': page,
+                        'has_pil': hasattr(image, 'pil_image')
+                    })
+
+            # Atualizar o header corrente quando encontrar um section_header "de verdade"
+            if el_type == "section_header":
+                last_section_header = text.strip()
+
+            yield {
+                'text': text,
+                'page': page,
+                'type': el_type,
+                'element_id': idx,
+                'section_header': last_section_header,
+                'element': element
+            }
+            idx += 1
+
+        # Soltar a janela antes de pedir a próxima (permite liberá-la no modo de baixa memória)
+        del docling_doc
+
+
+def embed_chunks(chunks: List[Dict], cache_stats: Optional[Dict] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Gera os embeddings de um lote de chunks.
+
+    Textos já codificados pelo mesmo modelo vêm do cache de embeddings em
+    disco; apenas os ausentes passam pelo modelo. Chunks que já trazem o
+    embedding (mantidos de uma versão anterior) não são recodificados.
+
+    Args:
+        chunks: Lista de chunks {"content": ..., "metadata": {...}, "embedding" (opcional)}
+        cache_stats: Dicionário opcional acumulando {"hits", "misses"} do cache
+
+    Returns:
+        Tupla (textos, array float32 de shape (len(chunks), dim))
+    """
+    texts = [chunk["content"] for chunk in chunks]
+
+    reused = [i for i, chunk in enumerate(chunks) if chunk.get("embedding") is not None]
+    if not reused:
+        return texts, embed_texts_cached(get_embedding_function(), texts, cache_stats)
+
+    embeddings = np.empty((len(chunks), len(chunks[reused[0]]["embedding"])), dtype=np.float32)
+    for i in reused:
+        embeddings[i] = chunks[i].pop("embedding")
+
+    reused_set = set(reused)
+    missing = [i for i in range(len(chunks)) if i not in reused_set]
+    if missing:
+        embeddings[missing] = embed_texts_cached(get_embedding_function(), [texts[i] for i in missing], cache_stats)
+
+    return texts, embeddings
+
+
+def write_chunks(collection, chunks: List[Dict], texts: List[str], embeddings) -> None:
+    """
+    Grava um lote de chunks já com embeddings na coleção ChromaDB.
+
+    Args:
+        collection: Coleção Chroma nativa do usuário
+        chunks: Lista de chunks {"content": ..., "metadata": {..., "chunk_id": ...}}
+        texts: Textos dos chunks
+        embeddings: Embeddings dos chunks (mesma ordem)
+    """
+    collection.upsert(
+        ids=[chunk["metadata"]["chunk_id"] for chunk in chunks],
+        documents=texts,
+        metadatas=[chunk["metadata"] for chunk in chunks],
+        embeddings=embeddings
+    )
+
+
+def delete_stale_chunks(collection, doc_id: str, total_chunks: int) -> int:
+    """
+    Remove chunks de uma indexação anterior que não foram regravados.
+
+    Os IDs são sequenciais ({doc_id}_chunk_{n}); depois de uma reindexação com
+    menos chunks, os de índice >= total_chunks ficariam órfãos na coleção.
+
+    Args:
+        collection: Coleção Chroma nativa do usuário
+        doc_id: ID do documento
+        total_chunks: Número de chunks gravados nesta indexação
+
+    Returns:
+        Número de chunks removidos
+    """
+    prefix = f"{doc_id}_chunk_"
+    existing = collection.get(where={"document_id": doc_id}, include=[])
+
+    stale_ids = [
+        chunk_id for chunk_id in existing["ids"]
+        if not chunk_id.startswith(prefix)
+        or not chunk_id[len(prefix):].isdigit()
+        or int(chunk_id[len(prefix):]) >= total_chunks
+    ]
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+        logger.info(f"🧹 {len(stale_ids)} chunks antigos removidos do documento {doc_id}")
+
+    return len(stale_ids)
+
+
+def load_page_image_ids_from_vectorstore(user_id: int, doc_id: str) -> Dict[int, List[str]]:
+    """
+    Reconstrói o mapa página → imagens a partir dos chunks já indexados.
+
+    Usado na reindexação a partir do cache de conversões, sem abrir o PDF:
+    as imagens extraídas na ingestão original continuam valendo.
+
+    Args:
+        user_id: ID do usuário
+        doc_id: ID do documento
+
+    Returns:
+        {página: [image_id, ...]}
+    """
+    existing = get_chroma_collection(user_id).get(where={"document_id": doc_id}, include=["metadatas"])
+
+    page_images = {}
+    for metadata in existing["metadatas"]:
+        # Chunks de figura referenciam só a própria imagem, não as da página
+        if metadata.get("chunk_type") == "figure" or not metadata.get("image_ids"):
+            continue
+        page_images.setdefault(metadata.get("page", 0), metadata["image_ids"].split(","))
+
+    return page_images
+
+
+def add_chunks_to_vectorstore(user_id: int, chunks: List[Dict], batch_size: int = VECTORSTORE_WRITE_BATCH_SIZE) -> int:
+    """
+    Gera os embeddings dos chunks em lote e grava no ChromaDB do usuário.
+
+    Os embeddings são calculados como arrays float32 (sem listas Python de
+    floats) e gravados diretamente na coleção, com o chunk_id como ID.
+
+    Args:
+        user_id: ID do usuário
+        chunks: Lista de chunks {"content": ..., "metadata": {..., "chunk_id": ...}}
+        batch_size: Número de chunks por escrita no ChromaDB
+
+    Returns:
+        Número de chunks gravados
+    """
+    if not chunks:
+        return 0
+
+    collection = get_chroma_collection(user_id)
+
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        texts, embeddings = embed_chunks(batch)
+        write_chunks(collection, batch, texts, embeddings)
+
+    return len(chunks)
+
+
+def get_pdf_page_count(file_path: str) -> int:
+    """
+    Conta as páginas do PDF com PyMuPDF.
+
+    Args:
+        file_path: Caminho do arquivo PDF
+
+    Returns:
+        Número de páginas (0 se não foi possível abrir o arquivo)
+    """
+    try:
+        import fitz  # PyMuPDF
+
+        with fitz.open(file_path) as pdf_document:
+            return pdf_document.page_count
+    except Exception as e:
+        logger.warning(f"Não foi possível contar as páginas de {file_path}: {str(e)}")
+        return 0
+
+
+def is_low_memory_mode(page_count: int) -> bool:
+    """
+    Decide se o documento deve ser processado no modo de baixa memória.
+
+    Args:
+        page_count: Número de páginas do PDF
+
+    Returns:
+        True se INGEST_LOW_MEMORY=1, ou se "auto" e o PDF é grande
+    """
+    if INGEST_LOW_MEMORY in ("1", "true", "yes"):
+        return True
+    if INGEST_LOW_MEMORY == "auto":
+        return page_count >= INGEST_LOW_MEMORY_MIN_PAGES
+    return False
+
+
+def iter_element_runs(elements: Iterable[Dict], page_runs: List[Tuple[int, int]]) -> Iterator[Tuple[Optional[int], Iterator[Dict]]]:
+    """
+    Agrupa os elementos por intervalo de páginas (ex: páginas alteradas de uma nova versão).
+
+    Elementos sem página (page 0) ficam no intervalo do elemento anterior.
+
+    Args:
+        elements: Elementos em ordem de página (iter_docling_elements)
+        page_runs: Intervalos (primeira, última) página (split_page_runs)
+
+    Yields:
+        (primeira página do intervalo ou None, elementos do intervalo)
+    """
+    run_of_page = {page: start for start, end in page_runs for page in range(start, end + 1)}
+    current = None
+
+    def run_key(item: Dict) -> Optional[int]:
+        nonlocal current
+        current = run_of_page.get(item['page'], current)
+        return current
+
+    return groupby(elements, key=run_key)
+
+
+def get_run_seed_texts(kept_chunks: Dict[int, List[Dict]], page_runs: List[Tuple[int, int]]) -> Dict[int, str]:
+    """
+    Texto que antecede cada intervalo de páginas reprocessadas: o último chunk
+    mantido antes dele (o overlap do primeiro chunk novo vem do seu fim).
+
+    Args:
+        kept_chunks: Chunks mantidos {página nova: [chunk, ...]} (load_kept_chunks)
+        page_runs: Intervalos (primeira, última) das páginas reprocessadas, em ordem
+
+    Returns:
+        {primeira página do intervalo: texto}
+    """
+    seed_texts = {}
+    previous_end = 0
+    for start, end in page_runs:
+        # Apenas páginas mantidas entre o intervalo anterior e este
+        kept_before = [page for page in kept_chunks if previous_end < page < start and kept_chunks[page]]
+        if kept_before:
+            seed_texts[start] = kept_chunks[max(kept_before)][-1]["content"]
+        previous_end = end
+    return seed_texts
+
+
+def iter_converted_windows(
+    converter: DocumentConverter,
+    file_path: str,
+    page_count: int,
+    window_pages: int = INGEST_CONVERT_WINDOW_PAGES,
+    pages: Optional[List[int]] = None
+) -> Iterator:
+    """
+    Converte o PDF com Docling em janelas de páginas consecutivas.
+
+    Cada janela é entregue assim que convertida, para que as etapas seguintes
+    comecem antes do fim da conversão. Os números de página (prov.page_no)
+    continuam sendo os do PDF original.
+
+    Args:
+        converter: DocumentConverter do Docling
+        file_path: Caminho do arquivo PDF
+        page_count: Número de páginas do PDF (0 se desconhecido)
+        window_pages: Páginas por janela (0 = documento inteiro de uma vez)
+        pages: Converter apenas estas páginas (padrão: todas)
+
+    Yields:
+        DoclingDocument de cada janela, em ordem
+    """
+    if pages is not None:
+        for start, end in split_page_runs(pages, window_pages):
+            logger.info(f"📄 Convertendo páginas {start}-{end} de {page_count}...")
+            yield converter.convert(file_path, page_range=(start, end)).document
+        return
+
+    if window_pages <= 0 or page_count <= window_pages:
+        yield converter.convert(file_path).document
+        return
+
+    for start in range(1, page_count + 1, window_pages):
+        end = min(start + window_pages - 1, page_count)
+        logger.info(f"📄 Convertendo páginas {start}-{end} de {page_count}...")
+        yield converter.convert(file_path, page_range=(start, end)).document
+
+
+def iter_document_windows(
+    file_path: str,
+    page_count: int,
+    window_pages: int = INGEST_CONVERT_WINDOW_PAGES,
+    pages: Optional[List[int]] = None,
+    routes: Optional[List[PageRoute]] = None,
+    ocr_pages: Optional[Set[int]] = None,
+    ocr_stats: Optional[Dict] = None
+) -> Iterator:
+    """
+    Produz as janelas do PDF, extraídas com PyMuPDF ou convertidas com Docling.
+
+    Sem rotas, o documento inteiro (ou as páginas pedidas) passa pelo Docling.
+    Com rotas, páginas consecutivas com a mesma rota formam janelas: as
+    nativas já trazem os elementos extraídos pelo roteador e só as demais
+    são convertidas. Um conversor do pool é retirado apenas se alguma
+    página precisar do Docling.
+
+    Com ocr_pages, as páginas do Docling são separadas em intervalos com e
+    sem OCR, cada um convertido pelo conversor da configuração correspondente.
+
+    Args:
+        file_path: Caminho do arquivo PDF
+        page_count: Número de páginas do PDF (0 se desconhecido)
+        window_pages: Páginas por janela (0 = sem limite)
+        pages: Converter apenas estas páginas (padrão: todas; ignorado com rotas)
+        routes: Rotas das páginas (route_pages), em ordem de página
+        ocr_pages: Páginas que precisam de OCR (padrão: OCR em todas)
+        ocr_stats: Dicionário opcional acumulando "pages" e "time_s" das
+                   conversões com OCR
+
+    Yields:
+        DoclingDocument ou NativePageWindow de cada janela, em ordem de página
+    """
+    if ocr_stats is None:
+        ocr_stats = {}
+    ocr_stats.setdefault("pages", 0)
+    ocr_stats.setdefault("time_s", 0.0)
+
+    with ExitStack() as stack:
+        # Conversores do pool (modelos de layout/tabelas já carregados), um por configuração
+        converters = {}
+
+        def convert(options: ConverterOptions, run_pages: Optional[List[int]]) -> Iterator:
+            if options not in converters:
+                converters[options] = stack.enter_context(converter_pool.checkout(options))
+            if options.do_ocr:
+                ocr_stats["pages"] += len(run_pages) if run_pages is not None else page_count
+
+            started = time.perf_counter()
+            for window_doc in iter_converted_windows(converters[options], file_path, page_count, window_pages, run_pages):
+                if options.do_ocr:
+                    ocr_stats["time_s"] += time.perf_counter() - started
+                yield window_doc
+                started = time.perf_counter()
+
+        # Sem rotas nem OCR seletivo (ou com número de páginas desconhecido): Docling com OCR em tudo
+        if routes is None and (ocr_pages is None or (pages is None and page_count <= 0)):
+            yield from convert(DEFAULT_CONVERTER_OPTIONS, pages)
+            return
+
+        if routes is None:
+            docling_pages = pages if pages is not None else range(1, page_count + 1)
+            routes = [PageRoute(page_no=page, route=ROUTE_DOCLING, reason="") for page in docling_pages]
+
+        for route, run in iter_route_runs(routes):
+            if route == ROUTE_NATIVE:
+                step = window_pages if window_pages > 0 else len(run)
+                for start in range(0, len(run), step):
+                    yield NativePageWindow([element for page in run[start:start + step] for element in page.elements])
+                continue
+
+            run_pages = [page.page_no for page in run]
+            if ocr_pages is None:
+                yield from convert(DEFAULT_CONVERTER_OPTIONS, run_pages)
+                continue
+
+            # Intervalos consecutivos de páginas com a mesma necessidade de OCR
+            for needs_ocr, group in groupby(run_pages, key=lambda page: page in ocr_pages):
+                options = DEFAULT_CONVERTER_OPTIONS if needs_ocr else NO_OCR_CONVERTER_OPTIONS
+                yield from convert(options, list(group))
+
+
+def get_document_content_hash(db: Session, doc_id: str, file_path: str) -> Optional[str]:
+    """
+    Retorna o SHA-256 do PDF (registrado no upload ou calculado do arquivo).
+
+    Args:
+        db: Sessão do banco de dados
+        doc_id: ID do documento
+        file_path: Caminho do arquivo PDF
+
+    Returns:
+        SHA-256 do conteúdo (hex) ou None se o arquivo não pôde ser lido
+    """
+    doc = db.query(Document).filter(Document.id == doc_id).first()
+    if doc is not None and doc.content_hash:
+        return doc.content_hash
+
+    try:
+        return compute_file_hash(file_path)
+    except OSError as e:
+        logger.warning(f"Não foi possível calcular o hash de {file_path}: {str(e)}")
+        return None
+
+
+def _extract_images_in_own_session(file_path: str, doc_id: str, pages: Optional[Set[int]] = None) -> Dict[int, List[str]]:
+    """Extrai as imagens com PyMuPDF usando uma sessão própria (roda em outro thread)."""
+    db = SessionLocal()
+    try:
+        return extract_images_from_pdf_with_pymupdf(file_path, doc_id, db, pages)
+    finally:
+        db.close()
+
+
+def delete_orphan_images(db: Session, doc_id: str, keep_ids: Set[str], batch_size: int = 500) -> int:
+    """
+    Remove os registros de imagens do documento que nenhum chunk referencia mais.
+
+    Usado após a ingestão de uma nova versão. Os bytes continuam no image
+    store (endereçado por conteúdo, compartilhado entre documentos).
+
+    Args:
+        db: Sessão do banco de dados
+        doc_id: ID do documento
+        keep_ids: IDs de imagens referenciados pela nova versão
+        batch_size: IDs por DELETE
+
+    Returns:
+        Número de registros removidos (o commit fica com quem chama)
+    """
+    # Documentos deduplicados a partir deste referenciam as mesmas imagens
+    if db.query(Document.id).filter(Document.source_document_id == doc_id).first() is not None:
+        return 0
+
+    stale_ids = [
+        image_id for (image_id,) in db.query(DocumentImage.id).filter(DocumentImage.document_id == doc_id)
+        if image_id not in keep_ids
+    ]
+    for start in range(0, len(stale_ids), batch_size):
+        db.query(DocumentImage).filter(
+            DocumentImage.id.in_(stale_ids[start:start + batch_size])
+        ).delete(synchronize_session=False)
+
+    if stale_ids:
+        logger.info(f"🧹 {len(stale_ids)} imagens da versão anterior removidas do documento {doc_id}")
+
+    return len(stale_ids)
+
+
 async def process_document_with_docling(
     file_path: str,
     doc_id: str,
     user_id: int,
     db: Session,
-    use_semantic_chunking: bool = True
+    use_semantic_chunking: bool = True,
+    on_progress: Optional[Callable[[str], None]] = None,
+    from_cache: bool = False,
+    new_version: bool = False
 ) -> int:
     """
     Pipeline completo de processamento de documento com Docling.
@@ -382,92 +905,278 @@ async def process_document_with_docling(
     4. Gerar embeddings com CLIP multilíngue
     5. Salvar chunks e embeddings no ChromaDB
 
+    As etapas rodam sobrepostas, em threads ligados por filas limitadas:
+    conversão (janelas de INGEST_CONVERT_WINDOW_PAGES páginas) → chunking →
+    embeddings → escrita no ChromaDB, com a extração de imagens do PyMuPDF em
+    paralelo à conversão. Chunks das primeiras páginas são indexados enquanto
+    as páginas seguintes ainda estão sendo convertidas.
+
+    No modo de baixa memória (INGEST_LOW_MEMORY) as janelas são menores
+    (INGEST_LOW_MEMORY_WINDOW_PAGES), no máximo uma janela convertida espera
+    na fila e cada janela é liberada antes da conversão da seguinte. O pico
+    de memória (RSS) do processo durante a ingestão é registrado no documento
+    quando nenhuma outra ingestão rodou ao mesmo tempo no processo.
+
+    A conversão do Docling é gravada no cache de conversões (por hash do
+    PDF); se o mesmo PDF já foi convertido, as janelas são lidas do cache.
+    Com from_cache=True (reindexação) o PDF não é aberto: a conversão vem
+    obrigatoriamente do cache e as imagens das páginas dos chunks já indexados.
+
+    Com new_version=True o PDF é uma nova revisão do documento: as páginas são
+    comparadas (impressão digital de texto e imagens) com as da versão
+    indexada e só as alteradas passam por Docling, chunking e embeddings. Os
+    chunks das páginas mantidas conservam texto e embeddings; são regravados
+    apenas se o ID sequencial ou a página mudaram. Chunks e imagens que
+    deixaram de existir são removidos.
+
+    Com o roteador de páginas (INGEST_PAGE_ROUTER), páginas simples de texto
+    são extraídas diretamente com PyMuPDF; só páginas com tabelas, múltiplas
+    colunas ou sem camada de texto passam pelo Docling. Com OCR seletivo
+    (INGEST_SELECTIVE_OCR), o OCR do Docling roda só nas páginas sem camada
+    de texto; páginas e tempo de OCR são registrados no documento.
+
     Args:
         file_path: Caminho do arquivo PDF
         doc_id: ID do documento
         user_id: ID do usuário
         db: Sessão do banco de dados
         use_semantic_chunking: Se True, usa estratégia de chunking semântico inteligente
+        on_progress: Callback opcional chamado com o nome de cada etapa à
+                     medida que ela começa (converting, chunking, embedding)
+        from_cache: Se True, reindexa a partir do cache de conversões sem abrir o PDF
+        new_version: Se True, reprocessa apenas as páginas alteradas em relação à versão indexada
 
     Returns:
         Número de chunks criados
     """
-    logger.info(f"Iniciando processamento do documento {doc_id}: {file_path}")
-    logger.info(f"Semantic chunking: {'ATIVADO' if use_semantic_chunking else 'DESATIVADO'}")
+    progress_lock = threading.Lock()
 
-    # 1. Carregar documento com Docling
-    converter = DocumentConverter()
-    result = converter.convert(file_path)
-    docling_doc = result.document
+    def report(stage: str):
+        # Chamado pelos threads do pipeline: serializar o acesso ao callback
+        if on_progress is not None:
+            with progress_lock:
+                on_progress(stage)
 
-    total_elements = len(list(docling_doc.iterate_items()))
-    logger.info(f"Documento carregado: {total_elements} elementos")
-
-    # 1.5. Extrair TODAS as imagens com PyMuPDF (complementar ao Docling)
-    logger.info("Extraindo imagens com PyMuPDF...")
-    page_images_map = extract_images_from_pdf_with_pymupdf(file_path, doc_id, db)
-
-    # 2. PRÉ-PROCESSAMENTO SEMÂNTICO (SE ATIVADO)
-    if use_semantic_chunking:
-        logger.info("🔧 Aplicando pré-processamento semântico...")
-
-        # Extrair todos os elementos em lista estruturada
-        # Usando estratégia "último header visto" para propagar section_header
-        raw_elements = []
-        last_section_header = ""
-
-        for idx, (element, level) in enumerate(docling_doc.iterate_items()):
-            page = element.prov[0].page_no if element.prov else 0
-            el_type = element.label
-            text = element.text if hasattr(element, 'text') else ""
-
-            # Atualizar o header corrente quando encontrar um section_header "de verdade"
-            if el_type == "section_header":
-                last_section_header = text.strip()
-
-            raw_elements.append({
-                'text': text,
-                'page': page,
-                'type': el_type,
-                'element_id': idx,
-                'section_header': last_section_header,
-                'element_obj': element  # Manter referência ao elemento original
-            })
-
-        # Aplicar semantic chunker
-        semantic_chunker = SemanticChunker(
-            min_chunk_size=300,
-            max_chunk_size=1000,
-            overlap_size=100
-        )
-
-        semantic_chunks = semantic_chunker.group_elements(raw_elements)
-        logger.info(f"✅ Agrupamento semântico: {len(raw_elements)} elementos → {len(semantic_chunks)} chunks")
-
-    all_chunks = []
-
-    # Contadores para debug
-    element_types = {}
-    elements_with_images = []
-
-    # 3. Processar chunks semânticos ou elementos individuais
-    if use_semantic_chunking and semantic_chunks:
-        logger.info("Processando chunks semânticos agrupados...")
+    logger.info(f"Iniciando processamento do documento {doc_id}: {file_path}")
+    logger.info(f"Semantic chunking: {'ATIVADO' if use_semantic_chunking else 'DESATIVADO'}")
 
-        for idx, sem_chunk in enumerate(semantic_chunks):
-            try:
-                # Associar imagens da página aos chunks de texto
-                page_image_ids_list = page_images_map.get(sem_chunk.page, [])
-                page_image_ids_csv = ",".join(page_image_ids_list) if page_image_ids_list else None
+    # Conversão já feita para este conteúdo?
+    content_hash = get_document_content_hash(db, doc_id, file_path)
+    # Com o roteador desligado, só servem entradas convertidas inteiramente pelo Docling
+    allow_native = INGEST_PAGE_ROUTER or from_cache
+    # O modo de OCR faz parte da chave: OCR seletivo e OCR em todas as páginas não se misturam
+    cache_selective_ocr = INGEST_SELECTIVE_OCR
+    manifest = None
+    if content_hash:
+        manifest = load_conversion_manifest(content_hash, allow_native=allow_native, selective_ocr=cache_selective_ocr)
+        if from_cache and manifest is None:
+            # Reindexação: serve a conversão gravada no outro modo de OCR
+            cache_selective_ocr = not INGEST_SELECTIVE_OCR
+            manifest = load_conversion_manifest(content_hash, selective_ocr=cache_selective_ocr)
+    if from_cache and manifest is None:
+        raise FileNotFoundError(f"Conversão do documento {doc_id} não encontrada no cache")
+
+    # Nova versão: comparar as páginas com as da versão indexada
+    fingerprints = None
+    plan = None
+    kept_chunks: Dict[int, List[Dict]] = {}
+    if new_version:
+        fingerprints = compute_page_fingerprints(file_path)
+        previous_fingerprints = load_page_fingerprints(db, doc_id)
+        if previous_fingerprints:
+            plan = plan_revision(previous_fingerprints, fingerprints, carry_overlap=use_semantic_chunking)
+            kept_chunks = load_kept_chunks(get_chroma_collection(user_id), doc_id, plan.kept_pages)
+            # A partir daqui o ChromaDB fica entre as duas versões: sem impressões
+            # registradas, uma nova tentativa após falha reprocessa o documento inteiro
+            save_page_fingerprints(db, doc_id, [])
+            logger.info(
+                f"📑 Nova versão: {len(plan.affected_pages)} de {plan.page_count} páginas a reprocessar, "
+                f"{sum(len(chunks) for chunks in kept_chunks.values())} chunks mantidos"
+            )
+        else:
+            logger.info("Versão indexada sem impressões digitais das páginas: reprocessando o documento inteiro")
+
+    # 1. Extrair TODAS as imagens com PyMuPDF (complementar ao Docling), em paralelo à conversão
+    image_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-images")
+    fingerprints_future = None
+    if from_cache:
+        images_future = image_executor.submit(load_page_image_ids_from_vectorstore, user_id, doc_id)
+        # Ler o mapa antes que os chunks da indexação anterior sejam regravados
+        images_future.result()
+    else:
+        affected_pages = set(plan.affected_pages) if plan is not None else None
+        images_future = image_executor.submit(_extract_images_in_own_session, file_path, doc_id, affected_pages)
+        if fingerprints is None:
+            # Impressões das páginas para futuras versões do documento
+            fingerprints_future = image_executor.submit(compute_page_fingerprints, file_path)
+
+    if plan is not None:
+        page_count = plan.page_count
+    else:
+        page_count = manifest["page_count"] if manifest is not None else get_pdf_page_count(file_path)
+    low_memory = is_low_memory_mode(page_count)
+    window_pages = INGEST_LOW_MEMORY_WINDOW_PAGES if low_memory else INGEST_CONVERT_WINDOW_PAGES
+    logger.info(
+        f"Documento com {page_count} páginas; janelas de {window_pages or page_count} páginas"
+        f"{' (modo de baixa memória)' if low_memory else ''}"
+    )
 
-                # Gerar chunk_id consistente
-                chunk_id = f"{doc_id}_chunk_{idx}"
+    pipeline = StagePipeline()
+    windows_queue = pipeline.queue(maxsize=1 if low_memory else None)
+    chunks_queue = pipeline.queue()
+    embedded_queue = pipeline.queue()
+
+    element_stats = {}
+    embedding_cache_stats = {"hits": 0, "misses": 0}
+    ocr_stats = {"pages": 0, "time_s": 0.0}
+    total_chunks = 0
+    written_chunks = 0
+    referenced_image_ids: Set[str] = set()
+
+    # 2. Conversão com Docling/PyMuPDF, janela por janela (ou leitura do cache de conversões)
+    def convert_stage():
+        report("converting")
+
+        if manifest is not None:
+            logger.info(f"♻️  Conversão lida do cache ({len(manifest['windows'])} janelas)")
+            # Páginas com OCR na conversão original (nenhum OCR roda nesta ingestão)
+            ocr_stats["pages"] = manifest.get("ocr_pages", 0)
+            for window_doc in iter_cached_windows(content_hash, selective_ocr=cache_selective_ocr):
+                pipeline.put(windows_queue, window_doc)
+                del window_doc
+            pipeline.close(windows_queue)
+            return
+
+        # Conversões parciais (nova versão) não vão para o cache
+        use_cache = content_hash and CONVERSION_CACHE_ENABLED and plan is None
+        cache_writer = ConversionCacheWriter(content_hash, selective_ocr=INGEST_SELECTIVE_OCR) if use_cache else None
+        pages = plan.affected_pages if plan is not None else None
+        try:
+            routes = None
+            if INGEST_PAGE_ROUTER:
+                # Páginas simples extraídas com PyMuPDF; o Docling fica com as complexas
+                routes = route_pages(file_path, pages)
+
+            ocr_pages = None
+            if INGEST_SELECTIVE_OCR:
+                # OCR só nas páginas sem camada de texto; as demais usam o texto embutido
+                if routes is not None:
+                    ocr_pages = {route.page_no for route in routes if route.reason == "no_text_layer"}
+                else:
+                    ocr_pages = set(find_pages_without_text_layer(file_path, pages))
+
+            for window_doc in iter_document_windows(
+                file_path, page_count, window_pages, pages, routes, ocr_pages, ocr_stats
+            ):
+                if cache_writer is not None:
+                    cache_writer.add(window_doc)
+                pipeline.put(windows_queue, window_doc)
+                del window_doc  # Não manter a janela viva durante a conversão da próxima
+            if cache_writer is not None:
+                cache_writer.commit(page_count, ocr_stats["pages"])
+        except BaseException:
+            if cache_writer is not None:
+                cache_writer.discard()
+            raise
+        pipeline.close(windows_queue)
+
+    # 3. Chunking (travessia única dos elementos de todas as janelas)
+    def chunk_stage():
+        nonlocal total_chunks
+        pending_chunks = []
+
+        def append_chunk(chunk: Dict):
+            nonlocal total_chunks, pending_chunks
+            # Garantir chunk_id sequencial (usado na expansão de vizinhos)
+            chunk_id = f"{doc_id}_chunk_{total_chunks}"
+            chunk["metadata"]["chunk_id"] = chunk_id
+
+            # Chunk mantido de uma versão anterior com o mesmo ID e página: só metadados mudam
+            if chunk.pop("previous", None) == (chunk_id, chunk["metadata"].get("page", 0)):
+                chunk["unchanged"] = True
+
+            image_ids = chunk["metadata"].get("image_ids")
+            if image_ids:
+                referenced_image_ids.update(image_ids.split(","))
+
+            pending_chunks.append(chunk)
+            total_chunks += 1
+            if len(pending_chunks) >= VECTORSTORE_WRITE_BATCH_SIZE:
+                pipeline.put(chunks_queue, pending_chunks)
+                pending_chunks = []
+
+        # Nova versão: chunks das páginas mantidas entram na ordem das páginas,
+        # intercalados com os chunks novos das páginas reprocessadas
+        kept_pages = sorted(kept_chunks)
+        affected_runs = split_page_runs(plan.affected_pages) if plan is not None else []
+        seed_texts = get_run_seed_texts(kept_chunks, affected_runs)
+
+        def flush_kept_chunks(before_page: float):
+            while kept_pages and kept_pages[0] < before_page:
+                for kept in kept_chunks.pop(kept_pages.pop(0)):
+                    kept["metadata"]["source_file"] = file_path
+                    append_chunk(kept)
+
+        def emit_chunk(chunk: Dict):
+            flush_kept_chunks(chunk["metadata"].get("page", 0))
+            append_chunk(chunk)
+
+        def windows():
+            for index, window_doc in enumerate(pipeline.iterate(windows_queue)):
+                if index == 0:
+                    report("chunking")
+                elif low_memory:
+                    # A janela anterior já foi percorrida e não tem mais referências:
+                    # devolver a memória antes de percorrer a próxima
+                    release_memory()
+                yield window_doc
+
+        elements = iter_docling_elements(windows(), element_stats)
+        if plan is not None:
+            # Janelas do cache trazem o documento inteiro: usar só as páginas alteradas
+            affected = set(plan.affected_pages)
+            elements = (item for item in elements if item['page'] in affected or item['page'] == 0)
+
+        # Os chunks de texto referenciam as imagens da página (a extração do
+        # PyMuPDF costuma terminar bem antes da primeira janela do Docling)
+        page_images_map = None
+
+        def get_page_image_ids_csv(page: int) -> Optional[str]:
+            nonlocal page_images_map
+            if page_images_map is None:
+                page_images_map = images_future.result()
+            page_image_ids_list = page_images_map.get(page, [])
+            return ",".join(page_image_ids_list) if page_image_ids_list else None
+
+        if use_semantic_chunking:
+            logger.info("🔧 Aplicando pré-processamento semântico...")
+
+            # Tamanhos em tokens do modelo de embeddings (máximo = limite sem truncamento)
+            semantic_chunker = SemanticChunker(
+                min_chunk_size=48,
+                max_chunk_size=get_max_content_tokens(),
+                overlap_size=16,
+                length_function=get_token_counter()
+            )
+
+            if plan is None:
+                semantic_chunks = semantic_chunker.iter_chunks(elements)
+            else:
+                # Nova versão: um chunking por intervalo de páginas alteradas, com o
+                # overlap vindo do fim da página mantida anterior (como na ingestão completa)
+                semantic_chunks = (
+                    sem_chunk
+                    for run_start, run_elements in iter_element_runs(elements, affected_runs)
+                    for sem_chunk in semantic_chunker.iter_chunks(run_elements, seed_text=seed_texts.get(run_start))
+                )
+
+            for sem_chunk in semantic_chunks:
+                page_image_ids_csv = get_page_image_ids_csv(sem_chunk.page)
 
                 # Criar chunk com texto agrupado e metadados enriquecidos
-                chunk = {
+                emit_chunk({
                     "content": sem_chunk.text,
                     "metadata": {
-                        "chunk_id": chunk_id,
                         "document_id": doc_id,
                         "page": sem_chunk.page,
                         "chunk_type": sem_chunk.chunk_type,
@@ -478,112 +1187,144 @@ async def process_document_with_docling(
                         "has_formula": sem_chunk.metadata.get('has_formula', False),
                         "section": sem_chunk.metadata.get('section', '')
                     }
-                }
-                all_chunks.append(chunk)
-
-            except Exception as e:
-                logger.error(f"Erro ao processar chunk semântico na página {sem_chunk.page}: {str(e)}")
-                continue
-
-        logger.info(f"✅ {len(all_chunks)} chunks semânticos processados")
-
-    else:
-        # Processamento tradicional elemento por elemento
-        logger.info("Processando elementos individualmente (modo tradicional)...")
-
-        for idx, (element, level) in enumerate(docling_doc.iterate_items()):
-            page = element.prov[0].page_no if element.prov else 0
-
-            # Extrair tipo de elemento
-            el_type = element.label
-
-            # Contar tipos de elementos
-            element_types[el_type] = element_types.get(el_type, 0) + 1
-
-            # Detectar elementos com imagens (independente do tipo)
-            has_image = hasattr(element, 'image') and element.image is not None
-            if has_image:
-                elements_with_images.append({
-                    'type': el_type,
-                    'page': page,
-                    'has_pil': hasattr(element.image, 'pil_image') if hasattr(element, 'image') else False
                 })
 
-            try:
-                # --- FIGURAS E PICTURES ---
-                if el_type in ["figure", "picture"]:
-                    chunk = process_figure_element(element, doc_id, page, db)
-                    if chunk:
-                        all_chunks.append(chunk)
-                    continue
+            logger.info(f"✅ {total_chunks} chunks semânticos processados")
 
-                # --- TABELAS ---
-                if el_type == "table":
-                    chunks = process_table_element(element, doc_id, page, file_path)
-                    all_chunks.extend(chunks)
-                    continue
+        else:
+            # Processamento tradicional elemento por elemento
+            logger.info("Processando elementos individualmente (modo tradicional)...")
 
-                # --- TEXTO (paragraph, heading, list_item, section_header) ---
-                if el_type in ["text", "paragraph", "list_item", "section_header", "title"]:
-                    # Associar imagens da mesma página aos chunks de texto
-                    page_image_ids_list = page_images_map.get(page, [])
-                    page_image_ids_csv = ",".join(page_image_ids_list) if page_image_ids_list else None
+            for item in elements:
+                element = item['element']
+                page = item['page']
+                el_type = item['type']
+
+                try:
+                    # --- FIGURAS E PICTURES ---
+                    if el_type in ["figure", "picture"]:
+                        chunk = process_figure_element(element, doc_id, page, db)
+                        if chunk:
+                            emit_chunk(chunk)
+                        continue
+
+                    # --- TABELAS ---
+                    if el_type == "table":
+                        for chunk in process_table_element(element, doc_id, page, file_path):
+                            emit_chunk(chunk)
+                        continue
+
+                    # --- TEXTO (paragraph, heading, list_item, section_header) ---
+                    if el_type in ["text", "paragraph", "list_item", "section_header", "title"]:
+                        # Associar imagens da mesma página aos chunks de texto
+                        page_image_ids_csv = get_page_image_ids_csv(page)
+
+                        for chunk in process_text_element(element, doc_id, page, file_path, page_image_ids_csv):
+                            emit_chunk(chunk)
+                        continue
 
-                    chunks = process_text_element(element, doc_id, page, file_path, page_image_ids_csv)
-                    all_chunks.extend(chunks)
+                except Exception as e:
+                    logger.error(f"Erro ao processar elemento {el_type} na página {page}: {str(e)}")
                     continue
 
-            except Exception as e:
-                logger.error(f"Erro ao processar elemento {el_type} na página {page}: {str(e)}")
-                continue
+        flush_kept_chunks(float("inf"))
+        if pending_chunks:
+            pipeline.put(chunks_queue, pending_chunks)
+        pipeline.close(chunks_queue)
+
+    # 4. Embeddings em lote
+    def embed_stage():
+        for index, chunks in enumerate(pipeline.iterate(chunks_queue)):
+            if index == 0:
+                report("embedding")
+            texts, embeddings = embed_chunks(chunks, embedding_cache_stats)
+            pipeline.put(embedded_queue, (chunks, texts, embeddings))
+        pipeline.close(embedded_queue)
+
+    # 5. Escrita no ChromaDB
+    def write_stage():
+        nonlocal written_chunks
+        collection = get_chroma_collection(user_id)
+        for chunks, texts, embeddings in pipeline.iterate(embedded_queue):
+            changed = [i for i, chunk in enumerate(chunks) if not chunk.get("unchanged")]
+            if len(changed) < len(chunks):
+                # Chunks mantidos sem mudança de ID: apenas metadados (arquivo da nova versão)
+                unchanged = [chunk for chunk in chunks if chunk.get("unchanged")]
+                collection.update(
+                    ids=[chunk["metadata"]["chunk_id"] for chunk in unchanged],
+                    metadatas=[chunk["metadata"] for chunk in unchanged]
+                )
+                chunks = [chunks[i] for i in changed]
+                texts = [texts[i] for i in changed]
+                embeddings = embeddings[changed]
+            if chunks:
+                write_chunks(collection, chunks, texts, embeddings)
+                written_chunks += len(chunks)
+        # Reindexação: remover chunks da indexação anterior que não foram regravados
+        delete_stale_chunks(collection, doc_id, total_chunks)
+
+    with PeakMemoryMonitor() as memory:
+        try:
+            pipeline.start("convert", convert_stage)
+            pipeline.start("chunk", chunk_stage)
+            pipeline.start("embed", embed_stage)
+            pipeline.start("write", write_stage)
+            pipeline.join()
+        finally:
+            # As imagens precisam estar gravadas antes de o documento ser marcado como concluído
+            image_executor.shutdown(wait=True)
+
+    logger.info(f"⏱️  Pipeline de ingestão: {pipeline.stats()}")
+    logger.info(f"🧠 Pico de memória (RSS): {memory.peak_mb:.0f} MB (início: {memory.start_mb:.0f} MB)"
+                f"{'' if memory.exclusive else ' — outras ingestões em paralelo no processo, não registrado'}")
+    # Com ingestões simultâneas no processo o pico não é atribuível a este documento
+    peak_rss_mb = round(memory.exclusive_peak_mb, 1) if memory.exclusive else None
+
+    embedding_lookups = embedding_cache_stats["hits"] + embedding_cache_stats["misses"]
+    embedding_cache_hit_rate = embedding_cache_stats["hits"] / embedding_lookups if embedding_lookups else 0.0
+    logger.info(f"💾 Cache de embeddings: {embedding_cache_stats['hits']} hits, "
+                f"{embedding_cache_stats['misses']} codificados ({embedding_cache_hit_rate:.1%} de acerto)")
+    logger.info(f"🔎 OCR: {ocr_stats['pages']} páginas em {ocr_stats['time_s']:.1f}s")
 
     # Log de estatísticas de elementos
-    logger.info(f"Tipos de elementos encontrados: {element_types}")
-    logger.info(f"Elementos com imagens detectados: {len(elements_with_images)}")
-    if elements_with_images:
-        logger.info(f"Detalhes dos elementos com imagens: {elements_with_images[:10]}")  # Mostrar primeiros 10
-    logger.info(f"Total de chunks gerados: {len(all_chunks)}")
-
-    if len(all_chunks) == 0:
+    logger.info(f"Elementos percorridos: {element_stats['total_elements']}")
+    logger.info(f"Tipos de elementos encontrados: {element_stats['element_types']}")
+    logger.info(f"Elementos com imagens detectados: {element_stats['elements_with_images']}")
+    if element_stats['image_elements_sample']:
+        logger.info(f"Detalhes dos elementos com imagens: {element_stats['image_elements_sample']}")  # Mostrar primeiros 10
+    logger.info(f"Total de chunks gerados: {total_chunks}")
+    if plan is not None:
+        logger.info(f"♻️  Nova versão: {written_chunks} chunks gravados, "
+                    f"{total_chunks - written_chunks} mantidos sem regravar o embedding")
+
+    if total_chunks == 0:
         logger.warning("Nenhum chunk foi gerado do documento")
         return 0
 
-    # 2.5. Garantir que todos os chunks tenham chunk_id no metadata
-    # (no modo semântico já foi adicionado, no modo tradicional adicionamos aqui)
-    for idx, chunk in enumerate(all_chunks):
-        if "chunk_id" not in chunk["metadata"]:
-            chunk["metadata"]["chunk_id"] = f"{doc_id}_chunk_{idx}"
+    # Impressões digitais das páginas (comparadas na próxima versão do documento)
+    if fingerprints is None and fingerprints_future is not None:
+        try:
+            fingerprints = fingerprints_future.result()
+        except Exception as e:
+            logger.warning(f"Não foi possível calcular as impressões digitais das páginas: {str(e)}")
+    if fingerprints is not None:
+        save_page_fingerprints(db, doc_id, fingerprints, commit=False)
 
-    # 3. Converter chunks para LangChain Documents
-    logger.info("Preparando documentos para o vector store...")
-    langchain_docs = []
-
-    for chunk in all_chunks:
-        doc = LangChainDocument(
-            page_content=chunk["content"],
-            metadata=chunk["metadata"]
-        )
-        langchain_docs.append(doc)
-
-    # 4. Obter vector store e adicionar documentos (embeddings gerados automaticamente)
-    logger.info("Salvando no ChromaDB com embeddings CLIP multilíngue...")
-    vectorstore = get_chroma_vectorstore(user_id)
-
-    # Extrair chunk_ids dos metadados (já foram definidos anteriormente)
-    chunk_ids = [chunk["metadata"]["chunk_id"] for chunk in all_chunks]
-
-    # Adicionar documentos ao vector store (LangChain gera embeddings automaticamente)
-    vectorstore.add_documents(
-        documents=langchain_docs,
-        ids=chunk_ids
-    )
+    if new_version:
+        # Imagens da versão anterior que nenhum chunk referencia mais
+        extracted_image_ids = {image_id for ids in images_future.result().values() for image_id in ids}
+        delete_orphan_images(db, doc_id, referenced_image_ids | extracted_image_ids)
 
     # 5. Salvar registro do documento no SQLite (upsert para evitar duplicatas)
     existing_doc = db.query(Document).filter(Document.id == doc_id).first()
     if existing_doc:
         # Atualizar documento existente
         existing_doc.status = "completed"
-        existing_doc.chunks_count = len(all_chunks)
+        existing_doc.chunks_count = total_chunks
+        existing_doc.peak_rss_mb = peak_rss_mb
+        existing_doc.embedding_cache_hit_rate = round(embedding_cache_hit_rate, 4)
+        existing_doc.ocr_pages = ocr_stats["pages"]
+        existing_doc.ocr_time_s = round(ocr_stats["time_s"], 2)
         existing_doc.processed_at = datetime.now(timezone.utc)
     else:
         # Criar novo documento
@@ -593,12 +1334,16 @@ async def process_document_with_docling(
             filename=os.path.basename(file_path),
             file_path=file_path,
             status="completed",
-            chunks_count=len(all_chunks),
+            chunks_count=total_chunks,
+            peak_rss_mb=peak_rss_mb,
+            embedding_cache_hit_rate=round(embedding_cache_hit_rate, 4),
+            ocr_pages=ocr_stats["pages"],
+            ocr_time_s=round(ocr_stats["time_s"], 2),
             created_at=datetime.now(timezone.utc)
         )
         db.add(doc_record)
     db.commit()
 
-    logger.info(f"✅ Documento processado com sucesso: {len(all_chunks)} chunks salvos")
+    logger.info(f"✅ Documento processado com sucesso: {total_chunks} chunks salvos")
 
-    return len(all_chunks)
+    return total_chunks
@@ -0,0 +1,266 @@
+"""
+Execução em Estágios da Ingestão
+
+Este módulo conecta os estágios da ingestão (conversão, chunking, embeddings,
+escrita no vector store) em threads ligados por filas limitadas:
+1. Cada estágio consome a fila anterior e produz para a seguinte
+2. Filas com tamanho máximo (backpressure: um estágio rápido espera o lento)
+3. Um erro em qualquer estágio interrompe todos os outros e é relançado em join()
+4. Tempo ocupado e tempo de espera por estágio, para medir a sobreposição
+5. Medição do pico de memória (RSS) por documento e liberação de memória entre janelas
+"""
+
+import ctypes
+import gc
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.services.embeddings import get_process_rss_mb
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INGEST_PIPELINE_QUEUE_SIZE = int(os.getenv("INGEST_PIPELINE_QUEUE_SIZE", "4"))
+INGEST_MEMORY_SAMPLE_SECONDS = float(os.getenv("INGEST_MEMORY_SAMPLE_SECONDS", "0.25"))
+
+# Intervalo com que estágios bloqueados verificam se o pipeline foi interrompido
+_POLL_INTERVAL_SECONDS = 0.1
+
+_END = object()
+
+
+class PipelineAborted(Exception):
+    """Outro estágio falhou; o estágio atual deve parar."""
+
+
+class StagePipeline:
+    """
+    Conjunto de estágios (threads) ligados por filas limitadas.
+
+    Cada produtor envia itens com put() e termina com close(); o consumidor
+    percorre a fila com iterate(). join() espera todos os estágios.
+    """
+
+    def __init__(self, queue_size: int = INGEST_PIPELINE_QUEUE_SIZE):
+        """
+        Inicializa o pipeline.
+
+        Args:
+            queue_size: Tamanho máximo de cada fila entre estágios
+        """
+        self.queue_size = queue_size
+        self._threads: List[threading.Thread] = []
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+        self._aborted = threading.Event()
+        self._started_at = None
+        self._stage_times: Dict[str, float] = {}
+        self._wait_times: Dict[str, float] = {}
+
+    def queue(self, maxsize: Optional[int] = None) -> queue.Queue:
+        """
+        Cria uma fila limitada entre dois estágios.
+
+        Args:
+            maxsize: Tamanho máximo (padrão: queue_size do pipeline)
+        """
+        return queue.Queue(maxsize=maxsize or self.queue_size)
+
+    def start(self, name: str, target: Callable[[], None]) -> None:
+        """
+        Inicia um estágio em um thread próprio.
+
+        Args:
+            name: Nome do estágio (logs e métricas)
+            target: Função do estágio (sem argumentos)
+        """
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+
+        thread = threading.Thread(target=self._run, args=(name, target), name=f"ingest-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _run(self, name: str, target: Callable[[], None]) -> None:
+        start = time.perf_counter()
+        try:
+            target()
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            logger.error(f"Estágio '{name}' falhou: {str(e)}")
+            with self._lock:
+                self._errors.append(e)
+            self._aborted.set()
+        finally:
+            self._stage_times[name] = time.perf_counter() - start
+
+    def _add_wait(self, seconds: float) -> None:
+        name = threading.current_thread().name.removeprefix("ingest-")
+        self._wait_times[name] = self._wait_times.get(name, 0.0) + seconds
+
+    def put(self, q: queue.Queue, item) -> None:
+        """
+        Envia um item para a fila, esperando se ela estiver cheia.
+
+        Raises:
+            PipelineAborted: Se outro estágio falhou enquanto esperava
+        """
+        start = time.perf_counter()
+        try:
+            while True:
+                if self._aborted.is_set():
+                    raise PipelineAborted()
+                try:
+                    q.put(item, timeout=_POLL_INTERVAL_SECONDS)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            self._add_wait(time.perf_counter() - start)
+
+    def close(self, q: queue.Queue) -> None:
+        """Sinaliza ao estágio seguinte que não há mais itens."""
+        self.put(q, _END)
+
+    def iterate(self, q: queue.Queue) -> Iterator:
+        """
+        Consome os itens da fila até close() ser chamado pelo produtor.
+
+        Raises:
+            PipelineAborted: Se outro estágio falhou enquanto esperava
+        """
+        while True:
+            start = time.perf_counter()
+            try:
+                while True:
+                    if self._aborted.is_set():
+                        raise PipelineAborted()
+                    try:
+                        item = q.get(timeout=_POLL_INTERVAL_SECONDS)
+                        break
+                    except queue.Empty:
+                        continue
+            finally:
+                self._add_wait(time.perf_counter() - start)
+
+            if item is _END:
+                return
+            yield item
+            del item  # Não manter o item vivo enquanto espera o próximo
+
+    def join(self) -> None:
+        """
+        Espera todos os estágios terminarem.
+
+        Raises:
+            A primeira exceção lançada por um estágio
+        """
+        for thread in self._threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def stats(self) -> Dict:
+        """
+        Retorna as métricas de tempo do pipeline.
+
+        Returns:
+            {"wall_s", "stages": {nome: {"total_s", "busy_s", "wait_s"}}}
+        """
+        wall = time.perf_counter() - self._started_at if self._started_at is not None else 0.0
+        stages = {}
+        for name, total in self._stage_times.items():
+            wait = self._wait_times.get(name, 0.0)
+            stages[name] = {
+                "total_s": round(total, 3),
+                "busy_s": round(max(total - wait, 0.0), 3),
+                "wait_s": round(wait, 3)
+            }
+        return {"wall_s": round(wall, 3), "stages": stages}
+
+
+def release_memory() -> None:
+    """
+    Coleta objetos não referenciados e devolve ao sistema operacional a
+    memória livre do heap (malloc_trim, apenas glibc/Linux).
+    """
+    gc.collect()
+
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class PeakMemoryMonitor:
+    """
+    Mede o pico de memória residente (RSS) do processo durante um bloco.
+
+    Um thread auxiliar amostra o RSS a cada INGEST_MEMORY_SAMPLE_SECONDS.
+    O RSS é do processo inteiro: se outra ingestão do mesmo processo rodou
+    em parte do bloco, o pico inclui a memória dela e exclusive_peak_mb é None.
+
+    Exemplo:
+        with PeakMemoryMonitor() as monitor:
+            processar()
+        print(monitor.peak_mb)
+    """
+
+    # Monitores ativos no processo e total já iniciado (detecta blocos sobrepostos)
+    _active = 0
+    _started = 0
+    _lock = threading.Lock()
+
+    def __init__(self, interval: float = INGEST_MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self.exclusive = False
+        self._started_at_enter = 0
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def exclusive_peak_mb(self) -> Optional[float]:
+        """Pico de RSS se nenhuma outra medição do processo se sobrepôs a este bloco, senão None."""
+        return self.peak_mb if self.exclusive else None
+
+    def _sample(self) -> None:
+        self.peak_mb = max(self.peak_mb, get_process_rss_mb())
+
+    def _run(self) -> None:
+        while not self._done.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "PeakMemoryMonitor":
+        with PeakMemoryMonitor._lock:
+            PeakMemoryMonitor._active += 1
+            PeakMemoryMonitor._started += 1
+            self.exclusive = PeakMemoryMonitor._active == 1
+            self._started_at_enter = PeakMemoryMonitor._started
+
+        self.start_mb = get_process_rss_mb()
+        self.peak_mb = self.start_mb
+        self._thread = threading.Thread(target=self._run, name="ingest-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._done.set()
+        self._thread.join()
+        self._sample()
+
+        with PeakMemoryMonitor._lock:
+            PeakMemoryMonitor._active -= 1
+            # Outro bloco começou enquanto este rodava
+            if PeakMemoryMonitor._started != self._started_at_enter:
+                self.exclusive = False
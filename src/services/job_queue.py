@@ -0,0 +1,337 @@
+"""
+Fila Durável de Ingestão
+
+Este módulo implementa a fila de jobs de ingestão sobre a tabela
+ingestion_jobs (mesmo banco dos Documents):
+1. Enfileiramento pela API
+2. Reserva de jobs com lease (compare-and-set via UPDATE condicional)
+3. Heartbeat para estender o lease enquanto o job executa
+4. Retry com backoff exponencial e dead-letter após max_attempts
+
+A reserva usa apenas UPDATEs condicionais, sem locks de linha, então
+vários processos (em uma ou mais máquinas) podem consumir a mesma fila.
+"""
+
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from src.auth.database import IngestionJob, Document
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "120"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_BACKOFF_SECONDS = int(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "30"))
+INGEST_RETRY_BACKOFF_MAX_SECONDS = int(os.getenv("INGEST_RETRY_BACKOFF_MAX_SECONDS", "3600"))
+
+
+def enqueue_ingestion_job(
+    db: Session,
+    document_id: str,
+    user_id: int,
+    file_path: str,
+    use_semantic_chunking: bool = True,
+    max_attempts: int = INGEST_MAX_ATTEMPTS,
+    kind: str = "ingest"
+) -> IngestionJob:
+    """
+    Enfileira a ingestão de um documento.
+
+    Args:
+        db: Sessão do banco de dados
+        document_id: ID do documento
+        user_id: ID do usuário
+        file_path: Caminho do arquivo PDF
+        use_semantic_chunking: Se True, usa chunking semântico
+        max_attempts: Número máximo de tentativas antes do dead-letter
+        kind: "ingest" (documento novo) ou "version" (nova versão de um documento indexado)
+
+    Returns:
+        Job criado
+    """
+    now = datetime.utcnow()
+    job = IngestionJob(
+        id=str(uuid.uuid4()),
+        document_id=document_id,
+        user_id=user_id,
+        file_path=file_path,
+        use_semantic_chunking=use_semantic_chunking,
+        kind=kind,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        available_at=now,
+        created_at=now,
+        updated_at=now
+    )
+    db.add(job)
+    db.commit()
+
+    logger.info(f"Job {job.id} ({kind}) enfileirado para o documento {document_id}")
+
+    return job
+
+
+def _claimable(now: datetime):
+    """Condição SQL para jobs que podem ser reservados."""
+    return and_(
+        IngestionJob.attempts < IngestionJob.max_attempts,
+        or_(
+            and_(IngestionJob.status == "queued", IngestionJob.available_at <= now),
+            # Lease expirado: o worker que tinha o job morreu ou travou
+            and_(IngestionJob.status == "running", IngestionJob.lease_expires_at < now)
+        )
+    )
+
+
+def claim_job(db: Session, worker_id: str, lease_seconds: int = INGEST_LEASE_SECONDS) -> Optional[IngestionJob]:
+    """
+    Reserva o próximo job disponível para este worker.
+
+    Args:
+        db: Sessão do banco de dados
+        worker_id: Identificador único do worker
+        lease_seconds: Duração do lease
+
+    Returns:
+        Job reservado ou None se a fila estiver vazia
+    """
+    now = datetime.utcnow()
+
+    candidates = (
+        db.query(IngestionJob.id)
+        .filter(_claimable(now))
+        .order_by(IngestionJob.available_at, IngestionJob.created_at)
+        .limit(5)
+        .all()
+    )
+
+    for (job_id,) in candidates:
+        # Compare-and-set: só um worker consegue atualizar a linha
+        result = db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, _claimable(now))
+            .values(
+                status="running",
+                stage="claimed",
+                attempts=IngestionJob.attempts + 1,
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                heartbeat_at=now,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+        if result.rowcount == 1:
+            return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+    return None
+
+
+def heartbeat_job(
+    db: Session,
+    job_id: str,
+    worker_id: str,
+    lease_seconds: int = INGEST_LEASE_SECONDS,
+    stage: Optional[str] = None
+) -> bool:
+    """
+    Estende o lease de um job em execução (e opcionalmente registra a etapa).
+
+    Args:
+        db: Sessão do banco de dados
+        job_id: ID do job
+        worker_id: Identificador do worker dono do lease
+        lease_seconds: Nova duração do lease a partir de agora
+        stage: Etapa atual do pipeline (opcional)
+
+    Returns:
+        True se o lease ainda pertence a este worker
+    """
+    now = datetime.utcnow()
+    values = {
+        "lease_expires_at": now + timedelta(seconds=lease_seconds),
+        "heartbeat_at": now,
+        "updated_at": now
+    }
+    if stage is not None:
+        values["stage"] = stage
+
+    result = db.execute(
+        update(IngestionJob)
+        .where(
+            IngestionJob.id == job_id,
+            IngestionJob.status == "running",
+            IngestionJob.lease_owner == worker_id
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount == 1
+
+
+def complete_job(db: Session, job_id: str, worker_id: str) -> bool:
+    """
+    Marca um job como concluído.
+
+    Args:
+        db: Sessão do banco de dados
+        job_id: ID do job
+        worker_id: Identificador do worker dono do lease
+
+    Returns:
+        True se o job foi atualizado por este worker
+    """
+    now = datetime.utcnow()
+    result = db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.lease_owner == worker_id)
+        .values(
+            status="completed",
+            stage="completed",
+            lease_owner=None,
+            lease_expires_at=None,
+            last_error=None,
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount == 1
+
+
+def get_retry_delay(attempts: int) -> int:
+    """
+    Calcula o atraso até a próxima tentativa (backoff exponencial).
+
+    Args:
+        attempts: Número de tentativas já realizadas
+
+    Returns:
+        Atraso em segundos
+    """
+    delay = INGEST_RETRY_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    return min(delay, INGEST_RETRY_BACKOFF_MAX_SECONDS)
+
+
+def fail_job(db: Session, job_id: str, worker_id: str, error: str) -> str:
+    """
+    Registra a falha de um job: reagenda com backoff ou move para dead-letter.
+
+    Quando o job vai para dead-letter, o Document correspondente é marcado
+    com status "error".
+
+    Args:
+        db: Sessão do banco de dados
+        job_id: ID do job
+        worker_id: Identificador do worker dono do lease
+        error: Mensagem de erro
+
+    Returns:
+        Novo status do job ("queued" ou "dead")
+    """
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    if job is None or job.lease_owner != worker_id:
+        logger.warning(f"Job {job_id} não pertence mais ao worker {worker_id}")
+        return job.status if job else "dead"
+
+    now = datetime.utcnow()
+    job.last_error = error
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.updated_at = now
+
+    if job.attempts >= job.max_attempts:
+        job.status = "dead"
+        job.stage = "failed"
+
+        doc = db.query(Document).filter(Document.id == job.document_id).first()
+        if doc:
+            doc.status = "error"
+            doc.error_message = error
+            doc.processed_at = now
+
+        logger.error(f"❌ Job {job_id} movido para dead-letter após {job.attempts} tentativas: {error}")
+    else:
+        delay = get_retry_delay(job.attempts)
+        job.status = "queued"
+        job.stage = "retrying"
+        job.available_at = now + timedelta(seconds=delay)
+
+        logger.warning(f"Job {job_id} falhou (tentativa {job.attempts}/{job.max_attempts}), nova tentativa em {delay}s: {error}")
+
+    db.commit()
+
+    return job.status
+
+
+def dead_letter_expired_jobs(db: Session) -> int:
+    """
+    Move para dead-letter os jobs com lease expirado que já esgotaram as tentativas.
+
+    Esses jobs não podem mais ser reservados (o worker morreu na última tentativa).
+
+    Args:
+        db: Sessão do banco de dados
+
+    Returns:
+        Número de jobs movidos para dead-letter
+    """
+    now = datetime.utcnow()
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.status == "running",
+        IngestionJob.lease_expires_at < now,
+        IngestionJob.attempts >= IngestionJob.max_attempts
+    ).all()
+
+    for job in jobs:
+        job.status = "dead"
+        job.stage = "failed"
+        job.last_error = job.last_error or "Lease expirado na última tentativa"
+        job.lease_owner = None
+        job.lease_expires_at = None
+        job.updated_at = now
+
+        doc = db.query(Document).filter(Document.id == job.document_id).first()
+        if doc:
+            doc.status = "error"
+            doc.error_message = job.last_error
+            doc.processed_at = now
+
+    if jobs:
+        db.commit()
+        logger.warning(f"{len(jobs)} job(s) com lease expirado movidos para dead-letter")
+
+    return len(jobs)
+
+
+def get_latest_job(db: Session, document_id: str) -> Optional[IngestionJob]:
+    """
+    Retorna o job mais recente de um documento.
+
+    Args:
+        db: Sessão do banco de dados
+        document_id: ID do documento
+
+    Returns:
+        Job mais recente ou None
+    """
+    return (
+        db.query(IngestionJob)
+        .filter(IngestionJob.document_id == document_id)
+        .order_by(IngestionJob.created_at.desc())
+        .first()
+    )
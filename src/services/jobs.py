@@ -0,0 +1,255 @@
+"""
+Workers de Ingestão
+
+Este módulo executa os jobs da fila durável de ingestão (job_queue):
+1. Corpo do job: process_document_with_docling + atualização do Document
+2. Worker: reserva jobs, mantém o lease com heartbeat, registra sucesso/falha
+3. Pool de workers em threads (modo embutido na API, opcional)
+
+O entry point para processos dedicados fica em worker.py.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from src.auth.database import SessionLocal, Document
+from src.services.ingest import process_document_with_docling
+from src.services.vectorstore import uses_chroma_server
+from src.services.job_queue import (
+    INGEST_LEASE_SECONDS,
+    claim_job,
+    heartbeat_job,
+    complete_job,
+    fail_job,
+    dead_letter_expired_jobs,
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INGEST_POLL_INTERVAL_SECONDS = float(os.getenv("INGEST_POLL_INTERVAL_SECONDS", "2"))
+# Sem servidor Chroma a ingestão roda na própria API: o cliente embutido não
+# suporta outros processos (worker.py) escrevendo no mesmo diretório
+EMBEDDED_INGEST_WORKERS = int(os.getenv("EMBEDDED_INGEST_WORKERS", "0" if uses_chroma_server() else "1"))
+
+
+def run_ingestion(
+    doc_id: str,
+    file_path: str,
+    user_id: int,
+    use_semantic_chunking: bool = True,
+    on_progress=None,
+    new_version: bool = False
+) -> int:
+    """
+    Executa a ingestão de um documento e registra o resultado no Document.
+
+    Roda fora do event loop (em um worker), com uma sessão própria. Em caso
+    de erro a exceção é repassada para que a fila decida entre retry e
+    dead-letter.
+
+    Args:
+        doc_id: ID do documento
+        file_path: Caminho do arquivo PDF
+        user_id: ID do usuário
+        use_semantic_chunking: Se True, usa chunking semântico
+        on_progress: Callback opcional chamado com o nome de cada etapa
+        new_version: Se True, o PDF é uma nova versão do documento (reprocessa só as páginas alteradas)
+
+    Returns:
+        Número de chunks criados
+    """
+    db = SessionLocal()
+    try:
+        chunks_count = asyncio.run(process_document_with_docling(
+            file_path=file_path,
+            doc_id=doc_id,
+            user_id=user_id,
+            db=db,
+            use_semantic_chunking=use_semantic_chunking,
+            on_progress=on_progress,
+            new_version=new_version
+        ))
+
+        doc = db.query(Document).filter(Document.id == doc_id).first()
+        if doc:
+            doc.status = "completed"
+            doc.chunks_count = chunks_count
+            doc.error_message = None
+            doc.processed_at = datetime.now(timezone.utc)
+            db.commit()
+
+        return chunks_count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class IngestionWorker:
+    """
+    Consumidor da fila de ingestão.
+
+    Reserva um job por vez, executa o corpo da ingestão e mantém o lease
+    vivo com heartbeats em um thread auxiliar enquanto o job executa.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: int = INGEST_LEASE_SECONDS):
+        """
+        Inicializa o worker.
+
+        Args:
+            worker_id: Identificador único (padrão: host:pid:sufixo aleatório)
+            lease_seconds: Duração do lease de cada job
+        """
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Sinaliza o worker para parar após o job atual."""
+        self._stop.set()
+
+    def _heartbeat_loop(self, job_id: str, done: threading.Event, stage: dict) -> None:
+        db = SessionLocal()
+        try:
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    if not heartbeat_job(db, job_id, self.worker_id, self.lease_seconds, stage.get("current")):
+                        logger.warning(f"Worker {self.worker_id} perdeu o lease do job {job_id}")
+                        return
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Erro no heartbeat do job {job_id}: {str(e)}")
+        finally:
+            db.close()
+
+    def run_once(self) -> bool:
+        """
+        Reserva e executa um job.
+
+        Returns:
+            True se um job foi executado, False se a fila estava vazia
+        """
+        db = SessionLocal()
+        try:
+            dead_letter_expired_jobs(db)
+            job = claim_job(db, self.worker_id, self.lease_seconds)
+            if job is None:
+                return False
+
+            job_id = job.id
+            logger.info(f"Worker {self.worker_id} executando job {job_id} "
+                        f"(documento {job.document_id}, tentativa {job.attempts}/{job.max_attempts})")
+
+            stage = {"current": "claimed"}
+            done = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._heartbeat_loop,
+                args=(job_id, done, stage),
+                name=f"heartbeat-{job_id[:8]}",
+                daemon=True
+            )
+            heartbeat.start()
+
+            def on_progress(current: str):
+                # Registrar a etapa imediatamente (também renova o lease)
+                stage["current"] = current
+                try:
+                    heartbeat_job(db, job_id, self.worker_id, self.lease_seconds, current)
+                except Exception as e:
+                    db.rollback()
+                    logger.debug(f"Erro ao registrar etapa do job {job_id}: {str(e)}")
+
+            try:
+                chunks_count = run_ingestion(
+                    doc_id=job.document_id,
+                    file_path=job.file_path,
+                    user_id=job.user_id,
+                    use_semantic_chunking=job.use_semantic_chunking,
+                    on_progress=on_progress,
+                    new_version=job.kind == "version"
+                )
+            except Exception as e:
+                done.set()
+                heartbeat.join()
+                fail_job(db, job_id, self.worker_id, str(e))
+                return True
+
+            done.set()
+            heartbeat.join()
+            complete_job(db, job_id, self.worker_id)
+            logger.info(f"✅ Job {job_id} concluído: {chunks_count} chunks")
+            return True
+        finally:
+            db.close()
+
+    def run_forever(self, poll_interval: float = INGEST_POLL_INTERVAL_SECONDS) -> None:
+        """
+        Consome a fila até stop() ser chamado.
+
+        Args:
+            poll_interval: Espera entre consultas quando a fila está vazia
+        """
+        logger.info(f"Worker de ingestão {self.worker_id} iniciado")
+
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Erro no worker {self.worker_id}: {str(e)}")
+            self._stop.wait(poll_interval)
+
+        logger.info(f"Worker de ingestão {self.worker_id} finalizado")
+
+
+class IngestionWorkerPool:
+    """
+    Pool de workers da fila executando em threads do processo atual.
+
+    Usado para rodar a ingestão embutida na API (EMBEDDED_INGEST_WORKERS),
+    padrão quando não há servidor Chroma; com um servidor Chroma os workers
+    podem rodar em processos separados (worker.py).
+    """
+
+    def __init__(self, num_workers: int = EMBEDDED_INGEST_WORKERS):
+        """
+        Inicializa o pool.
+
+        Args:
+            num_workers: Número de workers (threads)
+        """
+        self.num_workers = num_workers
+        self._workers: List[IngestionWorker] = []
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Inicia os workers."""
+        for i in range(self.num_workers):
+            worker = IngestionWorker()
+            thread = threading.Thread(target=worker.run_forever, name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self._workers.append(worker)
+            self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Encerra os workers.
+
+        Args:
+            wait: Se True, aguarda os jobs em execução terminarem
+        """
+        for worker in self._workers:
+            worker.stop()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,225 @@
+"""
+Backend de Embeddings com ONNX Runtime
+
+Este módulo serve o encoder de texto do CLIP multilíngue pelo ONNX Runtime,
+sem PyTorch no caminho de inferência:
+1. Exportação do SentenceTransformer (transformer + pooling + dense) para ONNX
+2. Quantização dinâmica int8 opcional dos pesos
+3. Tokenização com o tokenizer original (salvo junto do modelo exportado)
+4. Mesma interface Embeddings (CachedEmbeddings) usada por ingest.py e rag.py
+
+A exportação acontece uma única vez por modelo e fica em ONNX_EXPORT_DIR.
+"""
+
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import List
+
+import numpy as np
+
+from src.services.embeddings import CachedEmbeddings, DEFAULT_EMBEDDING_MODEL
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ONNX_EXPORT_DIRECTORY = os.getenv("ONNX_EXPORT_DIR", "./onnx_models")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = padrão do ORT
+ONNX_OPSET_VERSION = 14
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+
+def get_onnx_model_dir(model_name: str, export_dir: str = ONNX_EXPORT_DIRECTORY) -> str:
+    """
+    Retorna o diretório do modelo exportado.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+        export_dir: Diretório raiz das exportações
+
+    Returns:
+        Caminho do diretório do modelo
+    """
+    return os.path.join(export_dir, model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name: str = DEFAULT_EMBEDDING_MODEL, export_dir: str = ONNX_EXPORT_DIRECTORY) -> str:
+    """
+    Exporta o SentenceTransformer para ONNX (float32), com o tokenizer.
+
+    O grafo exportado recebe input_ids e attention_mask e devolve
+    sentence_embedding já com pooling e camada densa aplicados.
+
+    Args:
+        model_name: Nome do modelo no Hugging Face
+        export_dir: Diretório raiz das exportações
+
+    Returns:
+        Caminho do diretório do modelo exportado
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = get_onnx_model_dir(model_name, export_dir)
+    if os.path.exists(os.path.join(model_dir, ONNX_MODEL_FILE)):
+        return model_dir
+
+    logger.info(f"📦 Exportando {model_name} para ONNX...")
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    st_model.eval()
+
+    class _SentenceEmbeddingGraph(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            features = self.model({"input_ids": input_ids, "attention_mask": attention_mask})
+            return features["sentence_embedding"]
+
+    sample = st_model.tokenizer(
+        ["exemplo de texto para exportação", "outro exemplo"],
+        padding=True,
+        return_tensors="pt"
+    )
+
+    # Exportar em diretório temporário e mover no final (outros processos podem exportar ao mesmo tempo)
+    temp_dir = f"{model_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(temp_dir, exist_ok=True)
+
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                _SentenceEmbeddingGraph(st_model),
+                (sample["input_ids"], sample["attention_mask"]),
+                os.path.join(temp_dir, ONNX_MODEL_FILE),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["sentence_embedding"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "sentence_embedding": {0: "batch"}
+                },
+                opset_version=ONNX_OPSET_VERSION,
+                do_constant_folding=True,
+                dynamo=False
+            )
+
+        st_model.tokenizer.save_pretrained(temp_dir)
+        with open(os.path.join(temp_dir, ONNX_CONFIG_FILE), "w") as f:
+            json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length}, f)
+
+        os.makedirs(export_dir, exist_ok=True)
+        try:
+            os.rename(temp_dir, model_dir)
+        except OSError:
+            # Outro processo terminou a exportação antes
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"✅ Modelo ONNX exportado em {model_dir}")
+    return model_dir
+
+
+def quantize_onnx_model(model_dir: str) -> str:
+    """
+    Gera a versão int8 (quantização dinâmica dos pesos) do modelo exportado.
+
+    Args:
+        model_dir: Diretório do modelo exportado
+
+    Returns:
+        Caminho do arquivo quantizado
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE)
+    if os.path.exists(int8_path):
+        return int8_path
+
+    logger.info(f"📦 Quantizando {model_dir} para int8...")
+
+    temp_path = f"{int8_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        quantize_dynamic(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            temp_path,
+            weight_type=QuantType.QInt8
+        )
+        os.replace(temp_path, int8_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return int8_path
+
+
+class OnnxEmbeddings(CachedEmbeddings):
+    """
+    Embeddings servidos pelo ONNX Runtime (CPU).
+
+    Produz os mesmos vetores que SentenceTransformerEmbeddings (a menos de
+    erro numérico; maior no modo int8).
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        quantize: bool = False,
+        export_dir: str = ONNX_EXPORT_DIRECTORY,
+        **kwargs
+    ):
+        """
+        Inicializa a sessão ONNX, exportando o modelo se necessário.
+
+        Args:
+            model_name: Nome do modelo no Hugging Face
+            quantize: Se True, usa a versão quantizada int8
+            export_dir: Diretório raiz das exportações
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        super().__init__(**kwargs)
+        self.model_name = model_name
+        self.quantize = quantize
+
+        model_dir = export_onnx_model(model_name, export_dir)
+        model_path = quantize_onnx_model(model_dir) if quantize else os.path.join(model_dir, ONNX_MODEL_FILE)
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE)) as f:
+            config = json.load(f)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = config["max_seq_length"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+        logger.info(f"Modelo ONNX carregado: {model_path}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self._input_names}
+        (embeddings,) = self.session.run(["sentence_embedding"], feeds)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
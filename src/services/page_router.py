@@ -0,0 +1,345 @@
+"""
+Roteamento de Páginas na Extração
+
+Este módulo decide, página por página, quem extrai o conteúdo do PDF:
+1. Classificação barata de cada página com PyMuPDF (camada de texto, colunas, tabelas)
+2. Páginas simples: blocos de texto extraídos diretamente do PDF
+3. Páginas complexas (tabelas, múltiplas colunas, sem camada de texto): Docling
+4. Elementos nativos com os mesmos atributos lidos dos itens do Docling
+   (texto, label, página), percorridos como um DoclingDocument
+5. Detecção das páginas sem camada de texto (as únicas que precisam de OCR)
+"""
+
+import logging
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INGEST_PAGE_ROUTER = os.getenv("INGEST_PAGE_ROUTER", "1").lower() in ("1", "true", "yes")
+# OCR do Docling apenas nas páginas sem camada de texto utilizável
+INGEST_SELECTIVE_OCR = os.getenv("INGEST_SELECTIVE_OCR", "1").lower() in ("1", "true", "yes")
+# Mínimo de caracteres na camada de texto para a página não precisar de OCR
+PAGE_ROUTER_MIN_TEXT_CHARS = int(os.getenv("PAGE_ROUTER_MIN_TEXT_CHARS", "32"))
+# Blocos com fonte maior que o corpo do texto por este fator viram section_header
+PAGE_ROUTER_HEADER_SIZE_RATIO = float(os.getenv("PAGE_ROUTER_HEADER_SIZE_RATIO", "1.15"))
+
+ROUTE_NATIVE = "native"
+ROUTE_DOCLING = "docling"
+
+# Faixas superior e inferior da página tratadas como cabeçalho/rodapé (o Docling também os descarta)
+_MARGIN_RATIO = 0.06
+# Blocos curtos (rótulos, números) não caracterizam colunas
+_MIN_COLUMN_BLOCK_CHARS = 40
+_MAX_HEADER_CHARS = 150
+
+_LIST_ITEM_RE = re.compile(r"([-*•▪]|\d+[\.\)])\s")
+_DIGIT_RE = re.compile(r"\d")
+
+
+@dataclass
+class NativeProvenance:
+    """Proveniência de um elemento nativo (mesmo atributo page_no do Docling)."""
+    page_no: int
+
+
+@dataclass
+class NativeElement:
+    """
+    Bloco de texto extraído diretamente do PDF.
+
+    Attributes:
+        text: Texto do bloco (linhas unidas por espaço)
+        label: text, section_header ou list_item
+        prov: Proveniência (página)
+    """
+    text: str
+    label: str
+    prov: List[NativeProvenance]
+
+
+class NativePageWindow:
+    """
+    Janela de páginas extraídas com PyMuPDF.
+
+    Expõe iterate_items() e export_to_dict() como um DoclingDocument, de modo
+    que a travessia dos elementos e o cache de conversões tratam as duas
+    origens da mesma forma.
+    """
+
+    def __init__(self, elements: List[NativeElement]):
+        self.elements = elements
+
+    def iterate_items(self) -> Iterator[Tuple[NativeElement, int]]:
+        for element in self.elements:
+            yield element, 1
+
+    def export_to_dict(self) -> Dict:
+        return {
+            "native_elements": [
+                {"text": element.text, "label": element.label, "page": element.prov[0].page_no}
+                for element in self.elements
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NativePageWindow":
+        return cls([
+            NativeElement(text=item["text"], label=item["label"], prov=[NativeProvenance(item["page"])])
+            for item in data["native_elements"]
+        ])
+
+
+@dataclass
+class PageRoute:
+    """
+    Decisão do roteador para uma página.
+
+    Attributes:
+        page_no: Número da página (1-based)
+        route: ROUTE_NATIVE ou ROUTE_DOCLING
+        reason: simple, no_text_layer, multi_column ou table
+        elements: Elementos extraídos (apenas páginas nativas)
+    """
+    page_no: int
+    route: str
+    reason: str
+    elements: List[NativeElement] = field(default_factory=list)
+
+
+@dataclass
+class _TextBlock:
+    text: str
+    lines: List[str]
+    size: float
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+def _read_blocks(page) -> Tuple[List[_TextBlock], Counter]:
+    """Lê os blocos de texto da página (fora das margens) e o tamanho de fonte por caractere."""
+    height = page.rect.height
+    blocks = []
+    sizes = Counter()
+
+    for block in page.get_text("dict", sort=True)["blocks"]:
+        if block.get("type") != 0:
+            continue
+
+        x0, y0, x1, y1 = block["bbox"]
+        if y1 <= height * _MARGIN_RATIO or y0 >= height * (1 - _MARGIN_RATIO):
+            continue
+
+        lines = []
+        max_size = 0.0
+        for line in block["lines"]:
+            line_text = "".join(span["text"] for span in line["spans"]).strip()
+            if not line_text:
+                continue
+            lines.append(line_text)
+            for span in line["spans"]:
+                span_chars = len(span["text"].strip())
+                if span_chars:
+                    sizes[round(span["size"], 1)] += span_chars
+                    max_size = max(max_size, span["size"])
+
+        if lines:
+            blocks.append(_TextBlock(" ".join(lines), lines, max_size, x0, y0, x1, y1))
+
+    return blocks, sizes
+
+
+def _has_text_layer(blocks: List[_TextBlock]) -> bool:
+    return sum(len(b.text) for b in blocks) >= PAGE_ROUTER_MIN_TEXT_CHARS
+
+
+def _is_multi_column(blocks: List[_TextBlock], page_width: float) -> bool:
+    """Há blocos de texto lado a lado (um em cada metade da página, na mesma altura)?"""
+    middle = page_width / 2
+    tolerance = page_width * 0.02
+    narrow = [b for b in blocks if len(b.text) >= _MIN_COLUMN_BLOCK_CHARS and b.x1 - b.x0 < page_width * 0.55]
+
+    left = [b for b in narrow if b.x1 <= middle + tolerance]
+    right = [b for b in narrow if b.x0 >= middle - tolerance]
+
+    return any(min(l.y1, r.y1) > max(l.y0, r.y0) for l in left for r in right)
+
+
+def _looks_tabular(block: _TextBlock) -> bool:
+    """Bloco com 3 ou mais linhas, a maioria com 2 ou mais valores numéricos (tabela sem linhas)."""
+    if len(block.lines) < 3:
+        return False
+    numeric_lines = sum(
+        1 for line in block.lines
+        if sum(1 for token in line.split() if _DIGIT_RE.search(token)) >= 2
+    )
+    return numeric_lines * 2 >= len(block.lines)
+
+
+def _classify_page(page, blocks: List[_TextBlock]) -> str:
+    """Retorna o motivo da rota (simple = extração nativa)."""
+    if not _has_text_layer(blocks):
+        return "no_text_layer"
+
+    if _is_multi_column(blocks, page.rect.width):
+        return "multi_column"
+
+    if any(_looks_tabular(b) for b in blocks):
+        return "table"
+
+    # Tabelas com linhas de grade (mais caro: só depois das verificações anteriores)
+    if page.find_tables().tables:
+        return "table"
+
+    return "simple"
+
+
+def _label_block(block: _TextBlock, body_size: float) -> str:
+    if (
+        body_size > 0
+        and block.size >= body_size * PAGE_ROUTER_HEADER_SIZE_RATIO
+        and len(block.text) <= _MAX_HEADER_CHARS
+        and len(block.lines) <= 3
+    ):
+        return "section_header"
+    if _LIST_ITEM_RE.match(block.text):
+        return "list_item"
+    return "text"
+
+
+def route_pages(file_path: str, pages: Optional[Iterable[int]] = None) -> List[PageRoute]:
+    """
+    Classifica as páginas do PDF e extrai o texto das páginas simples.
+
+    Páginas sem camada de texto, com múltiplas colunas ou com tabelas vão
+    para o Docling; as demais viram elementos nativos. Blocos com fonte
+    maior que a do corpo do texto (tamanho mais frequente no documento
+    inteiro, mesmo quando só algumas páginas são roteadas) são marcados
+    como section_header.
+
+    Args:
+        file_path: Caminho do arquivo PDF
+        pages: Páginas a rotear (padrão: todas)
+
+    Returns:
+        Lista de PageRoute, em ordem de página
+    """
+    import fitz  # PyMuPDF
+
+    selected = set(pages) if pages is not None else None
+    routes = []
+    page_blocks = {}
+    sizes = Counter()
+
+    with fitz.open(file_path) as pdf_document:
+        for page in pdf_document:
+            page_no = page.number + 1
+            blocks, page_sizes = _read_blocks(page)
+            sizes.update(page_sizes)
+
+            # Páginas não roteadas contam apenas para o tamanho de fonte do corpo,
+            # para que os labels não dependam de quais páginas foram reprocessadas
+            if selected is not None and page_no not in selected:
+                continue
+
+            reason = _classify_page(page, blocks)
+            route = ROUTE_NATIVE if reason == "simple" else ROUTE_DOCLING
+            routes.append(PageRoute(page_no=page_no, route=route, reason=reason))
+            if route == ROUTE_NATIVE:
+                page_blocks[page_no] = blocks
+
+    # Tamanho de fonte do corpo do texto: o mais frequente (por caractere) no documento
+    body_size = sizes.most_common(1)[0][0] if sizes else 0.0
+
+    for route in routes:
+        for block in page_blocks.get(route.page_no, []):
+            route.elements.append(NativeElement(
+                text=block.text,
+                label=_label_block(block, body_size),
+                prov=[NativeProvenance(route.page_no)]
+            ))
+
+    reasons = Counter(route.reason for route in routes)
+    logger.info(f"🔀 Roteamento de {len(routes)} páginas: {reasons.get('simple', 0)} nativas, "
+                f"{len(routes) - reasons.get('simple', 0)} para o Docling ({dict(reasons)})")
+
+    return routes
+
+
+def iter_route_runs(routes: List[PageRoute]) -> Iterator[Tuple[str, List[PageRoute]]]:
+    """
+    Agrupa páginas consecutivas com a mesma rota.
+
+    Args:
+        routes: Rotas em ordem de página
+
+    Yields:
+        (rota, [PageRoute, ...])
+    """
+    run: List[PageRoute] = []
+    for route in routes:
+        if run and (route.route != run[-1].route or route.page_no != run[-1].page_no + 1):
+            yield run[0].route, run
+            run = []
+        run.append(route)
+    if run:
+        yield run[0].route, run
+
+
+def split_page_runs(pages: Iterable[int], window_pages: int = 0) -> List[Tuple[int, int]]:
+    """
+    Agrupa páginas em intervalos de páginas consecutivas.
+
+    Args:
+        pages: Números das páginas
+        window_pages: Tamanho máximo de cada intervalo (0 = sem limite)
+
+    Returns:
+        Lista de (primeira, última) página, em ordem
+    """
+    runs = []
+    for page in sorted(set(pages)):
+        if runs and page == runs[-1][1] + 1 and (window_pages <= 0 or page - runs[-1][0] < window_pages):
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [(start, end) for start, end in runs]
+
+
+def find_pages_without_text_layer(file_path: str, pages: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Lista as páginas sem camada de texto utilizável (digitalizadas ou só imagens).
+
+    Usa o mesmo critério do roteador (PAGE_ROUTER_MIN_TEXT_CHARS fora das
+    margens), sem classificar o layout nem extrair os elementos.
+
+    Args:
+        file_path: Caminho do arquivo PDF
+        pages: Páginas a verificar (padrão: todas)
+
+    Returns:
+        Números das páginas (1-based) que precisam de OCR, em ordem
+    """
+    import fitz  # PyMuPDF
+
+    selected = set(pages) if pages is not None else None
+    without_text = []
+
+    with fitz.open(file_path) as pdf_document:
+        for page in pdf_document:
+            page_no = page.number + 1
+            if selected is not None and page_no not in selected:
+                continue
+
+            blocks, _ = _read_blocks(page)
+            if not _has_text_layer(blocks):
+                without_text.append(page_no)
+
+    return without_text
@@ -8,118 +8,50 @@ Este módulo implementa o sistema de busca e recuperação:
 4. Preparação para envio ao LLM
 """
 
+import base64
+import hashlib
 import logging
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 # Configurar modo offline para modelos já baixados
 os.environ["HF_HUB_OFFLINE"] = "1"
 os.environ["TRANSFORMERS_OFFLINE"] = "1"
 
-from langchain_chroma import Chroma
-from langchain_core.embeddings import Embeddings
-from sentence_transformers import SentenceTransformer
+from langchain_core.documents import Document as LangChainDocument
 
 from src.auth.database import DocumentImage
+from src.services.chunking_strategy import get_neighbor_indices
+from src.services.embedding_batcher import embed_query_async
+from src.services.image_store import get_image_path
+from src.services.vectorstore import get_chroma_vectorstore
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class SentenceTransformerEmbeddings(Embeddings):
-    """
-    Wrapper para usar Sentence Transformers com LangChain.
-
-    Implementa a interface Embeddings do LangChain usando
-    a biblioteca sentence-transformers nativa.
-    """
-
-    def __init__(self, model_name: str = "sentence-transformers/clip-ViT-B-32-multilingual-v1"):
-        """
-        Inicializa o modelo Sentence Transformer.
-
-        Args:
-            model_name: Nome do modelo no Hugging Face
-        """
-        self.model = SentenceTransformer(model_name)
-        logger.info(f"Modelo Sentence Transformer carregado: {model_name}")
-
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """
-        Gera embeddings para uma lista de documentos.
-
-        Args:
-            texts: Lista de textos
-
-        Returns:
-            Lista de embeddings (lista de floats)
-        """
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
-
-    def embed_query(self, text: str) -> List[float]:
-        """
-        Gera embedding para uma query.
-
-        Args:
-            text: Texto da query
-
-        Returns:
-            Embedding (lista de floats)
-        """
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
-
-
-def get_embedding_function():
-    """
-    Retorna a função de embeddings (CLIP multilíngue via Sentence Transformers).
-
-    Returns:
-        SentenceTransformerEmbeddings configurado
-    """
-    return SentenceTransformerEmbeddings(
-        model_name="sentence-transformers/clip-ViT-B-32-multilingual-v1"
-    )
-
-
-def get_chroma_vectorstore(user_id: int):
-    """
-    Obtém o vector store Chroma do usuário via LangChain.
-
-    Args:
-        user_id: ID do usuário
-
-    Returns:
-        Chroma vector store do LangChain
-    """
-    collection_name = f"user_{user_id}_documents"
-
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=get_embedding_function(),
-        persist_directory="./chroma_db"
-    )
-
-    return vectorstore
+IMAGE_URL_PREFIX = "/images"
 
 
 def get_images_by_ids(image_ids: List[str], db: Session) -> List[Dict]:
     """
-    Recupera imagens do SQLite por lista de IDs.
+    Recupera os metadados de imagens do SQLite por lista de IDs.
+
+    Os bytes não são incluídos: cada imagem traz a URL de GET /images/{id},
+    de onde o cliente busca o conteúdo (uma vez, com cache HTTP).
 
     Args:
         image_ids: Lista de IDs de imagens
         db: Sessão do banco de dados
 
     Returns:
-        Lista de dicionários com dados das imagens:
+        Lista de dicionários com metadados das imagens:
         [
             {
                 "id": "...",
-                "data": "base64_string",
+                "url": "/images/...",
                 "format": "png",
                 "caption": "...",
                 "page": 5
@@ -129,14 +61,19 @@ def get_images_by_ids(image_ids: List[str], db: Session) -> List[Dict]:
     if not image_ids:
         return []
 
-    images = db.query(DocumentImage).filter(
+    images = db.query(
+        DocumentImage.id,
+        DocumentImage.image_format,
+        DocumentImage.caption,
+        DocumentImage.page_number
+    ).filter(
         DocumentImage.id.in_(image_ids)
     ).all()
 
     result = [
         {
             "id": img.id,
-            "data": img.image_data,  # Base64 string
+            "url": f"{IMAGE_URL_PREFIX}/{img.id}",
             "format": img.image_format,
             "caption": img.caption,
             "page": img.page_number
@@ -149,6 +86,143 @@ def get_images_by_ids(image_ids: List[str], db: Session) -> List[Dict]:
     return result
 
 
+def get_image_content(image_id: str, db: Session) -> Optional[Dict]:
+    """
+    Localiza o conteúdo de uma imagem para entrega ao cliente.
+
+    Imagens do image store são entregues direto do arquivo (path); imagens
+    legadas em base64 são decodificadas (data).
+
+    Args:
+        image_id: ID da imagem
+        db: Sessão do banco de dados
+
+    Returns:
+        {
+            "id": "...",
+            "document_id": "...",
+            "format": "png",
+            "etag": "<sha256>",
+            "path": "image_store/ab/ab12....png" ou None,
+            "data": bytes ou None
+        }
+        ou None se a imagem não existir
+    """
+    img = db.query(DocumentImage).filter(DocumentImage.id == image_id).first()
+    if img is None:
+        return None
+
+    content = {
+        "id": img.id,
+        "document_id": img.document_id,
+        "format": img.image_format,
+        "etag": img.content_hash,
+        "path": None,
+        "data": None
+    }
+
+    if img.content_hash:
+        content["path"] = get_image_path(img.content_hash, img.image_format)
+    else:
+        data = base64.b64decode(img.image_data)
+        content["data"] = data
+        content["etag"] = hashlib.sha256(data).hexdigest()
+
+    return content
+
+
+def parse_chunk_id(chunk_id: str) -> Optional[Tuple[str, int]]:
+    """
+    Separa um chunk_id no formato "{doc_id}_chunk_{idx}".
+
+    Args:
+        chunk_id: ID do chunk
+
+    Returns:
+        Tupla (doc_id, idx) ou None se o formato não for reconhecido
+    """
+    doc_id, sep, idx = chunk_id.rpartition("_chunk_")
+    if not sep or not idx.isdigit():
+        return None
+    return doc_id, int(idx)
+
+
+def fetch_neighbor_chunks(
+    vectorstore,
+    results: List[Tuple[LangChainDocument, float]],
+    n_before: int = 1,
+    n_after: int = 1
+) -> List[Tuple[LangChainDocument, float]]:
+    """
+    Recupera os chunks vizinhos dos resultados por ID, em uma única consulta.
+
+    Os chunk_ids são sequenciais por documento, então os vizinhos de
+    "{doc_id}_chunk_{idx}" são obtidos diretamente por ID, sem novas buscas
+    por similaridade (nem novos embeddings da pergunta).
+
+    Args:
+        vectorstore: Chroma vector store do usuário
+        results: Resultados da busca [(doc, score), ...]
+        n_before: Número de chunks anteriores a incluir
+        n_after: Número de chunks posteriores a incluir
+
+    Returns:
+        Lista [(doc, score), ...] dos vizinhos, com score reduzido herdado do
+        chunk que os originou
+    """
+    # Agrupar índices recuperados por documento
+    hit_indices: Dict[str, List[int]] = {}
+    hit_scores: Dict[str, float] = {}
+    for doc, score in results:
+        chunk_id = doc.metadata.get("chunk_id", "")
+        parsed = parse_chunk_id(chunk_id)
+        if parsed is None:
+            continue
+        doc_id, idx = parsed
+        hit_indices.setdefault(doc_id, []).append(idx)
+        hit_scores[chunk_id] = score
+
+    if not hit_indices:
+        return []
+
+    # Calcular IDs dos vizinhos e qual resultado originou cada um
+    neighbor_origin: Dict[str, str] = {}
+    for doc_id, indices in hit_indices.items():
+        for idx in indices:
+            origin_id = f"{doc_id}_chunk_{idx}"
+            for neighbor_idx in get_neighbor_indices([idx], n_before, n_after):
+                neighbor_id = f"{doc_id}_chunk_{neighbor_idx}"
+                if neighbor_id not in hit_scores and neighbor_id not in neighbor_origin:
+                    neighbor_origin[neighbor_id] = origin_id
+
+    if not neighbor_origin:
+        return []
+
+    # Uma única consulta por ID (IDs inexistentes são simplesmente ignorados)
+    try:
+        fetched = vectorstore.get(
+            ids=list(neighbor_origin.keys()),
+            include=["documents", "metadatas"]
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao buscar chunks vizinhos: {str(e)}")
+        return []
+
+    fetched_by_id = {
+        chunk_id: LangChainDocument(page_content=text or "", metadata=metadata or {})
+        for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+    }
+
+    # Manter a ordem determinística (ordem de cálculo dos vizinhos)
+    neighbors = []
+    for neighbor_id, origin_id in neighbor_origin.items():
+        neighbor_doc = fetched_by_id.get(neighbor_id)
+        if neighbor_doc is not None:
+            neighbors.append((neighbor_doc, hit_scores[origin_id] * 0.8))  # Score reduzido
+
+    return neighbors
+
+
 async def query_documents(
     question: str,
     user_id: int,
@@ -162,11 +236,11 @@ async def query_documents(
     Busca documentos relevantes no ChromaDB e recupera imagens associadas.
 
     Fluxo:
-    1. Buscar top_k chunks mais similares usando LangChain
+    1. Gerar o embedding da pergunta (agrupado com queries concorrentes)
+       e buscar os top_k chunks mais similares
     2. (OPCIONAL) Expandir contexto incluindo chunks vizinhos
-    3. Para cada chunk:
-       - Verificar se tem imagens (metadata.has_images)
-       - Se sim, recuperar imagens do SQLite
+    3. Reunir os IDs de imagens de todos os chunks (metadata.has_images)
+       e recuperar seus metadados do SQLite em uma única consulta
     4. Retornar contexto estruturado (texto + imagens)
 
     Args:
@@ -188,7 +262,7 @@ async def query_documents(
                     "metadata": {...},
                     "score": 0.85,
                     "images": [
-                        {"id": "...", "data": "base64...", ...}
+                        {"id": "...", "url": "/images/...", ...}
                     ],
                     "is_neighbor": False  # True se chunk foi adicionado por expansão
                 }
@@ -211,9 +285,10 @@ async def query_documents(
             "error": "Nenhum documento indexado encontrado"
         }
 
-    # 2. Buscar documentos similares (LangChain gera embedding automaticamente)
-    results = vectorstore.similarity_search_with_score(
-        query=question,
+    # 2. Buscar documentos similares (embedding via cache + micro-batching de queries concorrentes)
+    query_embedding = await embed_query_async(question)
+    results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+        embedding=query_embedding.tolist(),
         k=top_k
     )
 
@@ -226,39 +301,11 @@ async def query_documents(
     if expand_neighbors and len(results) > 0:
         logger.info(f"🔧 Expandindo contexto com vizinhos (n_before={n_before}, n_after={n_after})...")
 
-        # Para cada chunk retornado, buscar vizinhos
-        neighbor_docs = []
-        for doc, score in results:
-            metadata = doc.metadata
-            page = metadata.get("page", 0)
-            doc_id = metadata.get("document_id", "")
-
-            # Buscar chunks vizinhos da mesma página/documento
-            # Usar filtro de metadados para encontrar vizinhos
-            for offset in range(-n_before, n_after + 1):
-                if offset == 0:
-                    continue  # Pular o chunk atual
-
-                try:
-                    # Buscar chunks próximos (mesma página ou páginas vizinhas)
-                    neighbor_page = page + (offset // 3)  # Aproximação: 3 chunks por página
-
-                    neighbor_results = vectorstore.similarity_search(
-                        query=question,
-                        k=1,
-                        filter={"page": neighbor_page, "document_id": doc_id}
-                    )
-
-                    if neighbor_results:
-                        neighbor_docs.append((neighbor_results[0], score * 0.8, True))  # Score reduzido, is_neighbor=True
-
-                except Exception as e:
-                    logger.debug(f"Erro ao buscar vizinho offset={offset}: {str(e)}")
-                    continue
+        neighbor_docs = fetch_neighbor_chunks(vectorstore, results, n_before, n_after)
 
         # Adicionar vizinhos únicos
-        existing_ids = {metadata.get("chunk_id", "") for doc, _ in results}
-        for neighbor_doc, neighbor_score, is_neighbor in neighbor_docs:
+        existing_ids = {doc.metadata.get("chunk_id", "") for doc, _ in results}
+        for neighbor_doc, neighbor_score in neighbor_docs:
             neighbor_id = neighbor_doc.metadata.get("chunk_id", "")
             if neighbor_id and neighbor_id not in existing_ids:
                 expanded_results.append((neighbor_doc, neighbor_score))
@@ -266,7 +313,22 @@ async def query_documents(
 
         logger.info(f"✅ Expandido: {len(results)} → {len(expanded_results)} chunks")
 
-    # 4. Processar resultados e carregar imagens
+    # 4. Carregar imagens de todos os chunks (inclusive vizinhos) em uma única consulta
+    chunk_image_ids = []
+    all_image_ids = {}  # dict como conjunto ordenado (IDs únicos)
+    for doc, _ in expanded_results:
+        image_ids = []
+        if doc.metadata.get("has_images"):
+            image_ids_str = doc.metadata.get("image_ids", "")
+            if image_ids_str:
+                # Converter CSV string para lista
+                image_ids = [image_id for image_id in image_ids_str.split(",") if image_id]
+        chunk_image_ids.append(image_ids)
+        all_image_ids.update(dict.fromkeys(image_ids))
+
+    images_by_id = {img["id"]: img for img in get_images_by_ids(list(all_image_ids), db)}
+
+    # 5. Processar resultados (cada chunk referencia as imagens compartilhadas)
     context_chunks = []
 
     for idx, (doc, score) in enumerate(expanded_results):
@@ -278,21 +340,10 @@ async def query_documents(
             "text": doc.page_content,
             "metadata": metadata,
             "score": score,
-            "images": [],
+            "images": [images_by_id[image_id] for image_id in chunk_image_ids[idx] if image_id in images_by_id],
             "is_neighbor": is_neighbor
         }
 
-        # Carregar imagens se houver
-        if metadata.get("has_images"):
-            image_ids_str = metadata.get("image_ids", "")
-            if image_ids_str:
-                # Converter CSV string para lista
-                image_ids = image_ids_str.split(",")
-                images = get_images_by_ids(image_ids, db)
-                chunk_data["images"] = images
-
-                logger.info(f"Chunk tem {len(images)} imagem(ns)")
-
         context_chunks.append(chunk_data)
 
     logger.info(f"✅ Query processada: {len(context_chunks)} chunks retornados")
@@ -323,21 +374,24 @@ def format_context_for_llm(query_result: Dict) -> Dict:
         {
             "question": "...",
             "context_text": "Contexto combinado de todos os chunks",
-            "images": [{"id": "...", "data": "base64...", "page": 5}],
+            "images": [{"id": "...", "url": "/images/...", "page": 5}],
             "sources": ["manual.pdf - página 5", ...]
         }
     """
     context_text = ""
     all_images = []
+    seen_image_ids = set()
     sources = []
 
     for chunk in query_result["chunks"]:
         # Adicionar texto
         context_text += f"\n\n{chunk['text']}"
 
-        # Coletar imagens
-        if chunk["images"]:
-            all_images.extend(chunk["images"])
+        # Coletar imagens (as mesmas imagens são compartilhadas entre chunks)
+        for image in chunk["images"]:
+            if image["id"] not in seen_image_ids:
+                seen_image_ids.add(image["id"])
+                all_images.append(image)
 
         # Coletar fontes
         source = f"{chunk['metadata'].get('source_file', 'Unknown')} - página {chunk['metadata'].get('page', '?')}"
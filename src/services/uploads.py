@@ -0,0 +1,142 @@
+"""
+Recebimento de Uploads
+
+Este módulo grava os arquivos enviados à API em disco:
+1. Leitura do corpo em blocos (sem carregar o arquivo inteiro em memória)
+2. Hash SHA-256 e tamanho calculados durante a gravação
+3. Limite de tamanho configurável, verificado a cada bloco
+4. Rejeição antecipada de arquivos sem assinatura PDF (%PDF-)
+5. Gravação em arquivo temporário, movido para o destino só no final
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPLOAD_READ_CHUNK_SIZE = int(os.getenv("UPLOAD_READ_CHUNK_SIZE_KB", "1024")) * 1024
+MAX_UPLOAD_SIZE_BYTES = int(os.getenv("MAX_UPLOAD_SIZE_MB", "300")) * 1024 * 1024
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "1024")) * 1024 * 1024
+
+# A especificação PDF permite que o cabeçalho apareça nos primeiros 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+
+class UploadError(ValueError):
+    """
+    Upload rejeitado.
+
+    Attributes:
+        status_code: Código HTTP sugerido (400 ou 413)
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class StoredUpload:
+    """
+    Arquivo recebido e gravado em disco.
+
+    Attributes:
+        path: Caminho do arquivo temporário gravado
+        size: Tamanho em bytes
+        sha256: Hash SHA-256 do conteúdo (hex)
+    """
+    path: str
+    size: int
+    sha256: str
+
+
+async def save_upload_to_temp(
+    file: UploadFile,
+    upload_dir: str,
+    max_size: int = MAX_UPLOAD_SIZE_BYTES,
+    chunk_size: int = UPLOAD_READ_CHUNK_SIZE
+) -> StoredUpload:
+    """
+    Grava o upload em um arquivo temporário, calculando hash e tamanho.
+
+    A assinatura PDF é verificada no primeiro bloco e o limite de tamanho a
+    cada bloco, de modo que arquivos inválidos são rejeitados sem copiar
+    (nem hashear) o restante do conteúdo.
+
+    Args:
+        file: Arquivo recebido pelo FastAPI
+        upload_dir: Diretório de destino
+        max_size: Tamanho máximo permitido em bytes
+        chunk_size: Tamanho dos blocos de leitura em bytes
+
+    Returns:
+        StoredUpload com caminho temporário, tamanho e hash
+
+    Raises:
+        UploadError: Se o arquivo não for PDF (400) ou exceder max_size (413)
+    """
+    # Tamanho já conhecido pelo parser multipart: rejeitar sem ler nada
+    if file.size is not None and file.size > max_size:
+        raise UploadError(
+            f"Arquivo {file.filename} excede o tamanho máximo de {max_size // (1024 * 1024)} MB",
+            status_code=413
+        )
+
+    os.makedirs(upload_dir, exist_ok=True)
+    temp_path = os.path.join(upload_dir, f".{uuid.uuid4()}.part")
+
+    hasher = hashlib.sha256()
+    size = 0
+    header = b""
+
+    try:
+        with open(temp_path, "wb") as f:
+            while True:
+                block = await file.read(chunk_size)
+                if not block:
+                    break
+
+                # Verificar assinatura assim que a janela do cabeçalho estiver disponível
+                if len(header) < PDF_MAGIC_WINDOW:
+                    header += block[:PDF_MAGIC_WINDOW - len(header)]
+                    if len(header) >= PDF_MAGIC_WINDOW and PDF_MAGIC not in header:
+                        raise UploadError(f"Arquivo {file.filename} não é PDF")
+
+                size += len(block)
+                if size > max_size:
+                    raise UploadError(
+                        f"Arquivo {file.filename} excede o tamanho máximo de {max_size // (1024 * 1024)} MB",
+                        status_code=413
+                    )
+
+                hasher.update(block)
+                f.write(block)
+
+        if PDF_MAGIC not in header:
+            raise UploadError(f"Arquivo {file.filename} não é PDF")
+    except Exception:
+        discard_upload(temp_path)
+        raise
+
+    return StoredUpload(path=temp_path, size=size, sha256=hasher.hexdigest())
+
+
+def discard_upload(path: str) -> None:
+    """
+    Remove um arquivo temporário de upload, ignorando erros.
+
+    Args:
+        path: Caminho do arquivo
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,154 @@
+"""
+Acesso ao ChromaDB
+
+Este módulo mantém as conexões com o vector store durante a vida do processo:
+1. Um único cliente: servidor Chroma (CHROMA_SERVER_HOST) ou persistente sobre ./chroma_db
+2. Cache LRU de handles de coleção por usuário (com limite de tamanho)
+3. Invalidação explícita quando uma coleção é removida
+
+O cliente persistente do Chroma é thread-safe e cada handle apenas referencia
+a coleção no cliente compartilhado, de modo que documentos adicionados pela
+ingestão ficam visíveis imediatamente para queries que usam o mesmo handle.
+
+O cliente persistente (embutido) não suporta vários processos sobre o mesmo
+diretório: com workers de ingestão fora da API (worker.py), configure um
+servidor Chroma (CHROMA_SERVER_HOST) para a API e os workers.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import chromadb
+from langchain_chroma import Chroma
+
+from src.services.embeddings import get_embedding_function
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+# Servidor Chroma compartilhado entre processos (vazio = cliente persistente embutido)
+CHROMA_SERVER_HOST = os.getenv("CHROMA_SERVER_HOST", "")
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", "8000"))
+CHROMA_SERVER_SSL = os.getenv("CHROMA_SERVER_SSL", "0").lower() in ("1", "true", "yes")
+VECTORSTORE_CACHE_SIZE = int(os.getenv("VECTORSTORE_CACHE_SIZE", "32"))
+
+_client = None
+_client_lock = threading.Lock()
+
+_vectorstores: "OrderedDict[int, Chroma]" = OrderedDict()
+_vectorstores_lock = threading.Lock()
+
+
+def uses_chroma_server() -> bool:
+    """
+    Indica se o vector store é um servidor Chroma (compartilhável entre processos).
+
+    Returns:
+        True se CHROMA_SERVER_HOST está configurado
+    """
+    return bool(CHROMA_SERVER_HOST)
+
+
+def get_chroma_client():
+    """
+    Retorna o cliente do Chroma, abrindo-o na primeira chamada.
+
+    Com CHROMA_SERVER_HOST conecta ao servidor Chroma; caso contrário abre o
+    cliente persistente embutido em CHROMA_PERSIST_DIRECTORY.
+
+    Returns:
+        chromadb.HttpClient ou chromadb.PersistentClient compartilhado pelo processo
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if uses_chroma_server():
+                    _client = chromadb.HttpClient(
+                        host=CHROMA_SERVER_HOST,
+                        port=CHROMA_SERVER_PORT,
+                        ssl=CHROMA_SERVER_SSL
+                    )
+                    logger.info(f"Cliente Chroma conectado a {CHROMA_SERVER_HOST}:{CHROMA_SERVER_PORT}")
+                else:
+                    _client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+                    logger.info(f"Cliente Chroma aberto em {CHROMA_PERSIST_DIRECTORY}")
+
+    return _client
+
+
+def get_collection_name(user_id: int) -> str:
+    """
+    Retorna o nome da coleção Chroma do usuário.
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        Nome da coleção
+    """
+    return f"user_{user_id}_documents"
+
+
+def get_chroma_vectorstore(user_id: int) -> Chroma:
+    """
+    Obtém ou cria o vector store Chroma do usuário via LangChain.
+
+    Os handles ficam em um cache LRU limitado a VECTORSTORE_CACHE_SIZE usuários;
+    o menos usado recentemente é descartado quando o limite é atingido.
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        Chroma vector store do LangChain
+    """
+    with _vectorstores_lock:
+        vectorstore = _vectorstores.get(user_id)
+        if vectorstore is not None:
+            _vectorstores.move_to_end(user_id)
+            return vectorstore
+
+        vectorstore = Chroma(
+            collection_name=get_collection_name(user_id),
+            embedding_function=get_embedding_function(),
+            client=get_chroma_client()
+        )
+
+        _vectorstores[user_id] = vectorstore
+
+        while len(_vectorstores) > VECTORSTORE_CACHE_SIZE:
+            evicted_user_id, _ = _vectorstores.popitem(last=False)
+            logger.debug(f"Handle do vector store do usuário {evicted_user_id} removido do cache")
+
+    return vectorstore
+
+
+def get_chroma_collection(user_id: int):
+    """
+    Retorna a coleção Chroma nativa do usuário (para operações com embeddings
+    já calculados, que a interface do LangChain não expõe).
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        chromadb Collection
+    """
+    return get_chroma_vectorstore(user_id)._collection
+
+
+def invalidate_vectorstore(user_id: int) -> None:
+    """
+    Remove o handle do usuário do cache (ex: após apagar a coleção).
+
+    Args:
+        user_id: ID do usuário
+    """
+    with _vectorstores_lock:
+        _vectorstores.pop(user_id, None)
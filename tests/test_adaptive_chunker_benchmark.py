@@ -0,0 +1,177 @@
+"""
+Micro-benchmark do Adaptive Chunker
+
+Compara a implementação atual com a implementação de referência (anterior):
+1. detect_block_type: saídas idênticas e throughput (blocos/s)
+2. split_text_dynamic: splitter em cache por tipo vs splitter novo a cada chamada
+
+Os blocos vêm dos elementos de texto do Docling para arquivo_teste/LB5001.pdf
+(mesmo caminho da ingestão tradicional) ou, com --source pdfminer, dos
+parágrafos extraídos pelo PDFMinerLoader.
+
+Execução:
+    python tests/test_adaptive_chunker_benchmark.py
+    python tests/test_adaptive_chunker_benchmark.py --source pdfminer --repeat 20
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+# Adicionar raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.services.adaptive_chunker import (
+    detect_block_type,
+    get_chunk_params,
+    split_text_dynamic,
+)
+from src.services.embeddings import get_max_content_tokens, get_token_counter
+
+PDF_PATH = Path(__file__).parent.parent / "arquivo_teste" / "LB5001.pdf"
+
+
+def reference_detect_block_type(text: str) -> str:
+    """Implementação anterior de detect_block_type (referência para paridade)."""
+    t = text.strip()
+    text_low = t.lower()
+    lines = [l.strip() for l in t.splitlines() if l.strip()]
+
+    if re.search(r"\b(warning|caution|aten[çc][aã]o|aviso|advert[êe]ncia)\b", text_low):
+        return "warning"
+
+    if "tabela" in text_low or "table" in text_low or "tabla" in text_low or "|" in t:
+        return "table"
+
+    step_like = sum(
+        1
+        for l in lines
+        if re.match(r'^(\d+[\.\)]\s+|[-*•]\s+)', l)
+    )
+    if step_like >= 2:
+        return "procedure"
+
+    numeric_like_lines = 0
+    for line in lines:
+        if re.match(r'^(\d+[\.\)]\s+)', line):
+            continue
+
+        lower = line.lower()
+        tokens = line.split()
+        num_tokens = sum(1 for tok in tokens if re.search(r"\d", tok))
+        has_hrs = "hrs" in lower
+
+        if re.match(r"^\d", line) or num_tokens >= 2 or has_hrs:
+            numeric_like_lines += 1
+
+    if len(lines) >= 3 and numeric_like_lines >= 2:
+        return "table"
+
+    has_math_symbol = re.search(r'[=<>×÷±/]|√|∑|Σ', t) is not None
+    has_math_word = re.search(r'\b(cos|sen|sin|tan|log|ln)\b', text_low) is not None
+    has_digit = re.search(r'\d', t) is not None
+
+    if (has_math_symbol and has_digit) or has_math_word:
+        return "formula"
+
+    if re.match(r"^\d+(\.\d+)+\s", t):
+        return "conceptual"
+
+    return "narrative"
+
+
+def reference_split_text_dynamic(text: str, length_function, max_tokens: int):
+    """Divisão com um splitter novo a cada chamada (comportamento anterior)."""
+    block_type = reference_detect_block_type(text)
+    params = get_chunk_params(block_type, max_tokens)
+    splitter = RecursiveCharacterTextSplitter(length_function=length_function, **params)
+    return block_type, splitter.split_text(text)
+
+
+def load_docling_blocks(pdf_path: Path) -> list:
+    """Textos dos elementos Docling (como na ingestão tradicional)."""
+    from docling.document_converter import DocumentConverter
+
+    result = DocumentConverter().convert(str(pdf_path))
+    blocks = []
+    for element, _ in result.document.iterate_items():
+        text = getattr(element, "text", "")
+        if text and text.strip():
+            blocks.append(text)
+    return blocks
+
+
+def load_pdfminer_blocks(pdf_path: Path) -> list:
+    """Parágrafos do PDFMinerLoader (como em test_adaptive_chunker.py)."""
+    from langchain_community.document_loaders import PDFMinerLoader
+
+    blocks = []
+    for doc in PDFMinerLoader(str(pdf_path)).load():
+        blocks.extend(b.strip() for b in doc.page_content.split("\n\n") if b.strip())
+    return blocks
+
+
+def benchmark(fn, blocks: list, repeat: int) -> float:
+    """Retorna blocos por segundo (melhor de `repeat` passadas)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for block in blocks:
+            fn(block)
+        best = min(best, time.perf_counter() - start)
+    return len(blocks) / best if best > 0 else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do adaptive chunker")
+    parser.add_argument("--source", choices=["docling", "pdfminer"], default="docling")
+    parser.add_argument("--repeat", type=int, default=10, help="Passadas por medição (usa a melhor)")
+    args = parser.parse_args()
+
+    if not PDF_PATH.exists():
+        print(f"ERRO: PDF não encontrado em {PDF_PATH}")
+        sys.exit(1)
+
+    print("\n" + "=" * 80)
+    print(f"BENCHMARK ADAPTIVE CHUNKER: {PDF_PATH.name} ({args.source})")
+    print("=" * 80)
+
+    blocks = load_docling_blocks(PDF_PATH) if args.source == "docling" else load_pdfminer_blocks(PDF_PATH)
+    print(f"\nBlocos: {len(blocks)}")
+
+    # 1. Paridade de detect_block_type
+    mismatches = [b for b in blocks if detect_block_type(b) != reference_detect_block_type(b)]
+    if mismatches:
+        print(f"\n❌ {len(mismatches)} blocos com tipo diferente da referência. Exemplo:")
+        print(repr(mismatches[0][:200]))
+        sys.exit(1)
+    print("✅ detect_block_type idêntico à referência em todos os blocos")
+
+    # 2. Throughput da classificação
+    reference_rate = benchmark(reference_detect_block_type, blocks, args.repeat)
+    current_rate = benchmark(detect_block_type, blocks, args.repeat)
+
+    # 3. Throughput da divisão (mesma função de tokens nos dois casos)
+    length_function = get_token_counter()
+    max_tokens = get_max_content_tokens()
+    split_repeat = max(1, args.repeat // 5)
+    reference_split_rate = benchmark(
+        lambda b: reference_split_text_dynamic(b, length_function, max_tokens), blocks, split_repeat
+    )
+    current_split_rate = benchmark(
+        lambda b: split_text_dynamic(b, length_function, max_tokens), blocks, split_repeat
+    )
+
+    print(f"\n{'etapa':<22} {'referência':>14} {'atual':>14} {'ganho':>8}")
+    print("-" * 62)
+    print(f"{'detect_block_type':<22} {reference_rate:>11.0f}/s {current_rate:>11.0f}/s {current_rate / reference_rate:>7.2f}x")
+    print(f"{'split_text_dynamic':<22} {reference_split_rate:>11.0f}/s {current_split_rate:>11.0f}/s {current_split_rate / reference_split_rate:>7.2f}x")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
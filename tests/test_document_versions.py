@@ -0,0 +1,79 @@
+"""
+Teste do Plano de Revisão de Documentos (Nova Versão)
+
+Verifica plan_revision com impressões digitais sintéticas:
+1. Versão idêntica: nenhuma página reprocessada
+2. Página inserida no início, removida no meio, alterada e primeira página removida
+3. Com overlap (chunking semântico), a página seguinte a uma alteração também é reprocessada
+
+Execução:
+    python tests/test_document_versions.py
+    python -m pytest tests/test_document_versions.py
+"""
+
+import sys
+from pathlib import Path
+
+# Adicionar raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.services.document_versions import PageFingerprint, plan_revision
+
+
+def pages(*names):
+    """Impressões digitais sintéticas, uma por nome de página."""
+    return [PageFingerprint(text_hash=name, image_hash="") for name in names]
+
+
+def test_identical_version():
+    plan = plan_revision(pages("A", "B", "C"), pages("A", "B", "C"))
+    assert plan.page_count == 3
+    assert plan.affected_pages == []
+    assert plan.kept_pages == {1: 1, 2: 2, 3: 3}
+
+
+def test_insert_at_front():
+    plan = plan_revision(pages("A", "B", "C"), pages("X", "A", "B", "C"))
+    # A antiga página 1 recebe overlap da página inserida antes dela
+    assert plan.affected_pages == [1, 2]
+    assert plan.kept_pages == {3: 2, 4: 3}
+
+    plan = plan_revision(pages("A", "B", "C"), pages("X", "A", "B", "C"), carry_overlap=False)
+    assert plan.affected_pages == [1]
+    assert plan.kept_pages == {2: 1, 3: 2, 4: 3}
+
+
+def test_remove_middle_page():
+    plan = plan_revision(pages("A", "B", "C", "D"), pages("A", "C", "D"))
+    assert plan.affected_pages == [2]
+    assert plan.kept_pages == {1: 1, 3: 4}
+
+    plan = plan_revision(pages("A", "B", "C", "D"), pages("A", "C", "D"), carry_overlap=False)
+    assert plan.affected_pages == []
+    assert plan.kept_pages == {1: 1, 2: 3, 3: 4}
+
+
+def test_changed_page_leaves_gap():
+    plan = plan_revision(pages("A", "B", "C", "D"), pages("A", "B2", "C", "D"))
+    assert plan.affected_pages == [2, 3]
+    assert plan.kept_pages == {1: 1, 4: 4}
+
+
+def test_remove_first_page():
+    plan = plan_revision(pages("A", "B", "C"), pages("B", "C"))
+    # A nova página 1 perde o overlap que vinha da página removida
+    assert plan.affected_pages == [1]
+    assert plan.kept_pages == {2: 3}
+
+
+def main():
+    test_identical_version()
+    test_insert_at_front()
+    test_remove_middle_page()
+    test_changed_page_leaves_gap()
+    test_remove_first_page()
+    print("OK: plano de revisão")
+
+
+if __name__ == "__main__":
+    main()
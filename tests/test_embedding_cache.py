@@ -0,0 +1,132 @@
+"""
+Teste do Cache de Embeddings em Disco
+
+Verifica, com um cache SQLite temporário e um modelo falso:
+1. Hits e misses de embed_texts_cached (textos repetidos codificados uma vez)
+2. Remoção LRU: ao exceder o limite saem os menos usados recentemente
+3. Totais mantidos pelos triggers iguais aos do conteúdo da tabela
+
+Execução:
+    python tests/test_embedding_cache.py
+    python -m pytest tests/test_embedding_cache.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Adicionar raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from src.services import embedding_cache
+from src.services.embedding_cache import EmbeddingCache, embed_texts_cached, hash_text
+
+DIM = 4
+VECTOR_BYTES = DIM * 4  # float32
+
+
+class FakeModel:
+    """Modelo determinístico que registra os textos codificados."""
+
+    model_id = "fake:test"
+
+    def __init__(self):
+        self.encoded = []
+
+    def embed_documents_array(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(text), 1.0, 2.0, 3.0] for text in texts], dtype=np.float32)
+
+
+class FakeClock:
+    """Relógio controlado para last_used (time.time do módulo)."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def __getattr__(self, name):
+        import time
+        return getattr(time, name)
+
+
+def open_cache(directory: str, max_entries: int) -> EmbeddingCache:
+    return EmbeddingCache(path=str(Path(directory) / "cache.db"), max_mb=max_entries * VECTOR_BYTES / (1024 * 1024))
+
+
+def test_hits_and_misses():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = open_cache(directory, max_entries=100)
+        model = FakeModel()
+        original = embedding_cache.get_embedding_cache
+        embedding_cache.get_embedding_cache = lambda: cache
+        try:
+            stats = {}
+            first = embed_texts_cached(model, ["a", "bb", "a"], stats)
+            assert stats == {"hits": 1, "misses": 2}, stats
+            assert model.encoded == ["a", "bb"]
+
+            stats = {}
+            second = embed_texts_cached(model, ["bb", "a", "ccc"], stats)
+            assert stats == {"hits": 2, "misses": 1}, stats
+            assert model.encoded == ["a", "bb", "ccc"]
+
+            assert np.array_equal(first[0], second[1])
+            assert second.dtype == np.float32 and second.shape == (3, DIM)
+        finally:
+            embedding_cache.get_embedding_cache = original
+
+        assert cache.stats()["entries"] == 3
+
+
+def test_lru_eviction_order():
+    clock = FakeClock()
+    original_time = embedding_cache.time
+    embedding_cache.time = clock
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            cache = open_cache(directory, max_entries=4)
+            model_id = FakeModel.model_id
+            vector = np.zeros(DIM, dtype=np.float32)
+
+            for text in ["t0", "t1", "t2", "t3"]:
+                clock.now += 1
+                cache.put_many(model_id, [(hash_text(text), vector)])
+
+            # t0 volta a ser usado: o menos usado recentemente passa a ser t1
+            clock.now += 1
+            assert hash_text("t0") in cache.get_many(model_id, [hash_text("t0")])
+
+            # Quinta entrada excede o limite: remover até 90% (t1 e t2 saem)
+            clock.now += 1
+            cache.put_many(model_id, [(hash_text("t4"), vector)])
+
+            remaining = cache.get_many(model_id, [hash_text(t) for t in ["t0", "t1", "t2", "t3", "t4"]])
+            assert set(remaining) == {hash_text("t0"), hash_text("t3"), hash_text("t4")}
+
+            stats = cache.stats()
+            assert stats["entries"] == 3
+            assert stats["evicted"] == 2
+
+            # Totais dos triggers batem com a tabela; regravar a mesma chave não duplica
+            cache.put_many(model_id, [(hash_text("t4"), vector)])
+            entries, size = cache._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            assert cache._totals() == (entries, size) == (3, 3 * VECTOR_BYTES)
+    finally:
+        embedding_cache.time = original_time
+
+
+def main():
+    test_hits_and_misses()
+    test_lru_eviction_order()
+    print("OK: cache de embeddings")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ Teste Completo do Pipeline RAG com Docling + Embeddings + ChromaDB
 
 Este script testa o pipeline completo:
 1. Extração estruturada com Docling (texto, tabelas, imagens)
-2. Salvamento de imagens no SQLite (base64)
+2. Salvamento de imagens (image store + metadados no SQLite)
 3. Chunking adaptativo
 4. Geração de embeddings (Sentence Transformers)
 5. Armazenamento no ChromaDB via LangChain
@@ -199,7 +199,7 @@ async def test_document_ingestion(pdf_path: str, force_reprocess: bool = False):
         logger.info(f"\n📸 Imagens extraídas e salvas: {len(images)}")
         for i, img in enumerate(images, 1):
             logger.info(f"   {i}. Página {img.page_number} - ID: {img.id}")
-            logger.info(f"      Formato: {img.image_format}, Tamanho: {len(img.image_data)} bytes (base64)")
+            logger.info(f"      Formato: {img.image_format}, Hash: {img.content_hash}")
             if img.caption:
                 logger.info(f"      Caption: {img.caption[:80]}...")
 
@@ -304,7 +304,7 @@ async def test_query_with_images(user_id: int):
                     logger.info(f"   - 📸 Imagens associadas: {len(chunk['images'])}")
                     for k, img in enumerate(chunk["images"], 1):
                         logger.info(f"      {k}. ID: {img['id']}, Página: {img['page']}, Formato: {img['format']}")
-                        logger.info(f"         Tamanho: {len(img['data'])} bytes (base64)")
+                        logger.info(f"         URL: {img['url']}")
                         if img.get('caption'):
                             logger.info(f"         Caption: {img['caption'][:80]}...")
                 else:
@@ -12,7 +12,6 @@ Uso:
 """
 
 import asyncio
-import base64
 import logging
 import os
 import sys
@@ -28,7 +27,7 @@ os.environ["TRANSFORMERS_OFFLINE"] = "1"
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.auth.database import SessionLocal
-from src.services.rag import query_documents
+from src.services.rag import query_documents, get_image_content
 
 # Configurar logging
 logging.basicConfig(
@@ -88,31 +87,18 @@ def display_results(result):
             print("⚠️  Sem conteúdo de texto")
         print(f"{'─'*80}")
 
-        # Imagens associadas com BASE64
+        # Imagens associadas (servidas por URL)
         images = chunk_data.get('images', [])
         if images:
             print(f"\n📸 Imagens associadas: {len(images)}")
             for img_idx, img in enumerate(images, 1):
-                # Tentar diferentes chaves para image_data
-                img_data = img.get('image_data', img.get('data', ''))
-                img_size_kb = len(img_data) / 1024 if img_data else 0
-
                 print(f"\n   {img_idx}. ID: {img.get('id', 'N/A')}")
-                print(f"      Página: {img.get('page_number', img.get('page', 'N/A'))}")
-                print(f"      Formato: {img.get('image_format', img.get('format', 'N/A'))}")
-                print(f"      Tamanho: {img_size_kb:.2f} KB")
+                print(f"      Página: {img.get('page', 'N/A')}")
+                print(f"      Formato: {img.get('format', 'N/A')}")
+                print(f"      URL: {img.get('url', 'N/A')}")
 
                 if img.get('caption'):
                     print(f"      Caption: {img.get('caption', '')}")
-
-                # Mostrar BASE64 (primeiros e últimos caracteres)
-                if img_data:
-                    print(f"\n      🔐 Base64 da imagem:")
-                    print(f"      {img_data[:100]}...")
-                    print(f"      ...{img_data[-100:]}")
-                    print(f"      (Total: {len(img_data)} caracteres)")
-                else:
-                    print(f"      ⚠️  Sem dados de imagem")
         else:
             print("\n📸 Sem imagens associadas")
 
@@ -200,19 +186,22 @@ async def interactive_query_loop():
                 for chunk_idx, chunk_data in enumerate(last_result.get('chunks', []), 1):
                     images = chunk_data.get('images', [])
                     for img_idx, img in enumerate(images, 1):
-                        img_data = img.get('image_data', '')
-                        if img_data:
+                        content = get_image_content(img['id'], db)
+                        if content:
                             # Criar diretório se não existir
                             output_dir = Path("output_images")
                             output_dir.mkdir(exist_ok=True)
 
                             # Nome do arquivo
-                            img_format = img.get('image_format', 'png')
+                            img_format = content['format'] or 'png'
                             filename = f"chunk{chunk_idx}_img{img_idx}_{img.get('id', 'unknown')[:8]}.{img_format}"
                             filepath = output_dir / filename
 
-                            # Decodificar e salvar
-                            image_bytes = base64.b64decode(img_data)
+                            # Copiar do image store (ou bytes legados) e salvar
+                            if content['path']:
+                                image_bytes = Path(content['path']).read_bytes()
+                            else:
+                                image_bytes = content['data']
                             filepath.write_bytes(image_bytes)
 
                             saved_count += 1
@@ -0,0 +1,160 @@
+"""
+Teste de Paridade e Desempenho do Backend ONNX
+
+Compara os backends de embedding (torch, onnx, onnx-int8):
+1. Paridade: similaridade de cosseno entre os vetores ONNX e os do PyTorch
+2. Latência de query única (p50/p95)
+3. Throughput de documentos em lote
+
+Uso:
+    python tests/test_onnx_embeddings.py
+    python tests/test_onnx_embeddings.py --backends onnx onnx-int8 --runs 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Configurar variáveis de ambiente
+os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
+os.environ["HF_HUB_DISABLE_SYMLINKS"] = "1"
+
+# Adicionar diretório raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from src.services.embeddings import DEFAULT_EMBEDDING_MODEL, create_embeddings
+
+# Cosseno mínimo aceito em relação ao PyTorch
+MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+SAMPLE_TEXTS = [
+    "Qual é o procedimento de manutenção do motor?",
+    "What are the motor specifications?",
+    "Torque nominal de 25 Nm a 1750 rpm",
+    "Verifique o aperto dos parafusos da base antes de ligar o equipamento.",
+    "La temperatura máxima del rodamiento no debe exceder 90 °C.",
+    "Tabela 3 - Dados elétricos: tensão 220/380 V, corrente 12,5/7,2 A, fator de potência 0,86",
+    "Motor",
+    "Instalação, operação e manutenção de motores elétricos trifásicos de indução com rotor de gaiola. "
+    "Antes de instalar o motor, leia atentamente todas as instruções deste manual e observe as "
+    "recomendações de segurança para evitar danos ao equipamento e riscos às pessoas.",
+]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Similaridade de cosseno linha a linha.
+
+    Args:
+        a: Array (n, dim)
+        b: Array (n, dim)
+
+    Returns:
+        Array (n,) com os cossenos
+    """
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def measure_query_latency(model, runs: int) -> dict:
+    """
+    Mede a latência de uma query (sem cache) em milissegundos.
+
+    Args:
+        model: Instância de CachedEmbeddings
+        runs: Número de repetições
+
+    Returns:
+        {"p50_ms", "p95_ms"}
+    """
+    model.encode_queries([SAMPLE_TEXTS[0]])  # aquecimento
+
+    timings = []
+    for i in range(runs):
+        text = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+        start = time.perf_counter()
+        model.encode_queries([text])
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95))
+    }
+
+
+def measure_throughput(model, num_texts: int) -> float:
+    """
+    Mede o throughput de embed_documents_array em textos por segundo.
+
+    Args:
+        model: Instância de CachedEmbeddings
+        num_texts: Número de textos do lote
+
+    Returns:
+        Textos por segundo
+    """
+    texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] + f" ({i})" for i in range(num_texts)]
+    start = time.perf_counter()
+    model.embed_documents_array(texts)
+    return num_texts / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade e desempenho dos backends de embedding")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Modelo no Hugging Face")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], help="Backends a comparar com torch")
+    parser.add_argument("--runs", type=int, default=30, help="Repetições para latência de query")
+    parser.add_argument("--docs", type=int, default=256, help="Textos para o teste de throughput")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"Modelo: {args.model}")
+    print("=" * 80)
+
+    reference = create_embeddings(args.model, "torch")
+    reference_vectors = reference.embed_documents_array(SAMPLE_TEXTS)
+
+    results = {"torch": {"cos_min": 1.0, "cos_mean": 1.0}}
+    models = {"torch": reference}
+    failed = []
+
+    for backend in args.backends:
+        print(f"\n🔧 Carregando backend {backend}...")
+        model = create_embeddings(args.model, backend)
+        models[backend] = model
+
+        vectors = model.embed_documents_array(SAMPLE_TEXTS)
+        cosines = cosine_rows(reference_vectors, vectors)
+        results[backend] = {"cos_min": float(cosines.min()), "cos_mean": float(cosines.mean())}
+
+        if cosines.min() < MIN_COSINE.get(backend, 0.98):
+            failed.append(backend)
+
+    for backend, model in models.items():
+        results[backend].update(measure_query_latency(model, args.runs))
+        results[backend]["docs_per_s"] = measure_throughput(model, args.docs)
+
+    print("\n" + "=" * 80)
+    print(f"{'backend':<12} {'cos min':>9} {'cos médio':>10} {'p50 ms':>9} {'p95 ms':>9} {'docs/s':>9}")
+    print("-" * 80)
+    for backend, r in results.items():
+        print(
+            f"{backend:<12} {r['cos_min']:>9.5f} {r['cos_mean']:>10.5f} "
+            f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['docs_per_s']:>9.1f}"
+        )
+    print("=" * 80)
+
+    if failed:
+        print(f"\n❌ Paridade abaixo do limite para: {', '.join(failed)}")
+        sys.exit(1)
+
+    print("\n✅ Paridade OK para todos os backends")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Teste do Roteador de Páginas
+
+Verifica as partes determinísticas do roteamento, sem abrir PDFs:
+1. Classificação de páginas (_classify_page) com blocos de texto sintéticos
+2. Labels dos blocos nativos (section_header, list_item, text)
+3. Agrupamento de rotas consecutivas (iter_route_runs) e de páginas (split_page_runs)
+
+Execução:
+    python tests/test_page_router.py
+    python -m pytest tests/test_page_router.py
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Adicionar raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.services.page_router import (
+    ROUTE_DOCLING,
+    ROUTE_NATIVE,
+    PageRoute,
+    _classify_page,
+    _label_block,
+    _TextBlock,
+    iter_route_runs,
+    split_page_runs,
+)
+
+PAGE_WIDTH = 600.0
+PARAGRAPH = "Verifique o aperto dos parafusos da base antes de ligar o equipamento pela primeira vez."
+
+
+class FakePage:
+    """Página com as dimensões e o find_tables() usados pela classificação."""
+
+    def __init__(self, ruled_tables: int = 0):
+        self.rect = SimpleNamespace(width=PAGE_WIDTH, height=800.0)
+        self._tables = [object()] * ruled_tables
+
+    def find_tables(self):
+        return SimpleNamespace(tables=self._tables)
+
+
+def block(text: str, x0: float = 50, y0: float = 100, x1: float = 550, y1: float = 140,
+          lines=None, size: float = 10.0) -> _TextBlock:
+    return _TextBlock(text, lines or [text], size, x0, y0, x1, y1)
+
+
+def test_classify_simple_page():
+    blocks = [block(PARAGRAPH), block(PARAGRAPH, y0=150, y1=190)]
+    assert _classify_page(FakePage(), blocks) == "simple"
+
+
+def test_classify_no_text_layer():
+    assert _classify_page(FakePage(), []) == "no_text_layer"
+    assert _classify_page(FakePage(), [block("Fig. 3")]) == "no_text_layer"
+
+
+def test_classify_multi_column():
+    left = block(PARAGRAPH, x0=40, x1=290, y0=100, y1=300)
+    right = block(PARAGRAPH, x0=310, x1=560, y0=120, y1=320)
+    assert _classify_page(FakePage(), [left, right]) == "multi_column"
+
+    # Blocos estreitos um abaixo do outro não são colunas
+    below = block(PARAGRAPH, x0=310, x1=560, y0=400, y1=500)
+    assert _classify_page(FakePage(), [left, below]) == "simple"
+
+
+def test_classify_tables():
+    rows = ["Tensão 220 380", "Corrente 12,5 7,2", "Potência 1,5 2,2"]
+    grid = block(" ".join(rows), lines=rows)
+    assert _classify_page(FakePage(), [block(PARAGRAPH), grid]) == "table"
+
+    # Tabela com linhas de grade detectada pelo PyMuPDF
+    assert _classify_page(FakePage(ruled_tables=1), [block(PARAGRAPH)]) == "table"
+
+
+def test_label_block():
+    assert _label_block(block("Manutenção preventiva", size=14.0), body_size=10.0) == "section_header"
+    assert _label_block(block("- Verificar o nível de óleo"), body_size=10.0) == "list_item"
+    assert _label_block(block("3) Reapertar os terminais"), body_size=10.0) == "list_item"
+    assert _label_block(block(PARAGRAPH), body_size=10.0) == "text"
+    # Texto longo com fonte grande não é header
+    assert _label_block(block(PARAGRAPH * 3, size=14.0), body_size=10.0) == "text"
+
+
+def test_iter_route_runs():
+    routes = [
+        PageRoute(1, ROUTE_NATIVE, "simple"),
+        PageRoute(2, ROUTE_NATIVE, "simple"),
+        PageRoute(3, ROUTE_DOCLING, "table"),
+        PageRoute(4, ROUTE_DOCLING, "no_text_layer"),
+        PageRoute(6, ROUTE_DOCLING, "table"),
+        PageRoute(7, ROUTE_NATIVE, "simple"),
+    ]
+    runs = [(route, [page.page_no for page in run]) for route, run in iter_route_runs(routes)]
+    assert runs == [
+        (ROUTE_NATIVE, [1, 2]),
+        (ROUTE_DOCLING, [3, 4]),
+        (ROUTE_DOCLING, [6]),  # Página 5 fora do roteamento: novo intervalo
+        (ROUTE_NATIVE, [7]),
+    ]
+    assert list(iter_route_runs([])) == []
+
+
+def test_split_page_runs():
+    assert split_page_runs([7, 2, 3, 6, 3]) == [(2, 3), (6, 7)]
+    assert split_page_runs(range(1, 11), window_pages=4) == [(1, 4), (5, 8), (9, 10)]
+    assert split_page_runs([1, 2, 3, 5], window_pages=2) == [(1, 2), (3, 3), (5, 5)]
+    assert split_page_runs([]) == []
+
+
+def main():
+    test_classify_simple_page()
+    test_classify_no_text_layer()
+    test_classify_multi_column()
+    test_classify_tables()
+    test_label_block()
+    test_iter_route_runs()
+    test_split_page_runs()
+    print("OK: roteador de páginas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Teste da Medição do Pico de Memória
+
+Verifica a detecção de blocos sobrepostos em PeakMemoryMonitor:
+1. Um bloco sozinho no processo tem exclusive_peak_mb
+2. Dois blocos sobrepostos (ingestões em paralelo) ficam sem pico exclusivo
+
+Execução:
+    python tests/test_peak_memory_monitor.py
+    python -m pytest tests/test_peak_memory_monitor.py
+"""
+
+import sys
+from pathlib import Path
+
+# Adicionar raiz do projeto ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.services.ingest_pipeline import PeakMemoryMonitor
+
+INTERVAL = 0.01
+
+
+def test_single_monitor_is_exclusive():
+    with PeakMemoryMonitor(interval=INTERVAL) as monitor:
+        data = bytearray(1024 * 1024)
+        del data
+
+    assert monitor.exclusive
+    assert monitor.exclusive_peak_mb is not None
+    assert monitor.exclusive_peak_mb == monitor.peak_mb >= monitor.start_mb
+
+
+def test_overlapping_monitors_are_not_exclusive():
+    with PeakMemoryMonitor(interval=INTERVAL) as first:
+        with PeakMemoryMonitor(interval=INTERVAL) as second:
+            pass
+
+    assert first.exclusive_peak_mb is None
+    assert second.exclusive_peak_mb is None
+
+    # Sem sobreposição, o próximo bloco volta a ser exclusivo
+    with PeakMemoryMonitor(interval=INTERVAL) as after:
+        pass
+    assert after.exclusive_peak_mb is not None
+
+
+def main():
+    test_single_monitor_is_exclusive()
+    test_overlapping_monitors_are_not_exclusive()
+    print("OK: pico de memória")
+
+
+if __name__ == "__main__":
+    main()
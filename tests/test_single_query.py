@@ -97,11 +97,6 @@ async def single_query(question: str, user_id: int = 1, top_k: int = 3, verbose:
             # Mostrar detalhes completos
             import json
             print("\n📋 Resultado completo (JSON):")
-            # Remover image_data para não poluir a saída
-            for chunk in result.get('chunks', []):
-                for img in chunk.get('images', []):
-                    if 'image_data' in img:
-                        img['image_data'] = f"<{len(img['image_data'])} bytes>"
             print(json.dumps(result, indent=2, ensure_ascii=False))
         else:
             # Mostrar resumo
@@ -0,0 +1,108 @@
+"""
+Worker de Ingestão
+
+Processo dedicado que consome a fila de ingestão (tabela ingestion_jobs).
+Vários processos podem consumir a mesma fila, desde que o vector store seja
+um servidor Chroma (CHROMA_SERVER_HOST): o cliente embutido não suporta
+vários processos sobre o mesmo ./chroma_db.
+
+Os workers precisam rodar na mesma máquina da API: uploads/, o image store e
+os caches de conversão e de embeddings são diretórios locais.
+
+Uso:
+    python worker.py                  # 1 processo
+    python worker.py --processes 4    # 4 processos nesta máquina (requer CHROMA_SERVER_HOST)
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+
+from src.auth.database import init_db
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run_worker_process(poll_interval: float):
+    """
+    Executa um worker de ingestão no processo atual até receber SIGTERM/SIGINT.
+
+    Args:
+        poll_interval: Espera entre consultas quando a fila está vazia
+    """
+    from src.services.converter_pool import NO_OCR_CONVERTER_OPTIONS, converter_pool
+    from src.services.embeddings import embedding_registry
+    from src.services.jobs import IngestionWorker
+    from src.services.page_router import INGEST_SELECTIVE_OCR
+    from src.services.vectorstore import get_chroma_client
+
+    worker = IngestionWorker()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Sinal {signum} recebido, finalizando após o job atual...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # Carregar modelos uma única vez por processo
+    embedding_registry.warmup()
+    converter_pool.warmup()
+    if INGEST_SELECTIVE_OCR:
+        converter_pool.warmup(NO_OCR_CONVERTER_OPTIONS)
+    get_chroma_client()
+
+    worker.run_forever(poll_interval=poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de ingestão de documentos")
+    parser.add_argument("--processes", type=int, default=1, help="Número de processos worker")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Espera entre consultas à fila (s)")
+    args = parser.parse_args()
+
+    from src.services.vectorstore import uses_chroma_server
+
+    if not uses_chroma_server():
+        if args.processes > 1:
+            parser.error("--processes > 1 requer um servidor Chroma (CHROMA_SERVER_HOST)")
+        logger.warning(
+            "Sem servidor Chroma (CHROMA_SERVER_HOST): este worker abre ./chroma_db diretamente "
+            "e não pode rodar junto com a API nem com outros workers."
+        )
+
+    init_db()
+
+    if args.processes <= 1:
+        run_worker_process(args.poll_interval)
+        return
+
+    processes = []
+    for i in range(args.processes):
+        process = multiprocessing.Process(
+            target=run_worker_process,
+            args=(args.poll_interval,),
+            name=f"ingest-worker-{i}"
+        )
+        process.start()
+        processes.append(process)
+
+    logger.info(f"{len(processes)} processos worker iniciados")
+
+    def forward_signal(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Os filhos recebem o SIGINT do terminal
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()